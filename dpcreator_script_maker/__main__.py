@@ -0,0 +1,6 @@
+"""python -m dpcreator_script_maker: the same as the dpcreator-script-maker command"""
+import sys
+
+from dpcreator_script_maker.cli import main
+
+sys.exit(main())
@@ -0,0 +1,204 @@
+"""
+Accuracy of DP statistics
+
+The accuracy is the half-width of the confidence interval of the noise: at a
+confidence level of 95%, the released value is within "accuracy" of the true
+(clamped) value 95% of the time.
+
+Covers the Laplace and Geometric (discrete Laplace) mechanisms, for every
+statistic type. Numeric arguments may be NumPy arrays, to compute a whole
+sweep (e.g. accuracy vs. epsilon) in one call:
+
+    get_accuracy('mean', (0, 100), epsilon=np.linspace(0.01, 1, 100), num_rows=5_000)
+
+Single values are memoized in a bounded LRU cache, as the same statistics are
+shown again and again:
+
+    get_accuracy('count', None, epsilon=0.5, confidence_level=0.99)
+    get_accuracy_table('sum', (0, 10), epsilon=0.5)  # {0.68: ..., 0.8: ..., ..., 0.999: ...}
+"""
+from functools import lru_cache
+
+import numpy as np
+
+import dpcreator_script_maker.static_vals as dstatic
+from dpcreator_script_maker.planner import histogram_sensitivity, sum_sensitivity, sum_squares_sensitivity
+
+# Number of (statistic, parameters) results kept by the memoized functions
+DEFAULT_CACHE_SIZE = 4096
+
+MECHANISMS = [dstatic.NOISE_LAPLACE_MECHANISM, dstatic.NOISE_GEOMETRIC_MECHANISM]
+
+
+# --------------------------------------
+# Noise
+# --------------------------------------
+def laplace_accuracy(scale, alpha):
+    """Half-width of the (1 - alpha) confidence interval of Laplace noise"""
+    return scale * np.log(1 / alpha)
+
+
+def geometric_accuracy(scale, alpha):
+    """Half-width of the (1 - alpha) confidence interval of Geometric (discrete Laplace) noise"""
+    scale = np.asarray(scale, dtype=float)
+    with np.errstate(over='ignore'):
+        return scale * np.log(2 / (alpha * (np.exp(1 / scale) + 1))) + 1
+
+
+NOISE_ACCURACY = {
+    dstatic.NOISE_LAPLACE_MECHANISM: laplace_accuracy,
+    dstatic.NOISE_GEOMETRIC_MECHANISM: geometric_accuracy,
+}
+
+
+def get_mechanism(stat_type, integer):
+    """The mechanism used by the generated scripts: Geometric for integer values"""
+    if integer or stat_type in (dstatic.DP_COUNT, dstatic.DP_HISTOGRAM):
+        return dstatic.NOISE_GEOMETRIC_MECHANISM
+    return dstatic.NOISE_LAPLACE_MECHANISM
+
+
+# --------------------------------------
+# Statistics (vectorized)
+# --------------------------------------
+def stat_accuracy(stat_type, lower, upper, epsilon, alpha, mechanism,
+                  max_contributions=1, num_rows=dstatic.DEFAULT_EXPECTED_ROWS, rows_public=False,
+                  keeps_all_rows=True, clamp=True):
+    """
+    Accuracy of a statistic, in its units (rows for counts and histogram bins).
+    Every numeric argument may be an array; they are broadcast together.
+
+    The sensitivities are those of the generated scripts (see planner.py):
+    "rows_public" is "number_of_rows_public", and "keeps_all_rows" whether the
+    variable imputes its missing values rather than dropping them.
+
+    "epsilon" is the epsilon of the statistic's main noisy value: for means
+    and variances, what's left after their count. Means and variances use
+    "num_rows" as their (approximate) number of rows, and quantiles use it to
+    turn a rank into a value, assuming the values spread over the bounds.
+    Quantiles use the exponential mechanism whatever "mechanism" is. Their
+    error is at most (max - min), unless "clamp" is False: then it stays
+    proportional to 1 / epsilon, as the other statistics' errors are.
+    """
+    noise = NOISE_ACCURACY[mechanism]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = max_contributions / np.asarray(epsilon, dtype=float)  # for a sensitivity of 1
+        if stat_type == dstatic.DP_COUNT:
+            return noise(scale, alpha)
+        if stat_type == dstatic.DP_HISTOGRAM:
+            return noise(scale * histogram_sensitivity(rows_public), alpha)
+
+        if stat_type == dstatic.DP_SUM:
+            return noise(scale * sum_sensitivity(lower, upper, rows_public, keeps_all_rows), alpha)
+        if stat_type == dstatic.DP_MEAN:
+            return noise(scale * sum_sensitivity(lower, upper, rows_public, keeps_all_rows), alpha) / num_rows
+        if stat_type == dstatic.DP_VARIANCE:
+            # Mostly the noise of the sum of squares
+            return (noise(scale * sum_squares_sensitivity(lower, upper, rows_public, keeps_all_rows), alpha)
+                    / np.maximum(np.asarray(num_rows) - 1, 1))
+        if stat_type == dstatic.DP_QUANTILE:
+            # The exponential mechanism is off by at most this many ranks, over the candidates
+            ranks = 2 * scale * np.log(dstatic.DEFAULT_QUANTILE_MAX_CANDIDATES / alpha)
+            fraction = np.minimum(ranks / num_rows, 1) if clamp else ranks / num_rows
+            return fraction * (np.asarray(upper) - lower)
+    raise ValueError(dstatic.ERR_MSG_INVALID_STAT_TYPE.format(stat_type=stat_type))
+
+
+def stat_range(stat_type, lower, upper, num_rows=dstatic.DEFAULT_EXPECTED_ROWS):
+    """
+    The range of possible values of a statistic, to compare accuracies across
+    types: the number of rows, the largest possible sum, (max - min) or the
+    largest possible variance.
+    """
+    if stat_type in (dstatic.DP_COUNT, dstatic.DP_HISTOGRAM):
+        return np.asarray(num_rows, dtype=float)
+    if stat_type == dstatic.DP_SUM:
+        return num_rows * np.maximum(np.abs(lower), np.abs(upper))
+    if stat_type == dstatic.DP_VARIANCE:
+        return (np.asarray(upper) - lower) ** 2 / 4
+    return np.asarray(upper, dtype=float) - lower
+
+
+# --------------------------------------
+# Memoized
+# --------------------------------------
+def _bounds_key(stat_type, bounds):
+    """(min, max) as floats, or (0, 1) for statistics that don't use bounds"""
+    if stat_type not in dstatic.DP_STATS_REQUIRE_BOUNDS:
+        return 0.0, 1.0
+    if bounds is None:
+        raise ValueError(dstatic.ERR_MSG_ACCURACY_BOUNDS_REQUIRED.format(stat_type=stat_type))
+    if hasattr(bounds, 'min'):
+        return float(bounds.min), float(bounds.max)
+    lower, upper = bounds
+    return float(lower), float(upper)
+
+
+def _check_args(stat_type, mechanism):
+    """Check the statistic type and mechanism. Returns the mechanism, defaulted."""
+    if stat_type not in dstatic.DP_STATS_CHOICES:
+        raise ValueError(dstatic.ERR_MSG_INVALID_STAT_TYPE.format(stat_type=stat_type))
+    if mechanism is None:
+        mechanism = get_mechanism(stat_type, integer=False)
+    elif mechanism not in NOISE_ACCURACY:
+        raise ValueError(dstatic.ERR_MSG_INVALID_MECHANISM.format(mechanism=mechanism, mechanisms=MECHANISMS))
+    return mechanism
+
+
+@lru_cache(maxsize=DEFAULT_CACHE_SIZE)
+def _cached_accuracy(stat_type, bounds, epsilon, delta, confidence_level, mechanism, max_contributions, num_rows,
+                     rows_public):
+    # "delta" is part of the key only: Laplace and Geometric noise are pure epsilon-DP
+    return float(stat_accuracy(stat_type, bounds[0], bounds[1], epsilon, 1 - confidence_level, mechanism,
+                               max_contributions, num_rows, rows_public))
+
+
+def get_accuracy(stat_type, bounds, epsilon, delta=None, confidence_level=dstatic.DEFAULT_CONFIDENCE_LEVEL,
+                 mechanism=None, max_contributions=1, num_rows=dstatic.DEFAULT_EXPECTED_ROWS, rows_public=False):
+    """
+    Accuracy of a statistic at a confidence level.
+
+    bounds - (min, max) or a Bounds object; ignored by counts and histograms
+    epsilon, confidence_level, num_rows - numbers or arrays (for sweeps)
+    mechanism - NOISE_LAPLACE_MECHANISM or NOISE_GEOMETRIC_MECHANISM. By
+        default, that of a Float variable in the generated scripts.
+    rows_public - the plan's "number_of_rows_public", which sets the sensitivities
+
+    Single values are memoized; arrays are computed at once with NumPy.
+    """
+    mechanism = _check_args(stat_type, mechanism)
+    bounds = _bounds_key(stat_type, bounds)
+
+    if np.ndim(epsilon) or np.ndim(confidence_level) or np.ndim(num_rows):
+        alpha = 1 - np.asarray(confidence_level, dtype=float)
+        return stat_accuracy(stat_type, bounds[0], bounds[1], epsilon, alpha, mechanism, max_contributions, num_rows,
+                             rows_public)
+    return _cached_accuracy(stat_type, bounds, float(epsilon), delta, float(confidence_level), mechanism,
+                            max_contributions, num_rows, bool(rows_public))
+
+
+@lru_cache(maxsize=DEFAULT_CACHE_SIZE)
+def _cached_accuracy_table(stat_type, bounds, epsilon, delta, mechanism, max_contributions, num_rows, rows_public):
+    accuracies = stat_accuracy(stat_type, bounds[0], bounds[1], epsilon,
+                               1 - np.asarray(dstatic.CONFIDENCE_LEVELS), mechanism, max_contributions, num_rows,
+                               rows_public)
+    return tuple(zip(dstatic.CONFIDENCE_LEVELS, accuracies.tolist()))
+
+
+def get_accuracy_table(stat_type, bounds, epsilon, delta=None, mechanism=None,
+                       max_contributions=1, num_rows=dstatic.DEFAULT_EXPECTED_ROWS, rows_public=False):
+    """The accuracy at each of CONFIDENCE_LEVELS, as {confidence level: accuracy}. Memoized."""
+    mechanism = _check_args(stat_type, mechanism)
+    return dict(_cached_accuracy_table(stat_type, _bounds_key(stat_type, bounds), float(epsilon), delta,
+                                       mechanism, max_contributions, num_rows, bool(rows_public)))
+
+
+def cache_info():
+    """Hits and misses of the memoized functions"""
+    return dict(accuracy=_cached_accuracy.cache_info()._asdict(),
+                accuracy_table=_cached_accuracy_table.cache_info()._asdict())
+
+
+def cache_clear():
+    _cached_accuracy.cache_clear()
+    _cached_accuracy_table.cache_clear()
@@ -0,0 +1,145 @@
+"""
+Bulk validation of DP Creator specs
+
+Specs are read from a JSONL stream (one spec per line), validated as
+`AnalysisPlan` objects in a pool of worker processes and the results are
+yielded in input order.
+
+Only a bounded number of chunks is in flight at any time, so memory stays flat
+regardless of the length of the input stream.
+
+Command line:
+    python -m dpcreator_script_maker.bulk_validation specs.jsonl --workers 8
+"""
+import argparse
+import json
+import os
+import sys
+import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+DEFAULT_CHUNK_SIZE = 64
+
+# Set once per worker process by init_worker()
+_validate_json = None
+
+
+def init_worker():
+    """Build the pydantic validator once per process and reuse it for every spec"""
+    global _validate_json
+    from dpcreator_script_maker.models import AnalysisPlan
+    _validate_json = AnalysisPlan.model_validate_json
+
+
+def validate_spec_line(line_number, line):
+    """
+    Validate a single JSON spec and return a JSON-serializable result, e.g.
+        {"line": 3, "valid": false, "name": null, "errors": [...], "warnings": []}
+    A ValueError or TypeError raised while validating is reported as an error of the line.
+    """
+    from pydantic import ValidationError
+
+    if _validate_json is None:
+        init_worker()
+
+    result = dict(line=line_number, valid=True, name=None, errors=[], warnings=[])
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        try:
+            plan = _validate_json(line)
+            result['name'] = plan.name
+        except ValidationError as err:
+            result['valid'] = False
+            result['errors'] = err.errors(include_url=False,
+                                          include_context=False,
+                                          include_input=False)
+        except (ValueError, TypeError) as err:
+            # Raised outside pydantic's error handling: report it like a
+            # validation error instead of failing the whole chunk
+            result['valid'] = False
+            result['errors'] = [dict(type='value_error' if isinstance(err, ValueError) else 'type_error',
+                                     loc=(), msg=f'{type(err).__name__}: {err}')]
+    result['warnings'] = [str(w.message) for w in caught]
+    return result
+
+
+def validate_chunk(chunk):
+    """Validate a list of (line_number, line) pairs"""
+    return [validate_spec_line(line_number, line) for line_number, line in chunk]
+
+
+def _iter_chunks(lines, chunk_size):
+    """Group the non-blank lines into lists of (line_number, line). Line numbers start at 1"""
+    numbered = ((num, line) for num, line in enumerate(lines, start=1) if line.strip())
+    while True:
+        chunk = list(islice(numbered, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_validate_specs(lines, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, max_pending_chunks=None):
+    """
+    Validate JSONL specs and yield one result per spec, in input order.
+
+    lines - any iterable of JSON strings, e.g. an open file. It is consumed lazily.
+    workers - number of worker processes. Defaults to os.cpu_count(). Use 0 to validate in-process.
+    chunk_size - number of specs sent to a worker at once
+    max_pending_chunks - maximum chunks in flight. Defaults to 2 x workers.
+    """
+    if chunk_size < 1:
+        raise ValueError('"chunk_size" must be at least 1.')
+
+    chunks = _iter_chunks(lines, chunk_size)
+
+    if workers == 0:
+        for chunk in chunks:
+            yield from validate_chunk(chunk)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    max_pending_chunks = max_pending_chunks or 2 * workers
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(validate_chunk, chunk))
+            if len(pending) >= max_pending_chunks:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def main(argv=None, prog=None):
+    """Validate a JSONL file of specs and write one JSON result per line"""
+    parser = argparse.ArgumentParser(prog=prog, description='Validate DP Creator specs from a JSONL file.')
+    parser.add_argument('input', help='JSONL file with one spec per line, or "-" for stdin')
+    parser.add_argument('-o', '--output', help='Write results to this file instead of stdout')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='Number of worker processes (default: CPU count, 0: no pool)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='Number of specs sent to a worker at once')
+    args = parser.parse_args(argv)
+
+    infile = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    outfile = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+
+    num_invalid = 0
+    try:
+        for result in iter_validate_specs(infile, workers=args.workers, chunk_size=args.chunk_size):
+            if not result['valid']:
+                num_invalid += 1
+            outfile.write(json.dumps(result) + '\n')
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+        if outfile is not sys.stdout:
+            outfile.close()
+
+    return 1 if num_invalid else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
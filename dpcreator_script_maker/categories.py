@@ -0,0 +1,266 @@
+"""
+Compact storage of (possibly very large) category lists
+
+`CategoryIndex` is how a Variable keeps its categories: each distinct
+category once, in its original order, joined into a single string by a
+separator character that no category contains. There are no per-category
+objects, so 100k+ categories take a fraction of the memory of the list they
+came from. It is built with C-level passes (a set to find duplicates, one
+join), in about the time of building a set of the categories, and listed
+again with one split.
+
+The offsets of the categories and the hash index behind membership checks
+and histogram bin lookups are built with NumPy on the first lookup: a table
+of buckets of positions, so each lookup is O(1). Validating a spec only
+needs them when a categorical variable sets an impute constant.
+
+Categories are strings or numbers. As with Python equality, 1 and 1.0 are the
+same category, while "1" is a different one.
+"""
+
+_KIND_STR = 0
+_KIND_NUMBER = 1
+
+# Separators to join the categories with: the first one that no category contains
+_SEPARATORS = '\x00\x01\x02\x03\x1e\x1f'
+
+# Multiplier of the polynomial hash of the code points, and the constant mixing its bits
+_HASH_BASE = 0x100000001B3
+_HASH_MIX = 0xFF51AFD7ED558CCD
+
+
+def category_key(value):
+    """
+    Return (text, kind) for a category, or None if the value can't be a category.
+    e.g. "CT" -> ("CT", 0), 3 -> ("3.0", 1)
+    """
+    if isinstance(value, str):
+        return value, _KIND_STR
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # "+ 0.0" so that -0.0 and 0.0 share a key, as they are equal
+        return repr(float(value) + 0.0), _KIND_NUMBER
+    return None
+
+
+def split_codes(text, separator):
+    """
+    The code points of a joined text, with the start and length of each part,
+    as NumPy arrays
+    """
+    import numpy as np
+
+    codes = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    ends = np.append(np.flatnonzero(codes == ord(separator)), len(codes))
+    starts = np.append(0, ends[:-1] + 1)
+    return codes, starts, ends - starts
+
+
+def hash_parts(codes, starts, lengths):
+    """
+    A 64-bit hash of each part codes[start:start + length], all at once. Unlike
+    hash(), it is the same in every process.
+    """
+    import numpy as np
+
+    hashes = np.zeros(len(starts), dtype=np.uint64)
+    nonempty = lengths > 0
+    if nonempty.any():
+        # sum(code * BASE ** (rank + 1)) over the code points of each part, modulo 2 ** 64
+        powers = np.cumprod(np.full(int(lengths.max()), _HASH_BASE, dtype=np.uint64))
+        in_part = np.repeat(starts[nonempty], lengths[nonempty])
+        ranks = np.arange(len(in_part)) - np.repeat(np.cumsum(lengths[nonempty]) - lengths[nonempty],
+                                                     lengths[nonempty])
+        hashes[nonempty] = np.add.reduceat(codes[in_part + ranks].astype(np.uint64) * powers[ranks],
+                                           np.cumsum(lengths[nonempty]) - lengths[nonempty])
+    hashes ^= lengths.astype(np.uint64)
+    hashes ^= hashes >> np.uint64(33)
+    hashes *= np.uint64(_HASH_MIX)
+    hashes ^= hashes >> np.uint64(33)
+    return hashes
+
+
+def join_texts(texts):
+    """Join texts with the first separator that none of them contains"""
+    for separator in _SEPARATORS:
+        text = separator.join(texts)
+        if text.count(separator) == max(len(texts) - 1, 0):
+            return text, separator
+    raise ValueError('Categories may not all contain control characters \\x00-\\x03, \\x1e and \\x1f')
+
+
+class CategoryIndex:
+    """
+    Deduplicated set of categories in their original order.
+    The position of a category is its histogram bin.
+
+    >>> idx = CategoryIndex(["CT", "ME", "MA", "ME"])
+    >>> len(idx), idx.duplicates, "MA" in idx, idx.position("MA")
+    (3, ('ME',), True, 2)
+    """
+    __slots__ = ('_text', '_separator', '_length', '_kinds', '_table', 'duplicates')
+
+    def __init__(self, categories):
+        categories = categories if isinstance(categories, list) else list(categories)
+        all_strings = set(map(type, categories)) <= {str}
+        if not all_strings:
+            for value in categories:
+                if category_key(value) is None:
+                    raise ValueError(f'Categories must be strings or numbers, not: {value!r}')
+
+        # Keep the first of each set of equal categories, in order
+        unique = categories
+        duplicates = []
+        if len(set(categories)) < len(categories):
+            unique = list(dict.fromkeys(categories))
+            seen = set()
+            for value in categories:
+                if value in seen:
+                    duplicates.append(value)
+                seen.add(value)
+
+        if all_strings:
+            texts, kinds = unique, None
+        else:
+            keys = list(map(category_key, unique))
+            texts = [text for text, _ in keys]
+            kinds = bytes(kind for _, kind in keys)
+        text, separator = join_texts(texts)
+        self._set_state(text, separator, len(texts), kinds)
+        self.duplicates = tuple(duplicates)
+
+    def _set_state(self, text, separator, length, kinds):
+        self._text = text
+        self._separator = separator
+        self._length = length
+        self._kinds = kinds  # one byte per category (0: string, 1: number), or None if all are strings
+        self._table = None
+
+    def state(self):
+        """(text, separator, number of categories, kinds): everything needed to rebuild the index"""
+        return self._text, self._separator, self._length, self._kinds
+
+    @classmethod
+    def from_state(cls, state, duplicates=()):
+        """Rebuild an index from state(), without checking the categories again"""
+        index = cls.__new__(cls)
+        index._set_state(*state)
+        index.duplicates = tuple(duplicates)
+        return index
+
+    def _texts(self):
+        return self._text.split(self._separator) if self._length else []
+
+    def _kind_at(self, position):
+        return _KIND_STR if self._kinds is None else self._kinds[position]
+
+    def _lookup_table(self):
+        """
+        (start of each category in the text, bucket starts, positions by bucket,
+        bucket mask), built on the first lookup
+        """
+        if self._table is None:
+            import numpy as np  # only needed here: validating a spec doesn't import NumPy
+
+            codes, starts, lengths = split_codes(self._text, self._separator)
+            num_buckets = 1 << max(self._length - 1, 1).bit_length()
+            mask = num_buckets - 1
+            buckets = (hash_parts(codes, starts, lengths) & np.uint64(mask)).astype(np.int64)
+            bucket_starts = np.zeros(num_buckets + 1, dtype=np.int32)
+            np.cumsum(np.bincount(buckets, minlength=num_buckets), out=bucket_starts[1:])
+            positions = np.argsort(buckets, kind='stable').astype(np.int32)
+            self._table = (np.append(starts, len(codes) + 1), bucket_starts, positions, mask)
+        return self._table
+
+    def _text_at(self, position):
+        offsets = self._lookup_table()[0]
+        return self._text[offsets[position]:offsets[position + 1] - 1]
+
+    def position(self, value):
+        """Return the position (histogram bin) of a category, or -1 if it is not a category"""
+        return int(self.positions([value])[0])
+
+    def positions(self, values):
+        """The position of each value, or -1, as a NumPy array. The values are hashed at once."""
+        import numpy as np
+
+        # Values that can't be categories get a kind that matches nothing
+        keys = [category_key(value) or ('', -1) for value in values]
+        result = np.full(len(keys), -1, dtype=np.int64)
+        if not self._length or not keys:
+            return result
+        _, bucket_starts, positions, mask = self._lookup_table()
+        texts = [text for text, _ in keys]
+        text, separator = join_texts(texts)
+        buckets = (hash_parts(*split_codes(text, separator)) & np.uint64(mask)).astype(np.int64)
+
+        # Walk the buckets, one candidate of each at a time: most hold at most one category
+        first, end = bucket_starts[buckets], bucket_starts[buckets + 1]
+        pending = np.flatnonzero(first < end)
+        rank = 0
+        while pending.size:
+            candidates = positions[first[pending] + rank]
+            found = np.fromiter((self._text_at(position) == texts[idx] and self._kind_at(position) == keys[idx][1]
+                                 for idx, position in zip(pending.tolist(), candidates.tolist())),
+                                dtype=bool, count=pending.size)
+            result[pending[found]] = candidates[found]
+            rank += 1
+            pending = pending[~found & (first[pending] + rank < end[pending])]
+        return result
+
+    def __contains__(self, value):
+        return self.position(value) != -1
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, position):
+        if not -len(self) <= position < len(self):
+            raise IndexError('CategoryIndex position out of range')
+        position %= len(self)
+        text = self._text_at(position)
+        return float(text) if self._kind_at(position) == _KIND_NUMBER else text
+
+    def __iter__(self):
+        texts = self._texts()
+        if self._kinds is None:
+            return iter(texts)
+        return (float(text) if kind == _KIND_NUMBER else text for text, kind in zip(texts, self._kinds))
+
+    def __eq__(self, other):
+        if not isinstance(other, CategoryIndex):
+            return NotImplemented
+        return list(self) == list(other) if self._separator != other._separator else \
+            (self._text, self._length, self._kinds) == (other._text, other._length, other._kinds)
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return (self.__class__.from_state, (self.state(), self.duplicates))
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({len(self)} categories)'
+
+    @property
+    def nbytes(self):
+        """Approximate memory used by the categories and, once built, the lookup table, in bytes"""
+        size = len(self._text.encode('utf-8', 'surrogatepass'))
+        if self._table is not None:
+            size += sum(array.nbytes for array in self._table[:3])
+        return size
+
+    def bin_indices(self, values):
+        """
+        Map an array of values to histogram bins, -1 for values that aren't categories.
+        Each distinct value is looked up once.
+        """
+        import numpy as np  # only needed here: validating a spec doesn't import NumPy
+
+        values = np.asarray(values, dtype=object)
+        if values.size == 0:
+            return np.empty(values.shape, dtype=np.int64)
+        try:
+            uniques, inverse = np.unique(values, return_inverse=True)
+        except TypeError:
+            # Mixed strings and numbers can't be sorted
+            return self.positions(values.ravel().tolist()).reshape(values.shape)
+        return self.positions(uniques.tolist())[inverse].reshape(values.shape)
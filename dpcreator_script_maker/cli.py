@@ -0,0 +1,140 @@
+"""
+Command line interface
+
+    dpcreator-script-maker --version
+    dpcreator-script-maker validate spec.json
+    dpcreator-script-maker generate spec.json -o dp_script.py [--streaming] [--workers N]
+    dpcreator-script-maker bulk-validate specs.jsonl --workers 8
+    dpcreator-script-maker serve --port 8765 --workers 4
+
+It is run thousands of times from job schedulers, so only argparse is
+imported up front. pydantic and the models are imported by the commands that
+use them: "--version" and "--help" import neither.
+"""
+import argparse
+import sys
+
+from dpcreator_script_maker import __version__
+
+PROG = 'dpcreator-script-maker'
+
+
+def read_spec(path):
+    """The spec's JSON, as bytes, from a file or "-" for stdin"""
+    if path == '-':
+        return sys.stdin.buffer.read()
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def load_plan(path):
+    """
+    Validate the spec from its JSON, without building Python dicts first.
+    Return (AnalysisPlan, None), or (None, the error message)
+    """
+    try:
+        data = read_spec(path)
+    except OSError as err:
+        return None, str(err)
+
+    from pydantic import ValidationError
+    from dpcreator_script_maker.models import AnalysisPlan
+
+    try:
+        return AnalysisPlan.model_validate_json(data), None
+    except ValidationError as err:
+        return None, str(err)
+
+
+def validate(args):
+    plan, error = load_plan(args.spec)
+    if error:
+        print(error, file=sys.stderr)
+        return 1
+    print(f'Valid: "{plan.name}", {len(plan.dataset.variables)} variables,'
+          f' {len(plan.statistics)} statistics')
+    return 0
+
+
+def generate(args):
+    from dpcreator_script_maker.dp_script_maker import DPCreatorScriptMaker
+    import dpcreator_script_maker.static_vals as dstatic
+
+    plan, error = load_plan(args.spec)
+    if error:
+        print(error, file=sys.stderr)
+        return 1
+    try:
+        script = DPCreatorScriptMaker(plan, max_contributions=args.max_contributions, streaming=args.streaming,
+                                      max_memory_mb=args.max_memory_mb or dstatic.DEFAULT_STREAMING_MAX_MEMORY_MB,
+                                      workers=args.workers, inline_runtime=args.inline_runtime).script
+    except ValueError as err:
+        print(err, file=sys.stderr)
+        return 1
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(script)
+    else:
+        sys.stdout.write(script)
+    return 0
+
+
+def serve(args):
+    from dpcreator_script_maker import server
+    server.serve(args.host or server.DEFAULT_HOST, args.port or server.DEFAULT_PORT, args.workers,
+                 server.DEFAULT_MAX_QUEUE if args.max_queue is None else args.max_queue)
+    return 0
+
+
+def bulk_validate(argv):
+    """Its arguments are parsed by bulk_validation.main()"""
+    from dpcreator_script_maker import bulk_validation
+    return bulk_validation.main(argv, prog=f'{PROG} bulk-validate')
+
+
+def make_parser():
+    """The parser and its subcommands. Defaults from static_vals are filled in by the commands"""
+    parser = argparse.ArgumentParser(prog=PROG, description='Generate OpenDP scripts from DP Creator specs.')
+    parser.add_argument('--version', action='version', version=f'{PROG} {__version__}')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('validate', help='validate a JSON spec')
+    command.add_argument('spec', help='JSON spec file, or "-" for stdin')
+    command.set_defaults(func=validate)
+
+    command = commands.add_parser('generate', help='validate a JSON spec and write its OpenDP script')
+    command.add_argument('spec', help='JSON spec file, or "-" for stdin')
+    command.add_argument('-o', '--output', help='write the script to this file instead of stdout')
+    command.add_argument('--max-contributions', type=int,
+                         help='maximum rows per individual, if "individual_in_at_most_one_row" is false')
+    command.add_argument('--streaming', action='store_true', help='read the data in chunks')
+    command.add_argument('--max-memory-mb', type=float, help='peak memory of a streaming or parallel script')
+    command.add_argument('--workers', type=int, help='number of worker processes of a parallel script')
+    command.add_argument('--inline-runtime', action='store_true',
+                         help='include the runtime, so the script runs without dpcreator_script_maker')
+    command.set_defaults(func=generate)
+
+    command = commands.add_parser('serve', help='validate specs and generate scripts over HTTP, on this machine')
+    command.add_argument('--host', help='default: 127.0.0.1')
+    command.add_argument('--port', type=int, help='default: 8765')
+    command.add_argument('--workers', type=int, help='number of worker processes (default: CPU count)')
+    command.add_argument('--max-queue', type=int,
+                         help='requests that may wait for a worker; any more are refused (503). Default: 64')
+    command.set_defaults(func=serve)
+
+    # Listed for --help; main() passes its arguments on before parsing
+    commands.add_parser('bulk-validate', help='validate a JSONL file of specs (see "bulk-validate --help")')
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv[:1] == ['bulk-validate']:
+        return bulk_validate(argv[1:])
+    args = make_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""
+Columnar validation of very wide datasets
+
+The per-model path (`Dataset(**data)`) builds a `Variable` and runs its model
+validators once per column. For datasets with tens of thousands of variables,
+this per-object overhead dominates.
+
+The columnar path:
+  1. parses the variables as plain dicts, in one pydantic-core call, with no
+     Python validators
+  2. runs the `Bounds` and `Variable` model validator checks as array
+     operations over all variables at once
+
+It raises the same `ValidationError` as `Dataset(**data)`. When the input is
+malformed (e.g. a missing field or a bad var_type), the per-model path is used
+to build the error so the two always match.
+"""
+from typing import List, Optional, Union
+
+import numpy as np
+from pydantic import Field, TypeAdapter, ValidationError
+from typing_extensions import Annotated, Literal, NotRequired, TypedDict
+
+import dpcreator_script_maker.static_vals as dstatic
+from dpcreator_script_maker.categories import CategoryIndex
+from dpcreator_script_maker.models import Dataset
+
+
+class BoundsRow(TypedDict):
+    min: float
+    max: float
+
+
+class VariableRow(TypedDict):
+    """Same fields as models.Variable, without the model validators"""
+    name: str
+    var_type: Literal[*dstatic.ALLOWED_VAR_TYPES]
+    bounds: NotRequired[Optional[BoundsRow]]
+    categories: NotRequired[Optional[List[Union[str, float]]]]
+    true_value: NotRequired[Optional[Union[str, float, bool]]]
+    false_value: NotRequired[Optional[Union[str, float, bool]]]
+    impute_constant: NotRequired[Optional[Union[str, float, bool]]]
+    missing_value_handling: NotRequired[Optional[Literal[*dstatic.MISSING_VAL_STRATEGIES]]]
+
+
+class DatasetRows(TypedDict):
+    """Same fields as models.Dataset"""
+    name: str
+    description: NotRequired[Optional[str]]
+    file_format: NotRequired[Literal[*dstatic.FILE_FORMAT_CHOICES]]
+    variables: Annotated[List[VariableRow], Field(min_length=1)]
+
+
+_dataset_rows_adapter = TypeAdapter(DatasetRows)
+
+# Error codes, in the order the per-model validators run. The first failing check wins.
+_OK = 0
+_ERR_BOUNDS_ORDER = 1
+_ERR_BOUNDS_REQUIRED = 2
+_ERR_BOUNDS_NOT_ALLOWED = 3
+_ERR_MIN_NOT_INTEGER = 4
+_ERR_MAX_NOT_INTEGER = 5
+_ERR_CATEGORIES_REQUIRED = 6
+_ERR_CATEGORIES_NOT_ALLOWED = 7
+_ERR_CATEGORIES_DUPLICATE = 8
+_ERR_BOOLEAN_SET_BOTH = 9
+_ERR_BOOLEAN_EQUAL = 10
+_ERR_IMPUTE_NOT_IN_CATEGORIES = 11
+_ERR_IMPUTE_CONSTANT_REQUIRED = 12
+_ERR_IMPUTE_CONSTANT_NOT_ALLOWED = 13
+
+
+def find_variable_errors(variables):
+    """
+    Run the Bounds/Variable model validator checks over parsed variable rows.
+    Returns an int array with one error code per variable (0 if valid).
+    """
+    num_vars = len(variables)
+    var_types = np.fromiter((v['var_type'] for v in variables), dtype=object, count=num_vars)
+    is_integer = var_types == dstatic.VAR_TYPE_INTEGER
+    is_numeric = is_integer | (var_types == dstatic.VAR_TYPE_FLOAT)
+    is_categorical = var_types == dstatic.VAR_TYPE_CATEGORICAL
+    is_boolean = var_types == dstatic.VAR_TYPE_BOOLEAN
+
+    # Bounds, with NaN when not set
+    bounds = [v.get('bounds') for v in variables]
+    has_bounds = np.fromiter((b is not None for b in bounds), dtype=bool, count=num_vars)
+    bound_min = np.fromiter((b['min'] if b is not None else np.nan for b in bounds),
+                            dtype=float, count=num_vars)
+    bound_max = np.fromiter((b['max'] if b is not None else np.nan for b in bounds),
+                            dtype=float, count=num_vars)
+
+    num_categories = np.fromiter((len(v.get('categories') or ()) for v in variables),
+                                 dtype=np.int64, count=num_vars)
+
+    # Duplicate and impute checks need each categorical variable's index
+    has_duplicates = np.zeros(num_vars, dtype=bool)
+    impute_not_in_categories = np.zeros(num_vars, dtype=bool)
+    for idx in np.flatnonzero(is_categorical & (num_categories > 0)).tolist():
+        category_index = CategoryIndex(variables[idx]['categories'])
+        has_duplicates[idx] = bool(category_index.duplicates)
+        impute_val = variables[idx].get('impute_constant')
+        impute_not_in_categories[idx] = impute_val is not None and impute_val not in category_index
+
+    true_values = np.fromiter((v.get('true_value') for v in variables), dtype=object, count=num_vars)
+    false_values = np.fromiter((v.get('false_value') for v in variables), dtype=object, count=num_vars)
+    true_is_none = true_values == None  # noqa: E711 - elementwise comparison
+    false_is_none = false_values == None  # noqa: E711
+
+    handling = np.fromiter((v.get('missing_value_handling') for v in variables), dtype=object, count=num_vars)
+    has_impute = np.fromiter((v.get('impute_constant') is not None for v in variables), dtype=bool, count=num_vars)
+    insert_fixed = handling == dstatic.MISSING_VAL_INSERT_FIXED
+    other_handling = ~insert_fixed & (handling != None)  # noqa: E711
+
+    with np.errstate(invalid='ignore'):
+        # Note: "not (min < max)" so that NaN bounds behave like the model validator
+        bounds_out_of_order = has_bounds & ~(bound_min < bound_max)
+        min_not_integer = np.mod(bound_min, 1) != 0
+        max_not_integer = np.mod(bound_max, 1) != 0
+
+    conditions = [
+        # Bounds.check_min_max_constraints
+        bounds_out_of_order,
+        # Variable.check_bound_types
+        is_numeric & ~has_bounds,
+        ~is_numeric & has_bounds,
+        is_integer & min_not_integer,
+        is_integer & max_not_integer,
+        # Variable.check_categorical_constraints
+        is_categorical & (num_categories == 0),
+        ~is_categorical & (num_categories > 0),
+        has_duplicates,
+        # Variable.check_boolean_constraints
+        is_boolean & (true_is_none != false_is_none),
+        is_boolean & ~true_is_none & ~false_is_none & (true_values == false_values),
+        # Variable.check_impute_constant
+        impute_not_in_categories,
+        # Variable.check_missing_value_handling
+        insert_fixed & ~has_impute,
+        other_handling & has_impute,
+    ]
+    choices = [_ERR_BOUNDS_ORDER, _ERR_BOUNDS_REQUIRED, _ERR_BOUNDS_NOT_ALLOWED,
+               _ERR_MIN_NOT_INTEGER, _ERR_MAX_NOT_INTEGER,
+               _ERR_CATEGORIES_REQUIRED, _ERR_CATEGORIES_NOT_ALLOWED, _ERR_CATEGORIES_DUPLICATE,
+               _ERR_BOOLEAN_SET_BOTH, _ERR_BOOLEAN_EQUAL,
+               _ERR_IMPUTE_NOT_IN_CATEGORIES, _ERR_IMPUTE_CONSTANT_REQUIRED, _ERR_IMPUTE_CONSTANT_NOT_ALLOWED]
+    return np.select(conditions, choices, default=_OK)
+
+
+def _error_message(code, variable):
+    """Return the model validator's message for a variable's error code"""
+    var_type = variable['var_type']
+    if code == _ERR_CATEGORIES_DUPLICATE:
+        duplicates = CategoryIndex(variable['categories']).duplicates
+        return dstatic.ERR_MSG_CATEGORIES_DUPLICATE.format(category=duplicates[0])
+    return {
+        _ERR_BOUNDS_ORDER: dstatic.ERR_MSG_BOUNDS_MAX_NOT_GREATER,
+        _ERR_BOUNDS_REQUIRED: dstatic.ERR_MSG_BOUNDS_REQUIRED.format(var_type=var_type),
+        _ERR_BOUNDS_NOT_ALLOWED: dstatic.ERR_MSG_BOUNDS_NOT_ALLOWED.format(var_type=var_type),
+        _ERR_MIN_NOT_INTEGER: dstatic.ERR_MSG_BOUNDS_MIN_NOT_INTEGER,
+        _ERR_MAX_NOT_INTEGER: dstatic.ERR_MSG_BOUNDS_MAX_NOT_INTEGER,
+        _ERR_CATEGORIES_REQUIRED: dstatic.ERR_MSG_CATEGORIES_REQUIRED,
+        _ERR_CATEGORIES_NOT_ALLOWED: dstatic.ERR_MSG_CATEGORIES_NOT_ALLOWED,
+        _ERR_BOOLEAN_SET_BOTH: dstatic.ERR_MSG_BOOLEAN_SET_BOTH_VALUES,
+        _ERR_BOOLEAN_EQUAL: dstatic.ERR_MSG_BOOLEAN_VALUES_EQUAL,
+        _ERR_IMPUTE_NOT_IN_CATEGORIES: dstatic.ERR_MSG_IMPUTE_NOT_IN_CATEGORIES,
+        _ERR_IMPUTE_CONSTANT_REQUIRED: dstatic.ERR_MSG_IMPUTE_CONSTANT_REQUIRED,
+        _ERR_IMPUTE_CONSTANT_NOT_ALLOWED: dstatic.ERR_MSG_IMPUTE_CONSTANT_NOT_ALLOWED,
+    }[code]
+
+
+def validate_dataset_columnar(data):
+    """
+    Validate dataset input (same as `Dataset(**data)`) using batched checks.
+    Returns the validated dataset as a dict of plain values, e.g.
+        {"name": "Teacher Survey", "variables": [{"name": "Income", "var_type": "Integer", ...}]}
+    Raises the same pydantic ValidationError as the per-model path.
+    """
+    try:
+        rows = _dataset_rows_adapter.validate_python(data)
+    except ValidationError:
+        # Malformed input: let the models build the exact errors
+        Dataset.model_validate(data)
+        raise  # pragma: no cover - the models are expected to raise as well
+
+    variables = rows['variables']
+    error_codes = find_variable_errors(variables)
+    bad_indices = np.flatnonzero(error_codes)
+    if bad_indices.size == 0:
+        return rows
+
+    line_errors = []
+    for idx in bad_indices.tolist():
+        code = int(error_codes[idx])
+        loc = ('variables', idx)
+        original_input = data['variables'][idx]
+        if code == _ERR_BOUNDS_ORDER:
+            loc = loc + ('bounds',)
+            original_input = original_input['bounds']
+        message = _error_message(code, variables[idx])
+        line_errors.append(dict(type='value_error',
+                                loc=loc,
+                                input=original_input,
+                                ctx=dict(error=ValueError(message))))
+
+    raise ValidationError.from_exception_data(Dataset.__name__, line_errors)
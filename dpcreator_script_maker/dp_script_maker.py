@@ -1,9 +1,431 @@
+"""
+Generate an OpenDP script from a DP Creator spec
+"""
+from functools import lru_cache
+from importlib import resources
+import math
+
+import dpcreator_script_maker.static_vals as dstatic
+from dpcreator_script_maker import __version__
+from dpcreator_script_maker.histogram import BIN_BY_CATEGORY, BIN_BY_EDGES, equal_range_edges
+from dpcreator_script_maker.instrumentation import stage
+from dpcreator_script_maker.models import AnalysisPlan
+from dpcreator_script_maker.planner import (ACC_HISTOGRAM, ACC_QUANTILE, ACC_ROWS, ALL_ROWS, STATS_USING_COUNT,
+                                            ScanPlan, histogram_sensitivity, neighbours, sum_sensitivity,
+                                            sum_squares_sensitivity)
+from dpcreator_script_maker.templates import get_stat_template, get_template
+
+
+def comment_text(value):
+    """Make a value safe to embed in a generated comment or docstring"""
+    text = ' '.join(str(value).split())
+    return text.replace('\\', '\\\\').replace('"""', '\\"\\"\\"')
+
+
+@lru_cache(maxsize=None)
+def get_runtime_source():
+    """The code of runtime.py that standalone scripts include, read without importing OpenDP"""
+    source = resources.files(__package__).joinpath('runtime.py').read_text(encoding='utf-8')
+    return source[source.index(dstatic.RUNTIME_START):]
+
+
+def quantile_candidates(lower, upper, integer, max_candidates=dstatic.DEFAULT_QUANTILE_MAX_CANDIDATES):
+    """
+    Candidate answers for a quantile, from the bounds.
+    Integer variables use every integer if there are few enough of them.
+    """
+    if integer and upper - lower + 1 <= max_candidates:
+        return list(range(int(lower), int(upper) + 1))
+    candidates = equal_range_edges(lower, upper, max_candidates - 1)
+    if integer:
+        candidates = sorted(set(round(candidate) for candidate in candidates))
+    return candidates
 
 
 class DPCreatorScriptMaker:
+    """
+    Validate a spec and render the OpenDP script that releases its statistics.
+
+        maker = DPCreatorScriptMaker(script_spec)
+        print(maker.script)
+
+    The spec may be a dict or an already validated AnalysisPlan.
+
+    With streaming=True, the script reads the data in chunks and keeps only the
+    running totals between chunks, so files larger than memory can be used.
+    With workers=N, N processes each scan a byte range of the file, in chunks,
+    and the script adds noise once to the merged totals.
+
+    Scripts import their noise mechanisms from dpcreator_script_maker.runtime,
+    which memoizes the OpenDP measurements. With inline_runtime=True, the
+    script includes a copy instead, and runs without this package.
+    """
+
+    def __init__(self, spec, max_contributions=None, streaming=False,
+                 max_memory_mb=dstatic.DEFAULT_STREAMING_MAX_MEMORY_MB, workers=None, inline_runtime=False):
+        """
+        max_contributions - maximum rows per individual. Only needed when
+            "individual_in_at_most_one_row" is False.
+        streaming - read the data in chunks
+        max_memory_mb - streaming or parallel only: the peak memory of the script
+        workers - number of worker processes, for a parallel script. The default
+            may be overridden when running it.
+        inline_runtime - include the runtime in the script, rather than importing it
+        """
+        if isinstance(spec, AnalysisPlan):
+            self.plan = spec
+        else:
+            with stage('validate'):
+                self.plan = AnalysisPlan.model_validate(spec)
 
-    def __init__(self):
+        if max_contributions is not None and (isinstance(max_contributions, bool)
+                                              or not isinstance(max_contributions, int) or max_contributions < 1):
+            raise ValueError(dstatic.ERR_MSG_MAX_CONTRIBUTIONS_NOT_POSITIVE.format(
+                max_contributions=max_contributions))
+        if self.plan.privacy_parameters.individual_in_at_most_one_row:
+            self.max_contributions = 1
+        elif max_contributions is not None:
+            self.max_contributions = max_contributions
+        else:
+            raise ValueError(dstatic.ERR_MSG_MAX_CONTRIBUTIONS_REQUIRED)
+
+        self.streaming = streaming
+        if (streaming or workers is not None) and not max_memory_mb > 0:
+            raise ValueError(dstatic.ERR_MSG_MAX_MEMORY_NOT_POSITIVE.format(max_memory_mb=max_memory_mb))
+        self.max_memory_mb = max_memory_mb
+
+        if workers is not None and (isinstance(workers, bool) or not isinstance(workers, int) or workers < 1):
+            raise ValueError(dstatic.ERR_MSG_WORKERS_NOT_POSITIVE.format(workers=workers))
+        self.workers = workers
+        self.inline_runtime = inline_runtime
+
+        self.script = None
         self.run_it()
 
     def run_it(self):
-        print('okay')
+        """Render the script, store it in self.script and return it"""
+        self.script = self.render_script()
+        return self.script
+
+    def check_budget(self):
+        """Make sure every statistic has an epsilon and together they don't exceed the total"""
+        for stat in self.plan.statistics:
+            if stat.epsilon is None:
+                raise ValueError(dstatic.ERR_MSG_STAT_EPSILON_MISSING.format(
+                    stat_type=stat.stat_type, var_name=stat.var_name))
+        requested = math.fsum(stat.epsilon.value for stat in self.plan.statistics)
+
+        available = self.plan.privacy_parameters.total_epsilon.value
+        if requested > available + dstatic.MAX_EPSILON_OFFSET:
+            raise ValueError(dstatic.ERR_MSG_NOT_ENOUGH_EPSILON_AVAILABLE.format(
+                available_epsilon=available, requested_epsilon=requested))
+        return requested
+
+    def render_script(self):
+        """Return the full script"""
+        epsilon_used = self.check_budget()
+        self._var_positions = {var.name: idx for idx, var in enumerate(self.plan.dataset.variables)}
+        self._constants = {}
+        rows_public = self.plan.privacy_parameters.number_of_rows_public
+
+        # Plan the scan and the shared counts, then render the release
+        with stage('plan_scan'):
+            scan_plan = ScanPlan()
+            planned = []
+            for stat in self.plan.statistics:
+                variable = self.plan.get_variable(stat)  # resolved when the plan was validated
+                planned.append((stat, variable, scan_plan.add_statistic(stat, variable)))
+            scan_plan.plan_counts(rows_public)
+
+        with stage('render_release'):
+            fragments = [self.render_shared_count(count) for count in scan_plan.counts.values()
+                         if not count.public]
+            fragments += [self.render_statistic(stat, variable, keys, scan_plan.counts.get(keys.get(ACC_ROWS)),
+                                                scan_plan.histograms.get(keys.get(ACC_HISTOGRAM)))
+                          for stat, variable, keys in planned]
+
+        with stage('render_scan'):
+            scan = ''
+            if scan_plan.count_all_rows:
+                scan = get_template('acc_rows_all').render(dict(key=repr((ALL_ROWS, ACC_ROWS))))
+            scan += ''.join(self.render_column_scan(column) for column in scan_plan.columns.values()
+                            if column.accumulators)
+
+            # Every total starts at 0, so that keys without rows are still released
+            zero_totals = [((ALL_ROWS, ACC_ROWS), '0')] if scan_plan.count_all_rows else []
+            zero_totals += [(column.key(accumulator), self.get_zero_total(column, accumulator))
+                            for column in scan_plan.columns.values() for accumulator in column.accumulators]
+
+        text_columns = [name for name, column in scan_plan.columns.items()
+                        if column.variable.var_type == dstatic.VAR_TYPE_CATEGORICAL
+                        and all(isinstance(cat, str) for cat in column.variable.categories)]
+        constants = ''.join(f'\n{name} = {literal}\n' for name, literal in self._constants.items())
+
+        # How the data is read: the whole file, in chunks, or in partitions by worker processes
+        file_format = self.plan.dataset.file_format
+        usage = f'python this_script.py data.{file_format}'
+        if self.workers is not None:
+            mode, usage = 'partitions', usage + ' [workers]'
+            main = get_template('main_parallel').render(dict(workers=self.workers,
+                                                             max_memory_mb=repr(self.max_memory_mb)))
+        elif self.streaming:
+            mode, usage = 'chunks', usage + ' [max_memory_mb]'
+            main = get_template('main_streaming').render(dict(max_memory_mb=repr(self.max_memory_mb)))
+        else:
+            mode = 'all'
+            main = get_template('main').render({})
+
+        reader = get_template(f'read_{file_format}_{mode}').render({})
+        if mode != 'all':
+            reader = get_template('chunk_rows').render({}) + reader
+
+        with stage('render_script'):
+            return get_template('script').render(dict(
+                plan_name=comment_text(self.plan.name),
+                dataset_name=comment_text(self.plan.dataset.name),
+                generator_version=__version__,
+                opendp_version=dstatic.OPENDP_VERSION,
+                epsilon_used=round(epsilon_used, 12),
+                total_epsilon=self.plan.privacy_parameters.total_epsilon.value,
+                num_passes=scan_plan.num_passes,
+                num_statistics=scan_plan.num_statistics,
+                num_columns=len(scan_plan.columns),
+                max_contributions=self.max_contributions,
+                neighbours=f'{neighbours(rows_public)} up to MAX_CONTRIBUTIONS rows'
+                           + (' (the number of rows is public)' if rows_public else ''),
+                usage=usage,
+                imports=self.get_imports(file_format, mode, self.inline_runtime),
+                columns=repr(list(scan_plan.columns)),
+                text_columns=repr(text_columns),
+                constants=constants,
+                scan=scan or '    pass\n',
+                zero_totals=''.join(f'        {key!r}: {zero},\n' for key, zero in zero_totals),
+                runtime=f'\n{get_runtime_source()}\n' if self.inline_runtime else '',
+                statistics=''.join(fragments),
+                reader=reader,
+                main=main))
+
+    @staticmethod
+    def get_imports(file_format, mode, inline_runtime=False):
+        """The script's import lines: standard library, third party, then the runtime"""
+        standard = ['import json', 'import sys']
+        third_party = ['import numpy as np', 'import opendp.prelude as dp', 'import pandas as pd']
+        if mode == 'partitions':
+            standard.append('from concurrent.futures import ProcessPoolExecutor')
+            if file_format == dstatic.FILE_FORMAT_CSV:
+                standard += ['import io', 'import os']
+        if file_format == dstatic.FILE_FORMAT_PARQUET:
+            third_party.append('import pyarrow.parquet as pq')
+        elif file_format == dstatic.FILE_FORMAT_ARROW:
+            third_party.append('import pyarrow as pa')
+        if inline_runtime:
+            standard.append('from functools import lru_cache')
+            runtime = []
+        else:
+            runtime = [f'from {dstatic.RUNTIME_MODULE} import {", ".join(dstatic.RUNTIME_FUNCTIONS)}']
+        return '\n'.join(''.join(f'{line}\n' for line in sorted(lines, key=lambda line: line.split()[1]))
+                          for lines in (standard, third_party, runtime) if lines)
+
+    def add_constant(self, kind, variable, literal, suffix=''):
+        """
+        Add a module level constant to the script, e.g. "HISTOGRAM_LABELS_0 = [...]",
+        and return its name
+        """
+        name = f'{kind}_{self._var_positions[variable.name]}{suffix}'
+        self._constants[name] = literal
+        return name
+
+    def render_column_scan(self, column):
+        """Render the scan of one column: prepare it once, then compute each accumulator"""
+        variable = column.variable
+        text = get_template('scan_column').render(dict(
+            title=comment_text(f'"{variable.name}": {", ".join(column.accumulators)}'),
+            column_args=self.get_column_args(variable)))
+
+        if column.needs_clamping:
+            lower, upper = self.get_bounds(variable)
+            text += get_template('scan_clamp').render(dict(lower=repr(lower), upper=repr(upper)))
+
+        for accumulator in column.accumulators:
+            context = dict(key=repr(column.key(accumulator)))
+            template_name = f'acc_{accumulator}'
+            if accumulator in column.histogram_bins:
+                template_name = self.get_histogram_context(variable, accumulator, column.histogram_bins[accumulator],
+                                                           context)
+            elif accumulator == ACC_QUANTILE:
+                context['candidates'] = self.get_quantile_candidates(variable)
+            text += get_template(template_name).render(context)
+        return text
+
+    def get_zero_total(self, column, accumulator):
+        """The literal of an accumulator's total over no rows"""
+        if accumulator in column.histogram_bins:
+            return f'np.zeros({column.histogram_bins[accumulator].num_bins}, dtype=np.int64)'
+        if accumulator == ACC_QUANTILE:
+            return f'np.zeros((2, len({self.get_quantile_candidates(column.variable)}) + 1), dtype=np.int64)'
+        return '0' if accumulator == ACC_ROWS else '0.0'
+
+    @staticmethod
+    def render_shared_count(count):
+        """Render a count released once, before the statistics using it"""
+        rows = 'all rows' if count.rows_key[0] == ALL_ROWS else f'"{count.rows_key[0]}"'
+        if count.auto_generated:
+            title = (f'{dstatic.KEY_AUTO_GENERATED_DP_COUNT} of {rows}, used by {len(count.users)}'
+                     f' statistic(s) (epsilon: {count.epsilon!r})')
+        else:
+            title = f'count of {rows}, requested below and also used by {len(count.users)} statistic(s)'
+        return get_template('shared_count').render(dict(title=comment_text(title),
+                                                        name=count.name,
+                                                        rows=repr(count.rows_key),
+                                                        epsilon=repr(count.epsilon)))
+
+    def render_statistic(self, stat, variable, keys, count=None, bins=None):
+        """
+        Render the release of one statistic. "keys" are its accumulators' keys in "totals",
+        "count" the SharedCount of its rows, if any, and "bins" the HistogramBins of a histogram.
+        """
+        stat_type = stat.stat_type
+        epsilon = stat.epsilon.value
+
+        result = dict(variable=variable.name, statistic=stat_type, epsilon=epsilon)
+        context = dict(
+            title=comment_text(f'{stat_type} of "{variable.name}" (epsilon: {epsilon})'),
+            result=repr(result),
+            epsilon=repr(epsilon),
+        )
+        context.update({accumulator: repr(key) for accumulator, key in keys.items()})
+
+        # Sensitivities per row, for the script's neighbouring relation
+        rows_public = self.plan.privacy_parameters.number_of_rows_public
+        if variable.bounds is not None:
+            lower, upper = self.get_bounds(variable)
+            integer = variable.var_type == dstatic.VAR_TYPE_INTEGER
+            number = int if integer else float
+            context.update(lower=repr(lower),
+                           upper=repr(upper),
+                           sum_sensitivity=repr(number(sum_sensitivity(lower, upper, rows_public,
+                                                                       variable.keeps_all_rows))),
+                           mechanism='geometric' if integer else 'laplace')
+
+        if stat_type == dstatic.DP_COUNT:
+            if count is not None and count.count_statistic is stat and not count.public:
+                context['count'] = count.name  # released before the statistics
+            else:
+                context['count'] = f'geometric(totals[{keys[ACC_ROWS]!r}], MAX_CONTRIBUTIONS, {epsilon!r})'
+        elif stat_type in STATS_USING_COUNT:
+            context.update(self.get_count_context(stat, count))
+
+        if stat_type == dstatic.DP_VARIANCE:
+            context.update(sum_squares_sensitivity=repr(float(sum_squares_sensitivity(lower, upper, rows_public,
+                                                                                      variable.keeps_all_rows))),
+                           max_variance=repr((upper - lower) ** 2 / 4))
+        elif stat_type == dstatic.DP_QUANTILE:
+            alphas = stat.quantile_alphas
+            candidates = self.get_quantile_candidates(variable)
+            if stat.quantiles is None:
+                value = f'float({candidates}[indices[0]])'
+            else:
+                value = f'dict(zip({alphas!r}, {candidates}[indices].tolist()))'
+                context['title'] = comment_text(f'quantiles {alphas} of "{variable.name}" (epsilon: {epsilon},'
+                                                f' split between them)')
+            context.update(alphas=repr(alphas),
+                           quantile_epsilon=repr(epsilon / len(alphas)),
+                           candidates=candidates,
+                           value=value)
+        elif stat_type == dstatic.DP_HISTOGRAM:
+            sensitivity = histogram_sensitivity(rows_public)
+            context['sensitivity'] = 'MAX_CONTRIBUTIONS' if sensitivity == 1 else f'{sensitivity} * MAX_CONTRIBUTIONS'
+            context['bin_labels'] = self.add_histogram_constant('HISTOGRAM_LABELS', variable, keys[ACC_HISTOGRAM][1],
+                                                                repr(bins.labels))
+
+        return get_stat_template(stat_type).render(context)
+
+    @staticmethod
+    def get_bounds(variable):
+        """Return (lower, upper), as ints for Integer variables"""
+        lower, upper = variable.bounds.min, variable.bounds.max
+        if variable.var_type == dstatic.VAR_TYPE_INTEGER:
+            return int(lower), int(upper)
+        return lower, upper
+
+    def get_column_args(self, variable):
+        """
+        Arguments for the script's get_column(), e.g. "'Income', 35, integer=True".
+        The column is prepared once and used by every statistic on the variable.
+        """
+        integer = variable.var_type == dstatic.VAR_TYPE_INTEGER
+        strategy = variable.missing_value_strategy
+        if strategy == dstatic.MISSING_VAL_INSERT_FIXED:
+            impute = repr(variable.impute_constant)
+        elif strategy == dstatic.MISSING_VAL_INSERT_RANDOM:
+            impute = self.get_random_impute(variable)
+        else:
+            impute = 'None'
+        args = [repr(variable.name), impute]
+        if variable.var_type in (dstatic.VAR_TYPE_INTEGER, dstatic.VAR_TYPE_FLOAT):
+            args.append('number=True')
+        if integer:
+            args.append('integer=True')
+        return ', '.join(args)
+
+    def get_random_impute(self, variable):
+        """The script's random value generator for the missing values of a variable"""
+        if variable.bounds is not None:
+            lower, upper = self.get_bounds(variable)
+            if variable.var_type == dstatic.VAR_TYPE_INTEGER:
+                return f'random_uniform({lower!r}, {upper!r}, integer=True)'
+            return f'random_uniform({lower!r}, {upper!r})'
+        if variable.var_type == dstatic.VAR_TYPE_CATEGORICAL:
+            choices = list(variable.category_index)
+        elif variable.true_value is None:
+            choices = [True, False]
+        else:
+            choices = [variable.true_value, variable.false_value]
+        return f"random_choice({self.add_constant('IMPUTE_CHOICES', variable, repr(choices))})"
+
+    @staticmethod
+    def get_count_context(stat, count):
+        """
+        Means and variances divide by the number of rows: public when
+        "number_of_rows_public" is True and no rows are dropped (missing values
+        are replaced), else a DP count shared by the statistics on the same rows.
+        """
+        if count.public:
+            count_context = dict(count=f'totals[{count.rows_key!r}]', count_source='public number of rows')
+        elif count.auto_generated:
+            count_context = dict(count=count.name, count_source=f'shared {dstatic.KEY_AUTO_GENERATED_DP_COUNT}')
+        else:
+            count_context = dict(count=count.name, count_source='the requested count of the same rows')
+        count_context['sum_epsilon'] = repr(count.sum_epsilon(stat))
+        return count_context
+
+    def get_quantile_candidates(self, variable):
+        """Add the variable's quantile candidates as a constant and return its name"""
+        lower, upper = self.get_bounds(variable)
+        candidates = quantile_candidates(lower, upper, variable.var_type == dstatic.VAR_TYPE_INTEGER)
+        return self.add_constant('QUANTILE_CANDIDATES', variable, f'np.asarray({candidates!r})')
+
+    def add_histogram_constant(self, kind, variable, accumulator, literal):
+        """Add a constant of one of the variable's histograms, e.g. "HISTOGRAM_EDGES_0_1" for "histogram_1" """
+        return self.add_constant(kind, variable, literal, suffix=accumulator[len(ACC_HISTOGRAM):])
+
+    def get_histogram_context(self, variable, accumulator, bins, context):
+        """
+        Add what the scan needs to bin the values to the context, and the bins
+        as constants. Returns the name of the scan template.
+        """
+        context['num_bins'] = bins.num_bins
+        if bins.binning == BIN_BY_CATEGORY:
+            labels = self.add_histogram_constant('HISTOGRAM_LABELS', variable, accumulator, repr(bins.labels))
+            context['bin_index'] = self.add_histogram_constant('HISTOGRAM_INDEX', variable, accumulator,
+                                                               f'pd.Index({labels})')
+            return 'acc_histogram_categories'
+        if bins.binning == BIN_BY_EDGES:
+            context['bin_edges'] = self.add_histogram_constant('HISTOGRAM_EDGES', variable, accumulator,
+                                                               f'np.asarray({bins.edges!r})')
+            return 'acc_histogram_edges'
+        context['lower'] = repr(bins.lower)
+        if bins.num_bins == bins.num_values:
+            return 'acc_histogram_values'
+        context['num_values'] = repr(bins.num_values)
+        return 'acc_histogram_ranges'
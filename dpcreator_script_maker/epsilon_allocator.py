@@ -0,0 +1,196 @@
+"""
+Split the remaining epsilon across the statistics that don't set one
+
+Every mechanism in the generated scripts adds noise with a scale of
+"sensitivity / epsilon", so the error of statistic i is close to a_i / eps_i.
+To compare statistics of different types and units, errors are relative to
+the statistic's range: the number of rows for counts and histogram bins, the
+largest possible sum for sums, (max - min) for means and quantiles and the
+largest possible variance for variances.
+
+Minimizing the weighted sum of relative errors, sum(w_i * a_i / eps_i), with
+the epsilons adding up to what's left of "total_epsilon" gives
+
+    eps_i = remaining * sqrt(w_i * a_i) / sum(sqrt(w_j * a_j))
+
+Means and variances pay for their count as the scripts do (see
+planner.SharedCount): each noisy sum gets epsilon / (number of sums + 1),
+or epsilon / (number of sums) when the count is free (a public number of
+rows, or a requested count on the same rows). Those parts don't depend on
+the other statistics' epsilons, so they are set once, as arrays, and every
+noisy sum keeps a positive epsilon.
+
+All statistics are evaluated at once with NumPy, and the exact accuracy of
+each mechanism (Laplace or Geometric, see accuracy.py) at the plan's
+confidence level is reported for every statistic.
+
+The mechanisms are pure (epsilon) DP: no delta is allocated.
+
+    allocation = allocate_epsilon(plan, expected_rows=10_000)
+    allocation.report()  # [{"variable": ..., "epsilon": 0.12, "accuracy": 83.1, ...}, ...]
+    plan = allocation.to_plan()
+"""
+import math
+
+import numpy as np
+
+import dpcreator_script_maker.static_vals as dstatic
+from dpcreator_script_maker.accuracy import get_mechanism, stat_accuracy, stat_range
+from dpcreator_script_maker.models import AnalysisPlan, Epsilon
+from dpcreator_script_maker.planner import ALL_ROWS, STATS_USING_COUNT
+
+
+class EpsilonAllocation:
+    """
+    The epsilon of every statistic of a plan (given or allocated) and the
+    resulting accuracies. Arrays are in the order of plan.statistics.
+    """
+
+    def __init__(self, plan, epsilons, allocated, confidence_level, accuracy, relative_error):
+        self.plan = plan
+        self.epsilons = epsilons
+        self.allocated = allocated  # True where the epsilon was allocated
+        self.confidence_level = confidence_level
+        self.accuracy = accuracy  # in the statistic's units (rows for counts and histograms)
+        self.relative_error = relative_error  # accuracy / range of the statistic
+
+    def to_plan(self):
+        """A copy of the plan with the allocated epsilons set"""
+        statistics = [stat.model_copy(update=dict(epsilon=Epsilon(value=float(epsilon))))
+                      if allocated else stat
+                      for stat, epsilon, allocated in zip(self.plan.statistics, self.epsilons, self.allocated)]
+        return self.plan.model_copy(update=dict(statistics=statistics))
+
+    def report(self):
+        """One dict per statistic"""
+        return [dict(variable=stat.var_name,
+                     statistic=stat.stat_type,
+                     epsilon=float(epsilon),
+                     allocated=bool(allocated),
+                     confidence_level=self.confidence_level,
+                     accuracy=float(accuracy),
+                     relative_error=float(relative_error))
+                for stat, epsilon, allocated, accuracy, relative_error in zip(
+                    self.plan.statistics, self.epsilons, self.allocated, self.accuracy, self.relative_error)]
+
+
+class _StatisticArrays:
+    """What the error of each statistic depends on, as arrays"""
+
+    def __init__(self, plan, max_contributions):
+        statistics = plan.statistics
+        size = len(statistics)
+        rows_public = plan.privacy_parameters.number_of_rows_public
+
+        self.stat_types = np.empty(size, dtype=object)
+        self.lower = np.zeros(size)
+        self.upper = np.ones(size)
+        self.integer = np.zeros(size, dtype=bool)
+        self.keeps_all_rows = np.ones(size, dtype=bool)
+        # The rows each statistic counts (see ScanPlan.add_statistic()): a variable, or all rows
+        rows_keys = np.empty(size, dtype=object)
+        # Part of the epsilon spent on the main noisy value
+        self.fraction = np.ones(size)
+        for idx, stat in enumerate(statistics):
+            variable = plan.get_variable(stat)
+            self.stat_types[idx] = stat.stat_type
+            if variable.bounds is not None:
+                self.lower[idx] = variable.bounds.min
+                self.upper[idx] = variable.bounds.max
+            self.integer[idx] = variable.var_type == dstatic.VAR_TYPE_INTEGER
+            self.keeps_all_rows[idx] = variable.keeps_all_rows
+            rows_keys[idx] = ALL_ROWS if variable.keeps_all_rows else variable.name
+            if stat.stat_type == dstatic.DP_QUANTILE:
+                # Each quantile of the statistic gets an equal part
+                self.fraction[idx] = 1 / len(stat.quantile_alphas)
+
+        # Means and variances: each noisy sum, once their part of the count is paid (see SharedCount)
+        num_sums = np.fromiter((STATS_USING_COUNT.get(stat_type, 1) for stat_type in self.stat_types),
+                               dtype=float, count=size)
+        uses_count = np.isin(self.stat_types, list(STATS_USING_COUNT))
+        free_count = np.isin(rows_keys, rows_keys[self.stat_types == dstatic.DP_COUNT])
+        if rows_public:
+            free_count |= rows_keys == ALL_ROWS
+        self.fraction[uses_count] = 1 / np.where(free_count, num_sums, num_sums + 1)[uses_count]
+
+        self.rows_public = rows_public
+        self.max_contributions = max_contributions
+
+
+def get_errors(arrays, epsilons, alpha, expected_rows, approximate=False):
+    """
+    Return (accuracy, relative error) of every statistic, given their epsilons.
+    With approximate=True, every mechanism is treated as Laplace and quantile
+    errors aren't clamped to their range, so every error is exactly
+    proportional to 1 / epsilon.
+    """
+    accuracy = np.zeros(len(epsilons))
+    reference = np.ones(len(epsilons))
+    for stat_type in dstatic.DP_STATS_CHOICES:
+        for integer in (False, True):
+            mask = (arrays.stat_types == stat_type) & (arrays.integer == integer)
+            if not mask.any():
+                continue
+            mechanism = dstatic.NOISE_LAPLACE_MECHANISM if approximate else get_mechanism(stat_type, integer)
+            lower, upper = arrays.lower[mask], arrays.upper[mask]
+            accuracy[mask] = stat_accuracy(stat_type, lower, upper, epsilons[mask] * arrays.fraction[mask], alpha,
+                                           mechanism, arrays.max_contributions, expected_rows, arrays.rows_public,
+                                           arrays.keeps_all_rows[mask], clamp=not approximate)
+            reference[mask] = stat_range(stat_type, lower, upper, expected_rows)
+    return accuracy, accuracy / reference
+
+
+def allocate_epsilon(spec, weights=None, expected_rows=dstatic.DEFAULT_EXPECTED_ROWS, max_contributions=None):
+    """
+    Give an epsilon to every statistic without one, splitting what's left of
+    "total_epsilon" to minimize the weighted sum of their relative errors.
+    Returns an EpsilonAllocation.
+
+    weights - one positive weight per statistic (default: all 1). A higher
+        weight asks for a more accurate statistic.
+    expected_rows - approximate number of rows of the dataset
+    max_contributions - maximum rows per individual. Only needed when
+        "individual_in_at_most_one_row" is False.
+    """
+    plan = spec if isinstance(spec, AnalysisPlan) else AnalysisPlan.model_validate(spec)
+    params = plan.privacy_parameters
+    if params.individual_in_at_most_one_row:
+        max_contributions = 1
+    elif not max_contributions:
+        raise ValueError(dstatic.ERR_MSG_MAX_CONTRIBUTIONS_REQUIRED)
+
+    num_statistics = len(plan.statistics)
+    if weights is None:
+        weights = np.ones(num_statistics)
+    else:
+        weights = np.asarray(weights, dtype=float)
+        if weights.shape != (num_statistics,) or not np.all(weights > 0):
+            raise ValueError(dstatic.ERR_MSG_WEIGHTS_INVALID.format(num_statistics=num_statistics))
+
+    confidence_level = dstatic.DEFAULT_CONFIDENCE_LEVEL if params.confidence_level is None \
+        else params.confidence_level.value
+    alpha = 1 - confidence_level
+
+    allocated = np.fromiter((stat.epsilon is None for stat in plan.statistics), dtype=bool, count=num_statistics)
+    epsilons = np.fromiter((0.0 if stat.epsilon is None else stat.epsilon.value for stat in plan.statistics),
+                           dtype=float, count=num_statistics)
+
+    total_epsilon = params.total_epsilon.value
+    requested = math.fsum(epsilons)
+    if requested > total_epsilon + dstatic.MAX_EPSILON_OFFSET:
+        raise ValueError(dstatic.ERR_MSG_NOT_ENOUGH_EPSILON_AVAILABLE.format(
+            available_epsilon=total_epsilon, requested_epsilon=requested))
+    remaining = total_epsilon - requested
+
+    arrays = _StatisticArrays(plan, max_contributions)
+    if allocated.any():
+        if remaining <= 0:
+            raise ValueError(dstatic.ERR_MSG_NO_EPSILON_TO_ALLOCATE.format(
+                num_statistics=int(allocated.sum()), available_epsilon=remaining))
+        # Relative error at epsilon = 1 is the a_i of a_i / epsilon
+        _, coefficients = get_errors(arrays, np.ones(num_statistics), alpha, expected_rows, approximate=True)
+        shares = np.sqrt(weights[allocated] * coefficients[allocated])
+        epsilons[allocated] = remaining * shares / shares.sum()
+
+    accuracy, relative_error = get_errors(arrays, epsilons, alpha, expected_rows)
+    return EpsilonAllocation(plan, epsilons, allocated, confidence_level, accuracy, relative_error)
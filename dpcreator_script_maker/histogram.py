@@ -0,0 +1,178 @@
+"""
+Histogram bins
+
+A histogram statistic may choose its bins with "histogram_bin_type"
+(one of HIST_VALID_BIN_TYPES):
+  - binTypeBoolean: the two values of a Boolean variable
+  - onePerValue: one bin per category, per Boolean value, or per integer
+    between the bounds of an Integer variable
+  - equalRanges: "histogram_number_of_bins" ranges of equal width between
+    the bounds (the default for Integer and Float variables)
+  - binEdges: ranges between "histogram_bin_edges". The bounds are added as
+    the outer edges if they aren't there.
+
+The bins also set how the generated script finds the bin of each value,
+without per-row Python:
+  - integer values: an offset from the lower bound, times
+    (bins / integers in the bounds) for ranges
+  - other numbers: a binary search of the sorted edges (np.searchsorted)
+  - categories: a hash lookup of all the values at once (pd.Index.get_indexer)
+"""
+import dpcreator_script_maker.static_vals as dstatic
+
+# How the script computes the bin of each value
+BIN_BY_OFFSET = 'offset'
+BIN_BY_EDGES = 'edges'
+BIN_BY_CATEGORY = 'category'
+
+NUMERIC_VAR_TYPES = (dstatic.VAR_TYPE_INTEGER, dstatic.VAR_TYPE_FLOAT)
+
+# Largest (value - lower) * num_bins the script computes as an int64
+_MAX_OFFSET_PRODUCT = 2 ** 63 - 1
+
+
+class HistogramBins:
+    """The bins of a histogram: their labels, and how each value is binned"""
+
+    def __init__(self, bin_type, labels, binning, edges=None, lower=None, num_values=None):
+        self.bin_type = bin_type
+        self.labels = labels
+        self.binning = binning  # BIN_BY_OFFSET, BIN_BY_EDGES or BIN_BY_CATEGORY
+        self.edges = edges  # BIN_BY_EDGES: num_bins + 1 sorted edges
+        self.lower = lower  # BIN_BY_OFFSET: bin = (value - lower) * num_bins // num_values
+        self.num_values = num_values  # BIN_BY_OFFSET: number of integers between the bounds
+
+    @property
+    def num_bins(self):
+        return len(self.labels)
+
+    @property
+    def key(self):
+        """Equal for histograms counting the same bins, which share one accumulator"""
+        if self.binning == BIN_BY_OFFSET:
+            return self.binning, self.lower, self.num_values, self.num_bins
+        if self.binning == BIN_BY_EDGES:
+            return self.binning, tuple(self.edges)
+        return self.binning, tuple(self.labels)
+
+
+def equal_range_edges(lower, upper, num_bins):
+    """Return num_bins + 1 evenly spaced edges from lower to upper"""
+    width = (upper - lower) / num_bins
+    return [lower + width * idx for idx in range(num_bins)] + [upper]
+
+
+def range_labels(edges):
+    """e.g. ["[0.0, 2.5)", "[2.5, 5.0]"]: the last range includes its upper edge"""
+    labels = [f'[{low}, {high})' for low, high in zip(edges[:-1], edges[1:])]
+    labels[-1] = labels[-1][:-1] + ']'
+    return labels
+
+
+def get_bin_type(variable, bin_type=None, bin_edges=None):
+    """The bin type, defaulting on the variable type"""
+    if bin_type is not None:
+        return bin_type
+    if variable.var_type == dstatic.VAR_TYPE_BOOLEAN:
+        return dstatic.HIST_BIN_TYPE_BOOLEAN
+    if variable.var_type == dstatic.VAR_TYPE_CATEGORICAL:
+        return dstatic.HIST_BIN_TYPE_ONE_PER_VALUE
+    if bin_edges is not None:
+        return dstatic.HIST_BIN_TYPE_BIN_EDGES
+    return dstatic.HIST_BIN_TYPE_EQUAL_RANGES
+
+
+def get_full_edges(variable, bin_edges):
+    """The (non-empty) edges, checked, with the bounds as outer edges"""
+    lower, upper = variable.bounds.min, variable.bounds.max
+    edges = [float(edge) for edge in bin_edges]
+    if any(high <= low for low, high in zip(edges[:-1], edges[1:])) \
+            or not all(lower <= edge <= upper for edge in edges):
+        raise ValueError(dstatic.ERR_MSG_HIST_BIN_EDGES_INVALID.format(lower=lower, upper=upper))
+    if edges[0] > lower:
+        edges.insert(0, lower)
+    if edges[-1] < upper:
+        edges.append(upper)
+    return edges
+
+
+def check_histogram_bins(variable, bin_type=None, num_bins=None, bin_edges=None):
+    """
+    Make sure the bins can be used with the variable, without building them.
+    Returns the number of bins.
+    """
+    var_type = variable.var_type
+    bin_type = get_bin_type(variable, bin_type, bin_edges)
+    if bin_type == dstatic.HIST_BIN_TYPE_BOOLEAN:
+        allowed = var_type == dstatic.VAR_TYPE_BOOLEAN
+    elif bin_type == dstatic.HIST_BIN_TYPE_ONE_PER_VALUE:
+        allowed = var_type != dstatic.VAR_TYPE_FLOAT
+    elif bin_type in (dstatic.HIST_BIN_TYPE_EQUAL_RANGES, dstatic.HIST_BIN_TYPE_BIN_EDGES):
+        allowed = var_type in NUMERIC_VAR_TYPES
+    else:
+        raise ValueError(dstatic.ERR_MSG_HIST_BIN_TYPE_UKNOWN)
+    if not allowed:
+        raise ValueError(dstatic.ERR_MSG_HIST_BIN_TYPE_NOT_ALLOWED.format(bin_type=bin_type, var_type=var_type))
+
+    if var_type in (dstatic.VAR_TYPE_BOOLEAN, dstatic.VAR_TYPE_CATEGORICAL):
+        return 2 if var_type == dstatic.VAR_TYPE_BOOLEAN else len(variable.category_index)
+
+    num_values = None  # number of integers between the bounds
+    if var_type == dstatic.VAR_TYPE_INTEGER:
+        num_values = int(variable.bounds.max - variable.bounds.min) + 1
+    if bin_type == dstatic.HIST_BIN_TYPE_ONE_PER_VALUE:
+        count = num_values
+    elif bin_type == dstatic.HIST_BIN_TYPE_BIN_EDGES:
+        if not bin_edges:
+            raise ValueError(dstatic.ERR_MSG_HIST_BIN_EDGES_INVALID.format(
+                lower=variable.bounds.min, upper=variable.bounds.max))
+        count = len(get_full_edges(variable, bin_edges)) - 1
+    else:
+        count = num_bins or dstatic.DEFAULT_HIST_NUMBER_OF_BINS
+    if count > dstatic.MAX_HIST_NUMBER_OF_BINS or (num_values is not None and count > num_values):
+        raise ValueError(dstatic.ERR_MSG_TOO_MANY_BINS)
+    return count
+
+
+def plan_histogram_bins(variable, bin_type=None, num_bins=None, bin_edges=None):
+    """Return the HistogramBins of a histogram of the variable. Raises a ValueError for unusable bins."""
+    num_bins = check_histogram_bins(variable, bin_type, num_bins, bin_edges)
+    bin_type = get_bin_type(variable, bin_type, bin_edges)
+
+    if variable.var_type == dstatic.VAR_TYPE_CATEGORICAL:
+        return HistogramBins(bin_type, list(variable.category_index), BIN_BY_CATEGORY)
+    if variable.var_type == dstatic.VAR_TYPE_BOOLEAN:
+        if variable.true_value is None:
+            labels = [True, False]
+        else:
+            labels = [variable.true_value, variable.false_value]
+        return HistogramBins(bin_type, labels, BIN_BY_CATEGORY)
+
+    lower, upper = variable.bounds.min, variable.bounds.max
+    if bin_type == dstatic.HIST_BIN_TYPE_BIN_EDGES:
+        edges = get_full_edges(variable, bin_edges)
+        return HistogramBins(bin_type, range_labels(edges), BIN_BY_EDGES, edges=edges)
+
+    if variable.var_type == dstatic.VAR_TYPE_FLOAT:
+        edges = equal_range_edges(lower, upper, num_bins)
+        return HistogramBins(bin_type, range_labels(edges), BIN_BY_EDGES, edges=edges)
+
+    # Integers: value v is in bin (v - lower) * num_bins // num_values
+    lower, upper = int(lower), int(upper)
+    num_values = upper - lower + 1
+    if bin_type == dstatic.HIST_BIN_TYPE_ONE_PER_VALUE:
+        labels = list(range(lower, upper + 1))
+    else:
+        # Bin idx holds the integers from lower + ceil(idx * num_values / num_bins)
+        starts = [lower - (-idx * num_values // num_bins) for idx in range(num_bins + 1)]
+        labels = [f'[{start}, {end - 1}]' for start, end in zip(starts[:-1], starts[1:])]
+        if (num_values - 1) * num_bins > _MAX_OFFSET_PRODUCT:
+            # Too wide for int64 offsets: search the starts of the bins instead
+            return HistogramBins(bin_type, labels, BIN_BY_EDGES, edges=starts[:-1] + [upper])
+    return HistogramBins(bin_type, labels, BIN_BY_OFFSET, lower=lower, num_values=num_values)
+
+
+def plan_statistic_bins(stat, variable):
+    """The bins of a histogram statistic, from its options"""
+    return plan_histogram_bins(variable, stat.histogram_bin_type, stat.histogram_number_of_bins,
+                               stat.histogram_bin_edges)
@@ -0,0 +1,211 @@
+"""
+Opt-in timing of the validators and the script generation stages
+
+Disabled by default. When enabled, every call of a stage is counted and
+timed, and so is every call of a validator, if the validators were wrapped:
+
+    DPCREATOR_INSTRUMENT_VALIDATORS=1 python ...
+
+    from dpcreator_script_maker import instrumentation
+
+    with instrumentation.instrumented(allocations=True):
+        DPCreatorScriptMaker(spec)
+    instrumentation.get_stats()  # {'Variable.check_bound_types': {'calls': ..., 'p99_seconds': ...}, ...}
+    instrumentation.dump_json('timings.json')
+
+The validators are only wrapped if DPCREATOR_INSTRUMENT_VALIDATORS is set
+when models.py is imported: pydantic calls them for every object, and even a
+wrapper that only checks a flag would slow validation down by ~10%. Unwrapped,
+they cost nothing. Stages are timed once per script, so they always check.
+
+"self_seconds" excludes the time spent in nested instrumented calls. For the
+"validate" stage, with wrapped validators, that is the time spent in pydantic
+itself.
+
+Allocations (net bytes allocated, traced with tracemalloc) are only
+recorded for the stages, as tracing every validator call would swamp them.
+"""
+from array import array
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+import json
+import math
+import os
+import threading
+import time
+import tracemalloc
+
+KIND_VALIDATOR = 'validator'
+KIND_STAGE = 'stage'
+
+VALIDATORS_ENV_VAR = 'DPCREATOR_INSTRUMENT_VALIDATORS'
+VALIDATORS_WRAPPED = os.environ.get(VALIDATORS_ENV_VAR, '') not in ('', '0')
+
+_enabled = False
+_allocations = False
+_started_tracemalloc = False
+_lock = threading.Lock()
+_local = threading.local()
+_counters = {}
+
+_NULL_CONTEXT = nullcontext()
+
+
+class _Counter:
+    """Calls and durations of one validator or stage"""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.self_seconds = 0.0
+        self.allocated_bytes = None  # stages, with allocations=True
+        self.durations = array('d')
+
+    def as_dict(self):
+        durations = sorted(self.durations)
+        return {
+            'kind': self.kind,
+            'calls': self.calls,
+            'total_seconds': self.total_seconds,
+            'self_seconds': self.self_seconds,
+            'mean_seconds': self.total_seconds / self.calls if self.calls else 0.0,
+            'p99_seconds': durations[math.ceil(0.99 * len(durations)) - 1] if durations else 0.0,
+            'allocated_bytes': self.allocated_bytes,
+        }
+
+
+def _frames():
+    """Time spent in nested calls, per open call of this thread"""
+    frames = getattr(_local, 'frames', None)
+    if frames is None:
+        frames = _local.frames = []
+    return frames
+
+
+def _record(name, kind, elapsed, nested, allocated=None):
+    with _lock:
+        counter = _counters.get(name)
+        if counter is None:
+            counter = _counters[name] = _Counter(kind)
+        counter.calls += 1
+        counter.total_seconds += elapsed
+        counter.self_seconds += elapsed - nested
+        if allocated is not None:
+            counter.allocated_bytes = (counter.allocated_bytes or 0) + allocated
+        counter.durations.append(elapsed)
+
+
+def _timed_call(name, func, args):
+    frames = _frames()
+    frames.append(0.0)
+    start = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        elapsed = time.perf_counter() - start
+        nested = frames.pop()
+        if frames:
+            frames[-1] += elapsed
+        _record(name, KIND_VALIDATOR, elapsed, nested)
+
+
+def timed(func):
+    """
+    Decorate a validator, to count and time its calls (by qualified name) when
+    enabled. Returns the validator itself unless VALIDATORS_WRAPPED.
+    """
+    if not VALIDATORS_WRAPPED:
+        return func
+    name = func.__qualname__
+
+    # Validators are called with positional arguments only
+    @wraps(func)
+    def wrapper(*args):
+        if not _enabled:
+            return func(*args)
+        return _timed_call(name, func, args)
+    return wrapper
+
+
+@contextmanager
+def _stage(name):
+    frames = _frames()
+    frames.append(0.0)
+    tracing = _allocations and tracemalloc.is_tracing()
+    before = tracemalloc.get_traced_memory()[0] if tracing else None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        allocated = tracemalloc.get_traced_memory()[0] - before if tracing else None
+        nested = frames.pop()
+        if frames:
+            frames[-1] += elapsed
+        _record(name, KIND_STAGE, elapsed, nested, allocated)
+
+
+def stage(name):
+    """
+    Context manager timing a stage of script generation, e.g. "render_scan",
+    when enabled
+    """
+    if not _enabled:
+        return _NULL_CONTEXT
+    return _stage(name)
+
+
+def enable(allocations=False):
+    """Start collecting. With allocations=True, also trace the memory allocated by each stage"""
+    global _enabled, _allocations, _started_tracemalloc
+    if allocations and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracemalloc = True
+    _allocations = allocations
+    _enabled = True
+
+
+def disable():
+    """Stop collecting. The statistics are kept until reset()"""
+    global _enabled, _started_tracemalloc
+    _enabled = False
+    if _started_tracemalloc:
+        tracemalloc.stop()
+        _started_tracemalloc = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """Forget everything collected so far"""
+    with _lock:
+        _counters.clear()
+
+
+@contextmanager
+def instrumented(allocations=False):
+    """Collect from scratch within a "with" block"""
+    reset()
+    enable(allocations)
+    try:
+        yield
+    finally:
+        disable()
+
+
+def get_stats():
+    """Name -> calls, total/self/mean/p99 seconds and (stages only) allocated bytes"""
+    with _lock:
+        return {name: counter.as_dict() for name, counter in _counters.items()}
+
+
+def dump_json(path=None):
+    """Return the statistics as JSON, and write them to "path" if given"""
+    text = json.dumps(get_stats(), indent=2)
+    if path is not None:
+        with open(path, 'w') as f:
+            f.write(text)
+    return text
@@ -2,14 +2,21 @@
 overall epsilon
 """
 from pydantic import \
-    (BaseModel, Field,
+    (AliasChoices,
+     BaseModel, Field,
      ValidationError,
      conlist,
      confloat,
+     conint,
+     field_serializer,
      field_validator,
      model_validator,
      validator)
-from typing import List, Literal, Optional, Union
+from functools import cached_property
+from typing import Dict, List, Literal, Optional, Union
+from dpcreator_script_maker.categories import CategoryIndex
+from dpcreator_script_maker.histogram import check_histogram_bins
+from dpcreator_script_maker.instrumentation import timed
 import dpcreator_script_maker.static_vals as dstatic
 
 import warnings
@@ -19,18 +26,32 @@ CUSTOM_ERROR_MESSAGES = {
     'xx-delta_warning': "Delta shouldn't be greater than 1e-5."
 }
 
-class Epsilon(BaseModel):
+class SingleValueModel(BaseModel):
+    """Base for objects holding a single "value". Also accepts the bare number used in specs"""
+
+    @model_validator(mode='before')
+    @classmethod
+    @timed
+    def allow_bare_value(cls, data):
+        """Allow the shorthand used in specs, e.g. "epsilon": 0.25 instead of {"value": 0.25}"""
+        if isinstance(data, (int, float)) and not isinstance(data, bool):
+            return {'value': data}
+        return data
+
+
+class Epsilon(SingleValueModel):
     value: confloat(ge=0)  # Non-negative float
 
     @field_validator('value')
     @classmethod
+    @timed
     def check_value(cls, value):
         if value > dstatic.EPSILON_WARNING:
             warnings.warn(CUSTOM_ERROR_MESSAGES.get('epsilon_warning'))
         return value
 
 
-class Delta(BaseModel):
+class Delta(SingleValueModel):
     value: confloat(ge=0.0, le=dstatic.DELTA_10_POWER_NEG_5)  # >= .00001
 
 class Bounds(BaseModel):
@@ -39,17 +60,19 @@ class Bounds(BaseModel):
     max: float
 
     @model_validator(mode='after')
+    @timed
     def check_min_max_constraints(self):
         """Check that max is greater than min"""
         if self.min >= self.max:
-            raise ValueError('Maximum value must be greater than minimum value.')
+            raise ValueError(dstatic.ERR_MSG_BOUNDS_MAX_NOT_GREATER)
         return self
 
 
-class ConfidenceLevel(BaseModel):
+class ConfidenceLevel(SingleValueModel):
     value: Literal[*dstatic.CONFIDENCE_LEVELS]
 
     @field_validator('value')
+    @timed
     def valid_confidence_level(cls, value):
         if value not in dstatic.CONFIDENCE_LEVELS:
             raise ValueError(("Confidence level must be one of'"
@@ -70,12 +93,32 @@ class Variable(BaseModel):
     # var_type: Literal[*dstatic.ALLOWED_VAR_TYPES]  # ["Integer", "Float", "Categorical", "Boolean"]
     var_type: Literal[*dstatic.ALLOWED_VAR_TYPES]
     bounds: Optional[Bounds] = None
+    # Stored as a CategoryIndex: see check_categories()
     categories: Optional[List[Union[str, float]]] = None
     true_value: Optional[Union[str, float, bool]] = None
     false_value: Optional[Union[str, float, bool]] = None
     impute_constant: Optional[Union[str, float, bool]] = None  
+    # Default: "insert_fixed" if "impute_constant" is set, else "drop"
+    missing_value_handling: Optional[Literal[*dstatic.MISSING_VAL_STRATEGIES]] = None
+
+    @field_validator('categories')
+    @classmethod
+    @timed
+    def check_categories(cls, categories):
+        """
+        Keep the categories only as a CategoryIndex: deduplicated and compact,
+        with O(1) lookups. The validated list isn't kept.
+        """
+        if categories is None:
+            return None
+        return CategoryIndex(categories)
+
+    @field_serializer('categories')
+    def serialize_categories(self, categories):
+        return None if categories is None else list(categories)
 
     @model_validator(mode='after')
+    @timed
     def check_bound_types(self):
         """
         Check the Bounds (min/max) values in relation to var_type.
@@ -88,47 +131,48 @@ class Variable(BaseModel):
 
         # Make sure bounds are set for Integer and Float types
         #
-        if self.var_type in [dstatic.VAR_TYPE_INTEGER or dstatic.VAR_TYPE_FLOAT]:
+        if self.var_type in [dstatic.VAR_TYPE_INTEGER, dstatic.VAR_TYPE_FLOAT]:
             if not bounds:
-                raise ValueError((f"For '{self.var_type}' type, 'bounds' (min/max)"
-                                 " must be defined."))
+                raise ValueError(dstatic.ERR_MSG_BOUNDS_REQUIRED.format(var_type=self.var_type))
         else:
             # min and max shouldn't be defined for other var types (e.g. categorical, boolean, etc)
             if bounds:
-                raise ValueError(f"For '{self.var_type}' type, both min and max should be None.")
+                raise ValueError(dstatic.ERR_MSG_BOUNDS_NOT_ALLOWED.format(var_type=self.var_type))
 
         # If var type is an Integer, make sure the bounds are integers
         #
         if self.var_type == dstatic.VAR_TYPE_INTEGER:
             if not bounds.min.is_integer():
-                raise ValueError((f"For variable type '{dstatic.VAR_TYPE_INTEGER}',"
-                                  " 'min' must be an integer."))
+                raise ValueError(dstatic.ERR_MSG_BOUNDS_MIN_NOT_INTEGER)
             if not bounds.max.is_integer():
-                raise ValueError((f"For variable type '{dstatic.VAR_TYPE_INTEGER}',"
-                                  " 'max' must be an integer."))
+                raise ValueError(dstatic.ERR_MSG_BOUNDS_MAX_NOT_INTEGER)
 
         return self
 
 
     @model_validator(mode='after')
+    @timed
     def check_categorical_constraints(self):
         """
-        When var_type is 'Categorical', make sure that 'categories" is populated.
-        In addition, var_type is NOT 'Categorical', make sure that 'categories" is None.
+        When var_type is 'Categorical', make sure that 'categories" is populated,
+        with no duplicates. In addition, var_type is NOT 'Categorical', make sure that 'categories" is None.
         """
         var_type = self.var_type
         categories_val = self.categories
 
         if var_type == dstatic.VAR_TYPE_CATEGORICAL:
-            if not categories_val or not isinstance(categories_val, list) or len(categories_val) == 0:
-                raise ValueError(('"categories" must be set and not empty for "{dstatic.VAR_TYPE_CATEGORICAL}"'
-                                  'type variables'))
+            if not categories_val:
+                raise ValueError(dstatic.ERR_MSG_CATEGORIES_REQUIRED)
+            if categories_val.duplicates:
+                raise ValueError(dstatic.ERR_MSG_CATEGORIES_DUPLICATE.format(
+                    category=categories_val.duplicates[0]))
         elif categories_val:
-            raise ValueError(f'categories must only be set for "{dstatic.VAR_TYPE_CATEGORICAL}" type variables')
+            raise ValueError(dstatic.ERR_MSG_CATEGORIES_NOT_ALLOWED)
 
         return self
 
     @model_validator(mode='after')
+    @timed
     def check_boolean_constraints(self):
         var_type = self.var_type
         true_value = self.true_value
@@ -141,63 +185,164 @@ class Variable(BaseModel):
             elif true_value is None or false_value is None:
                 # Only one value has been set
                 #
-                raise ValueError((f'For "{dstatic.VAR_TYPE_BOOLEAN}" type variables, either set both'
-                                  ' "true_value" and "false_value" OR leave both empty. Do not set'
-                                  ' just one of the values.'))
+                raise ValueError(dstatic.ERR_MSG_BOOLEAN_SET_BOTH_VALUES)
             elif true_value == false_value:
                 # True and False shouldn't be equal
                 #
-                raise ValueError('"true_value" and "false_value" must be different.')
+                raise ValueError(dstatic.ERR_MSG_BOOLEAN_VALUES_EQUAL)
         return self
 
-    '''@model_validator(mode='after')
+    @model_validator(mode='after')
+    @timed
     def check_impute_constant(self):
         """
-        If an impute constant is set, make sure it fits the
-         parameters of the var_type, bounds, categories, etc.
+        If an impute constant is set for a 'Categorical' variable, make sure it
+        is one of the categories.
         """
         impute_val = self.impute_constant
-        var_type = self.var_type
 
-        if isinstance(impute_val, str):
-            # if not var_type not in [dstatic.VAR_TYPE_CATEGORICAL, dstatic.VAR_TYPE_BOOLEAN]:
-            #     raise ValueError('The "impute_value" does not match the variable type'
-            #"true_value" and "false_value")
-            if var_type == dstatic.VAR_TYPE_CATEGORICAL:
-                if impute_val not in self.categories:
-                    raise ValueError('The "impute_value" does not match any of the specified categories.')
-
-            if var_type == dstatic.VAR_TYPE_BOOLEAN:
-                # Have true and false values been specified?
-                if self.true_value and self.false_value:
-                    if self.impute_constant not in [self.true_value, self.false_value]:
-                        raise ValueError((f'The "impute_value" for this {dstatic.VAR_TYPE_BOOLEAN}'
-                                          ' variable does not match the specified "tru_value" or "false_value'))
-                else:
+        if impute_val is not None and self.var_type == dstatic.VAR_TYPE_CATEGORICAL:
+            if impute_val not in self.categories:
+                raise ValueError(dstatic.ERR_MSG_IMPUTE_NOT_IN_CATEGORIES)
+        return self
 
+    @model_validator(mode='after')
+    @timed
+    def check_missing_value_handling(self):
+        """
+        "insert_fixed" inserts the "impute_constant", which must be set.
+        Other strategies don't use it.
+        """
+        handling = self.missing_value_handling
+        if handling == dstatic.MISSING_VAL_INSERT_FIXED and self.impute_constant is None:
+            raise ValueError(dstatic.ERR_MSG_IMPUTE_CONSTANT_REQUIRED)
+        if handling not in (None, dstatic.MISSING_VAL_INSERT_FIXED) and self.impute_constant is not None:
+            raise ValueError(dstatic.ERR_MSG_IMPUTE_CONSTANT_NOT_ALLOWED)
+        return self
 
-                if
-                    impute_val not in self.
-    '''
+    @property
+    def missing_value_strategy(self) -> str:
+        """How missing values are handled: one of MISSING_VAL_STRATEGIES"""
+        if self.missing_value_handling is not None:
+            return self.missing_value_handling
+        if self.impute_constant is not None:
+            return dstatic.MISSING_VAL_INSERT_FIXED
+        return dstatic.MISSING_VAL_DROP
+
+    @property
+    def keeps_all_rows(self) -> bool:
+        """True if missing values are replaced, so no rows are dropped"""
+        return self.missing_value_strategy != dstatic.MISSING_VAL_DROP
+
+    @property
+    def category_index(self) -> Optional[CategoryIndex]:
+        """
+        The categories, a CategoryIndex for O(1) membership and histogram bin lookups.
+        None if "categories" isn't set.
+        """
+        return self.categories
 
 
 class Dataset(BaseModel):
     name: str
     description: Optional[str] = None
+    file_format: Literal[*dstatic.FILE_FORMAT_CHOICES] = dstatic.FILE_FORMAT_CSV  # read by the generated script
     variables: List[Variable] = Field(..., min_length=1)
 
 
 class Statistic(BaseModel):
-    var_name: str  # Is this too messy a way to connect to a Variable?
-    stat_type: Literal[*dstatic.DP_STATS_CHOICES]
+    # Specs use "variable" and "statistic" as the keys
+    var_name: str = Field(validation_alias=AliasChoices('var_name', 'variable'))  # resolved by AnalysisPlan.variable_index
+    stat_type: Literal[*dstatic.DP_STATS_CHOICES] = Field(validation_alias=AliasChoices('stat_type', 'statistic'))
     epsilon: Optional[Epsilon]
     delta: Optional[Delta] = None
+    # Histograms only: the bins, checked against the variable by resolve_statistic()
+    histogram_bin_type: Optional[Literal[*dstatic.HIST_VALID_BIN_TYPES]] = None
+    histogram_number_of_bins: Optional[conint(ge=1)] = None
+    histogram_bin_edges: Optional[List[float]] = None
+    # Quantiles only: e.g. [0.25, 0.5, 0.75], released from one count per candidate (default: the median)
+    quantiles: Optional[conlist(confloat(gt=0, lt=1), min_length=1)] = None
     # missing_value_handling: Optional
     # By default, the next three values may be taken from the "Variable" data or overall
     # confidence_level: Optional[ConfidenceLevel] = None  # default: take from overall privacy parameters
     # bounds  # for now, default to info on the Variable
     # categories  # for now, default to info in Variable
 
+    @model_validator(mode='after')
+    @timed
+    def check_quantiles(self):
+        """"quantiles" are only used by quantile statistics, and may not repeat"""
+        if self.quantiles is not None:
+            if self.stat_type != dstatic.DP_QUANTILE:
+                raise ValueError(dstatic.ERR_MSG_QUANTILES_NOT_ALLOWED.format(stat_type=self.stat_type))
+            if len(set(self.quantiles)) != len(self.quantiles):
+                raise ValueError(dstatic.ERR_MSG_QUANTILES_DUPLICATE)
+        return self
+
+    @property
+    def quantile_alphas(self) -> List[float]:
+        """The quantiles a quantile statistic releases"""
+        return self.quantiles or [dstatic.DEFAULT_QUANTILE_ALPHA]
+
+
+class DPLibrary(BaseModel):
+    """The DP library the generated script targets, e.g. OpenDP 0.9.2"""
+    name: str
+    url: Optional[str] = None
+    version: str
+
+
+def resolve_statistic(stat: Statistic, variables: Dict[str, Variable]) -> Variable:
+    """
+    Return the Variable a statistic references, from a name -> Variable dict.
+    Raise a ValueError if it isn't there, the statistic doesn't support its
+    type or (for histograms) the bins can't be used with it.
+    """
+    variable = variables.get(stat.var_name)
+    if variable is None:
+        raise ValueError(dstatic.ERR_MSG_VARIABLE_NOT_FOUND_IN_ANALYSIS_PLAN.format(var_name=stat.var_name))
+    if (stat.stat_type, variable.var_type) not in dstatic.STAT_VAR_TYPE_COMPATIBILITY:
+        raise ValueError(dstatic.ERR_MSG_STAT_NOT_ALLOWED_FOR_VAR_TYPE.format(
+            stat_type=stat.stat_type, var_type=variable.var_type, var_name=variable.name))
+    if stat.stat_type == dstatic.DP_HISTOGRAM:
+        check_histogram_bins(variable, stat.histogram_bin_type, stat.histogram_number_of_bins,
+                             stat.histogram_bin_edges)
+    return variable
+
+
+class AnalysisPlan(BaseModel):
+    """A complete spec: the dataset, the privacy parameters and the statistics to release"""
+    name: str
+    differentially_private_library: Optional[DPLibrary] = None
+    dataset: Dataset
+    privacy_parameters: PrivacyParameters
+    statistics: List[Statistic] = []
+
+    @model_validator(mode='after')
+    @timed
+    def resolve_statistics(self):
+        """
+        Make sure each statistic references a variable in the dataset, of a type
+        the statistic supports. One dict lookup and one set lookup per statistic.
+        """
+        variables = self.variable_index
+        for stat in self.statistics:
+            resolve_statistic(stat, variables)
+        return self
+
+    @cached_property
+    def variable_index(self) -> Dict[str, Variable]:
+        """Variable name -> Variable, built once. Variable names must be unique."""
+        index = {}
+        for variable in self.dataset.variables:
+            if index.setdefault(variable.name, variable) is not variable:
+                raise ValueError(dstatic.ERR_MSG_VARIABLE_NAME_DUPLICATE.format(var_name=variable.name))
+        return index
+
+    def get_variable(self, stat: Statistic) -> Variable:
+        """Return the Variable a statistic references"""
+        return self.variable_index[stat.var_name]
+
 '''
 
 {
@@ -0,0 +1,241 @@
+"""
+Compact binary storage of validated AnalysisPlans
+
+Validating a wide plan again every time it's loaded (e.g. in each worker
+process) costs far more than reading it. `dumps_plan()` stores a plan that was
+already validated, and `loads_plan()` rebuilds the models directly from the
+stored field values, without running pydantic validation.
+
+Layout: a fixed-size header, then the payload (field values as nested tuples,
+serialized with `marshal`):
+  - magic bytes b"DPCP"
+  - SCHEMA_VERSION and the marshal format version
+  - a fingerprint of the model fields, so a plan stored before a model change
+    is never loaded into the new models
+  - the SHA-256 of the payload, and its length
+
+Anything that doesn't match raises a ValueError: the caller should then
+validate the spec again (and may store the result with `dumps_plan()`).
+
+    data = dumps_plan(AnalysisPlan(**spec))
+    plan = loads_plan(data)  # no validation
+"""
+import gc
+import hashlib
+import marshal
+import struct
+
+import dpcreator_script_maker.static_vals as dstatic
+from dpcreator_script_maker.categories import CategoryIndex
+from dpcreator_script_maker.models import \
+    (AnalysisPlan,
+     Bounds,
+     ConfidenceLevel,
+     Dataset,
+     Delta,
+     DPLibrary,
+     Epsilon,
+     PrivacyParameters,
+     Statistic,
+     Variable)
+
+MAGIC = b'DPCP'
+
+# Increase when the payload layout changes
+SCHEMA_VERSION = 5
+
+# magic, schema version, marshal version, fields fingerprint, payload SHA-256, payload length
+HEADER = struct.Struct('<4sHH8s32sQ')
+
+# The models stored, in the order of their fields in the payload
+STORED_MODELS = [AnalysisPlan, DPLibrary, PrivacyParameters, Epsilon, Delta, ConfidenceLevel,
+                 Dataset, Variable, Bounds, Statistic]
+
+DATASET_FIELDS = [name for name in Dataset.model_fields if name != 'variables']
+VARIABLE_FIELDS = list(Variable.model_fields)
+VARIABLE_BOUNDS = VARIABLE_FIELDS.index('bounds')
+VARIABLE_CATEGORIES = VARIABLE_FIELDS.index('categories')
+STATISTIC_FIELDS = list(Statistic.model_fields)
+STATISTIC_EPSILON = STATISTIC_FIELDS.index('epsilon')
+STATISTIC_DELTA = STATISTIC_FIELDS.index('delta')
+
+
+def get_fields_fingerprint():
+    """A short hash of the field names of every stored model"""
+    fields = ';'.join(f'{model.__name__}:{",".join(model.model_fields)}' for model in STORED_MODELS)
+    return hashlib.sha256(fields.encode('utf-8')).digest()[:8]
+
+
+FIELDS_FINGERPRINT = get_fields_fingerprint()
+
+
+# --------------------------------------
+# Writing
+# --------------------------------------
+def _value(obj):
+    """The value of an Epsilon, Delta or ConfidenceLevel, or None"""
+    return None if obj is None else obj.value
+
+
+def _statistic_row(stat):
+    values = [getattr(stat, name) for name in STATISTIC_FIELDS]
+    values[STATISTIC_EPSILON] = _value(stat.epsilon)
+    values[STATISTIC_DELTA] = _value(stat.delta)
+    return tuple(values)
+
+
+def _plan_to_tuple(plan):
+    """Every field value of the plan, as nested tuples/lists of builtins"""
+    library = plan.differentially_private_library
+    params = plan.privacy_parameters
+    dataset = plan.dataset
+
+    variables = []
+    for variable in dataset.variables:
+        values = [getattr(variable, name) for name in VARIABLE_FIELDS]
+        bounds = values[VARIABLE_BOUNDS]
+        if bounds is not None:
+            values[VARIABLE_BOUNDS] = (bounds.min, bounds.max)
+        categories = values[VARIABLE_CATEGORIES]
+        if categories is not None:
+            values[VARIABLE_CATEGORIES] = categories.state()
+        variables.append(tuple(values))
+
+    return (plan.name,
+            None if library is None else (library.name, library.url, library.version),
+            (params.total_epsilon.value, _value(params.total_delta), _value(params.confidence_level),
+             params.number_of_rows_public, params.individual_in_at_most_one_row),
+            tuple(getattr(dataset, name) for name in DATASET_FIELDS),
+            variables,
+            [_statistic_row(stat) for stat in plan.statistics])
+
+
+def dumps_plan(plan):
+    """Serialize an AnalysisPlan (or a spec, validated first) to bytes"""
+    if not isinstance(plan, AnalysisPlan):
+        plan = AnalysisPlan.model_validate(plan)
+    payload = marshal.dumps(_plan_to_tuple(plan))
+    header = HEADER.pack(MAGIC, SCHEMA_VERSION, marshal.version, FIELDS_FINGERPRINT,
+                         hashlib.sha256(payload).digest(), len(payload))
+    return header + payload
+
+
+def save_plan(plan, path):
+    """Write dumps_plan(plan) to a file"""
+    with open(path, 'wb') as f:
+        f.write(dumps_plan(plan))
+
+
+# --------------------------------------
+# Reading
+# --------------------------------------
+def _check_header(data):
+    """Return the payload, or raise a ValueError if it can't be trusted"""
+    if len(data) < HEADER.size:
+        raise ValueError(dstatic.ERR_MSG_BINARY_PLAN_INVALID.format(reason='too short'))
+    magic, schema_version, marshal_version, fingerprint, digest, length = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        reason = 'wrong magic bytes'
+    elif schema_version != SCHEMA_VERSION or marshal_version != marshal.version:
+        reason = f'format version {schema_version}.{marshal_version}, expected {SCHEMA_VERSION}.{marshal.version}'
+    elif fingerprint != FIELDS_FINGERPRINT:
+        reason = 'saved with different model fields'
+    elif len(data) - HEADER.size != length:
+        reason = 'wrong length'
+    else:
+        payload = memoryview(data)[HEADER.size:]
+        if hashlib.sha256(payload).digest() == digest:
+            return payload
+        reason = 'content hash mismatch'
+    raise ValueError(dstatic.ERR_MSG_BINARY_PLAN_INVALID.format(reason=reason))
+
+
+def _construct(cls, values):
+    """
+    Create a model instance from trusted field values, without validation.
+    Faster than model_construct(), which also looks up defaults and aliases.
+    "values" must hold every field.
+    """
+    obj = _new(cls)
+    _setattr(obj, '__dict__', values)
+    _setattr(obj, '__pydantic_fields_set__', set(values))
+    _setattr(obj, '__pydantic_extra__', None)
+    _setattr(obj, '__pydantic_private__', None)
+    return obj
+
+
+_new = object.__new__
+_setattr = object.__setattr__
+
+
+def _single_value(cls, value):
+    return None if value is None else _construct(cls, {'value': value})
+
+
+def _tuple_to_plan(values):
+    name, library, params, dataset_info, variable_rows, stat_rows = values
+
+    # The bulk of a wide plan: _construct() inlined
+    variables = []
+    variable_fields = frozenset(VARIABLE_FIELDS)
+    for row in variable_rows:
+        fields = dict(zip(VARIABLE_FIELDS, row))
+        bounds = row[VARIABLE_BOUNDS]
+        if bounds is not None:
+            fields['bounds'] = _construct(Bounds, {'min': bounds[0], 'max': bounds[1]})
+        categories = row[VARIABLE_CATEGORIES]
+        if categories is not None:
+            fields['categories'] = CategoryIndex.from_state(categories)
+        variable = _new(Variable)
+        _setattr(variable, '__dict__', fields)
+        _setattr(variable, '__pydantic_fields_set__', set(variable_fields))
+        _setattr(variable, '__pydantic_extra__', None)
+        _setattr(variable, '__pydantic_private__', None)
+        variables.append(variable)
+
+    statistics = []
+    for row in stat_rows:
+        fields = dict(zip(STATISTIC_FIELDS, row))
+        fields['epsilon'] = _single_value(Epsilon, row[STATISTIC_EPSILON])
+        fields['delta'] = _single_value(Delta, row[STATISTIC_DELTA])
+        statistics.append(_construct(Statistic, fields))
+
+    total_epsilon, total_delta, confidence_level, rows_public, one_row = params
+    privacy_parameters = _construct(PrivacyParameters, {
+        'total_epsilon': _single_value(Epsilon, total_epsilon),
+        'total_delta': _single_value(Delta, total_delta),
+        'confidence_level': _single_value(ConfidenceLevel, confidence_level),
+        'number_of_rows_public': rows_public,
+        'individual_in_at_most_one_row': one_row})
+
+    dataset = _construct(Dataset, dict(zip(DATASET_FIELDS, dataset_info), variables=variables))
+    if library is not None:
+        library = _construct(DPLibrary, dict(zip(['name', 'url', 'version'], library)))
+    return _construct(AnalysisPlan, {'name': name,
+                                     'differentially_private_library': library,
+                                     'dataset': dataset,
+                                     'privacy_parameters': privacy_parameters,
+                                     'statistics': statistics})
+
+
+def loads_plan(data):
+    """
+    Rebuild an AnalysisPlan from dumps_plan() bytes, without validation.
+    Raises a ValueError if the data is corrupt or was saved by another version.
+    """
+    payload = _check_header(data)
+    # Many small objects are created and none is garbage: pausing the cyclic
+    # garbage collector avoids repeated, useless collections
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _tuple_to_plan(marshal.loads(payload))
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def load_plan(path):
+    """Read a plan written by save_plan()"""
+    with open(path, 'rb') as f:
+        return loads_plan(f.read())
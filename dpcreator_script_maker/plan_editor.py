@@ -0,0 +1,240 @@
+"""
+Edit an AnalysisPlan one Statistic or Variable at a time
+
+The plan is validated in full once. After that, each edit only validates the
+changed object and the statistics that depend on it, and the epsilon/delta
+spent is kept in running totals, so an edit never re-sums the budget.
+
+    editor = PlanEditor(spec)
+    stat_id = editor.add_statistic({"variable": "Income", "statistic": "mean", "epsilon": 0.1})
+    editor.update_statistic(stat_id, epsilon=0.2)
+    editor.epsilon_available  # what's left of "total_epsilon"
+    plan = editor.to_plan()
+"""
+from collections import OrderedDict, defaultdict
+
+import dpcreator_script_maker.static_vals as dstatic
+from dpcreator_script_maker.models import AnalysisPlan, Dataset, Statistic, Variable, resolve_statistic
+
+
+class BudgetLedger:
+    """
+    A running total that values can be added to and removed from in O(1).
+    Uses Neumaier's compensated summation, so thousands of edits don't
+    accumulate rounding errors.
+    """
+    __slots__ = ('_sum', '_compensation')
+
+    def __init__(self):
+        self._sum = 0.0
+        self._compensation = 0.0
+
+    def add(self, value):
+        total = self._sum + value
+        if abs(self._sum) >= abs(value):
+            self._compensation += (self._sum - total) + value
+        else:
+            self._compensation += (value - total) + self._sum
+        self._sum = total
+
+    def remove(self, value):
+        self.add(-value)
+
+    @property
+    def total(self):
+        return self._sum + self._compensation
+
+
+def get_epsilon(stat):
+    """A statistic's epsilon, 0 if not set yet"""
+    return 0.0 if stat.epsilon is None else stat.epsilon.value
+
+
+def get_delta(stat):
+    """A statistic's delta, 0 if not set"""
+    return 0.0 if stat.delta is None else stat.delta.value
+
+
+class PlanEditor:
+    """
+    A mutable AnalysisPlan. Statistics are referenced by the id returned when
+    they were added; those of the initial plan are 0, 1, 2, ...
+    Edits that would make the plan invalid raise a ValueError and change nothing.
+    """
+
+    def __init__(self, spec):
+        plan = spec if isinstance(spec, AnalysisPlan) else AnalysisPlan.model_validate(spec)
+        self.name = plan.name
+        self.differentially_private_library = plan.differentially_private_library
+        self.privacy_parameters = plan.privacy_parameters
+        self.dataset_info = plan.dataset.model_dump(exclude={'variables'})
+
+        self.variables = OrderedDict(plan.variable_index)  # name -> Variable
+        self.statistics = OrderedDict()  # id -> Statistic
+        self._stat_ids_by_variable = defaultdict(set)  # variable name -> ids of its statistics
+        self._next_id = 0
+
+        self.epsilon_ledger = BudgetLedger()
+        self.delta_ledger = BudgetLedger()
+        for stat in plan.statistics:
+            self._check_budget(get_epsilon(stat), get_delta(stat))
+            self._insert(stat)
+
+    # --------------------------------------
+    # Budget
+    # --------------------------------------
+    @property
+    def total_epsilon(self):
+        return self.privacy_parameters.total_epsilon.value
+
+    @property
+    def total_delta(self):
+        total_delta = self.privacy_parameters.total_delta
+        return 0.0 if total_delta is None else total_delta.value
+
+    @property
+    def epsilon_used(self):
+        return self.epsilon_ledger.total
+
+    @property
+    def delta_used(self):
+        return self.delta_ledger.total
+
+    @property
+    def epsilon_available(self):
+        return max(self.total_epsilon - self.epsilon_used, 0.0)
+
+    @property
+    def delta_available(self):
+        return max(self.total_delta - self.delta_used, 0.0)
+
+    def _check_budget(self, extra_epsilon, extra_delta):
+        """Make sure spending this much more epsilon/delta stays within the totals"""
+        if extra_epsilon > 0 and \
+                self.epsilon_used + extra_epsilon > self.total_epsilon + dstatic.MAX_EPSILON_OFFSET:
+            raise ValueError(dstatic.ERR_MSG_NOT_ENOUGH_EPSILON_AVAILABLE.format(
+                available_epsilon=self.epsilon_available, requested_epsilon=extra_epsilon))
+        if extra_delta > 0 and self.delta_used + extra_delta > self.total_delta:
+            raise ValueError(dstatic.ERR_MSG_NOT_ENOUGH_DELTA_AVAILABLE.format(
+                available_delta=self.delta_available, requested_delta=extra_delta))
+
+    # --------------------------------------
+    # Statistics
+    # --------------------------------------
+    def _insert(self, stat):
+        stat_id = self._next_id
+        self._next_id += 1
+        self.statistics[stat_id] = stat
+        self._stat_ids_by_variable[stat.var_name].add(stat_id)
+        self.epsilon_ledger.add(get_epsilon(stat))
+        self.delta_ledger.add(get_delta(stat))
+        return stat_id
+
+    def _replace(self, stat_id, stat):
+        """Replace a statistic, keeping its id and position"""
+        old_stat = self.statistics[stat_id]
+        self._stat_ids_by_variable[old_stat.var_name].discard(stat_id)
+        self._stat_ids_by_variable[stat.var_name].add(stat_id)
+        self.epsilon_ledger.remove(get_epsilon(old_stat))
+        self.epsilon_ledger.add(get_epsilon(stat))
+        self.delta_ledger.remove(get_delta(old_stat))
+        self.delta_ledger.add(get_delta(stat))
+        self.statistics[stat_id] = stat
+
+    def _delete(self, stat_id):
+        stat = self.statistics.pop(stat_id)
+        self._stat_ids_by_variable[stat.var_name].discard(stat_id)
+        self.epsilon_ledger.remove(get_epsilon(stat))
+        self.delta_ledger.remove(get_delta(stat))
+        return stat
+
+    def _get_statistic(self, stat_id):
+        try:
+            return self.statistics[stat_id]
+        except KeyError:
+            raise ValueError(dstatic.ERR_MSG_STATISTIC_NOT_FOUND.format(stat_id=stat_id)) from None
+
+    def add_statistic(self, stat):
+        """Validate and add a statistic (dict or Statistic). Returns its id."""
+        if not isinstance(stat, Statistic):
+            stat = Statistic.model_validate(stat)
+        resolve_statistic(stat, self.variables)
+        self._check_budget(get_epsilon(stat), get_delta(stat))
+        return self._insert(stat)
+
+    def update_statistic(self, stat_id, **changes):
+        """Change some fields of a statistic, e.g. update_statistic(3, epsilon=0.2)"""
+        old_stat = self._get_statistic(stat_id)
+        stat = Statistic.model_validate({**old_stat.model_dump(), **changes})
+        resolve_statistic(stat, self.variables)
+        self._check_budget(get_epsilon(stat) - get_epsilon(old_stat), get_delta(stat) - get_delta(old_stat))
+        self._replace(stat_id, stat)
+        return stat
+
+    def remove_statistic(self, stat_id):
+        self._get_statistic(stat_id)
+        return self._delete(stat_id)
+
+    # --------------------------------------
+    # Variables
+    # --------------------------------------
+    def _check_not_in_use(self, var_name):
+        stat_ids = self._stat_ids_by_variable.get(var_name)
+        if stat_ids:
+            raise ValueError(dstatic.ERR_MSG_VARIABLE_IN_USE.format(
+                var_name=var_name, num_statistics=len(stat_ids)))
+
+    def add_variable(self, variable):
+        """Validate and add a variable (dict or Variable)"""
+        if not isinstance(variable, Variable):
+            variable = Variable.model_validate(variable)
+        if variable.name in self.variables:
+            raise ValueError(dstatic.ERR_MSG_VARIABLE_NAME_DUPLICATE.format(var_name=variable.name))
+        self.variables[variable.name] = variable
+        return variable
+
+    def update_variable(self, var_name, **changes):
+        """
+        Change some fields of a variable. Only the statistics on this variable
+        are checked again. A variable used by statistics can't be renamed.
+        """
+        old_variable = self.variables.get(var_name)
+        if old_variable is None:
+            raise ValueError(dstatic.ERR_MSG_VARIABLE_NOT_FOUND_IN_ANALYSIS_PLAN.format(var_name=var_name))
+        variable = Variable.model_validate({**old_variable.model_dump(), **changes})
+
+        if variable.name != var_name:
+            self._check_not_in_use(var_name)
+            if variable.name in self.variables:
+                raise ValueError(dstatic.ERR_MSG_VARIABLE_NAME_DUPLICATE.format(var_name=variable.name))
+        else:
+            variables = {var_name: variable}
+            for stat_id in self._stat_ids_by_variable.get(var_name, ()):
+                resolve_statistic(self.statistics[stat_id], variables)
+
+        if variable.name == var_name:
+            self.variables[var_name] = variable  # same position in the dataset
+        else:
+            # Renaming is rare: rebuild the dict to keep the position
+            self.variables = OrderedDict((variable.name, variable) if name == var_name else (name, other)
+                                         for name, other in self.variables.items())
+        return variable
+
+    def remove_variable(self, var_name):
+        """Remove a variable that no statistic uses"""
+        if var_name not in self.variables:
+            raise ValueError(dstatic.ERR_MSG_VARIABLE_NOT_FOUND_IN_ANALYSIS_PLAN.format(var_name=var_name))
+        self._check_not_in_use(var_name)
+        return self.variables.pop(var_name)
+
+    # --------------------------------------
+    # Output
+    # --------------------------------------
+    def to_plan(self):
+        """The current AnalysisPlan. Everything in it was already validated, so it is built without validation."""
+        dataset = Dataset.model_construct(**self.dataset_info, variables=list(self.variables.values()))
+        return AnalysisPlan.model_construct(name=self.name,
+                                            differentially_private_library=self.differentially_private_library,
+                                            dataset=dataset,
+                                            privacy_parameters=self.privacy_parameters,
+                                            statistics=list(self.statistics.values()))
@@ -0,0 +1,265 @@
+"""
+Plan the data scan of a generated script
+
+Each statistic only needs a few sufficient statistics ("accumulators") from
+its column: a row count, a clamped sum, a sum of squares, histogram bin
+counts, ... The planner collects the accumulators for every statistic,
+grouped by column and deduplicated, so the generated script prepares each
+column once and computes everything in a single scan. The release stage then
+adds noise to the accumulated values.
+
+Accumulators are additive, so the same scan works on the whole file or chunk
+by chunk.
+
+Means and variances divide by a number of rows. Statistics on the same rows
+(the same variable, or any variables whose missing values are imputed, which
+keep every row) share a single count, released once: see SharedCount.
+
+Histograms of the same column with the same bins share one accumulator; with
+other bins they get their own ("histogram_1", ...). See histogram.py.
+
+Every sensitivity of a script follows one neighbouring relation: see the
+"*_sensitivity" functions.
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+import dpcreator_script_maker.static_vals as dstatic
+from dpcreator_script_maker.histogram import plan_statistic_bins
+
+# --------------------------------------
+# Accumulators (sufficient statistics)
+# --------------------------------------
+ACC_ROWS = 'rows'  # number of rows, after missing value handling
+ACC_SUM = 'sum'  # sum of the clamped values
+ACC_SUM_SQUARES = 'sum_squares'  # sum of the squared clamped values
+ACC_HISTOGRAM = 'histogram'  # count per histogram bin
+ACC_QUANTILE = 'quantile'  # counts per quantile candidate interval
+
+# "Variable" name of the accumulators of the whole dataset, e.g. ("*", "rows")
+ALL_ROWS = '*'
+
+# Accumulators using the values clamped to the bounds (for variables with bounds)
+CLAMPED_ACCUMULATORS = [ACC_SUM, ACC_SUM_SQUARES, ACC_HISTOGRAM, ACC_QUANTILE]
+
+STAT_ACCUMULATORS = {
+    dstatic.DP_COUNT: [ACC_ROWS],
+    dstatic.DP_HISTOGRAM: [ACC_HISTOGRAM],
+    dstatic.DP_MEAN: [ACC_ROWS, ACC_SUM],
+    dstatic.DP_QUANTILE: [ACC_QUANTILE],
+    dstatic.DP_SUM: [ACC_SUM],
+    dstatic.DP_VARIANCE: [ACC_ROWS, ACC_SUM, ACC_SUM_SQUARES],
+}
+
+# Statistics that divide by the number of rows, and their number of noisy sums
+STATS_USING_COUNT = {
+    dstatic.DP_MEAN: 1,
+    dstatic.DP_VARIANCE: 2,
+}
+
+
+# --------------------------------------
+# Sensitivities
+# --------------------------------------
+# A script uses one neighbouring relation for all its statistics. When
+# "number_of_rows_public" is True, the number of rows is known (a mean may
+# divide by it), so neighbouring datasets differ in the values of up to
+# MAX_CONTRIBUTIONS rows. Otherwise, they differ by adding or removing up to
+# MAX_CONTRIBUTIONS rows. The sensitivities are per row, the scripts multiply
+# them by MAX_CONTRIBUTIONS. Counts and quantile scores move by at most 1 per
+# row either way. Bounds may be NumPy arrays.
+
+NEIGHBOURS_CHANGE = 'changing'
+NEIGHBOURS_ADD_REMOVE = 'adding or removing'
+
+
+def neighbours(rows_public):
+    """How neighbouring datasets differ, for "number_of_rows_public" """
+    return NEIGHBOURS_CHANGE if rows_public else NEIGHBOURS_ADD_REMOVE
+
+
+def sum_sensitivity(lower, upper, rows_public, keeps_all_rows=True):
+    """
+    How much one row may move a sum of values clamped to [lower, upper]:
+    max(|lower|, |upper|) when adding or removing it, and (upper - lower) when
+    changing its value. A changed row may also be a dropped missing value,
+    which adds 0.
+    """
+    if not rows_public:
+        return np.maximum(np.abs(lower), np.abs(upper))
+    dropped = np.logical_not(keeps_all_rows)
+    return np.where(dropped, np.maximum(upper, 0), upper) - np.where(dropped, np.minimum(lower, 0), lower)
+
+
+def sum_squares_sensitivity(lower, upper, rows_public, keeps_all_rows=True):
+    """
+    How much one row may move a sum of squared values clamped to [lower, upper]:
+    the largest square when adding or removing it, and the largest minus the
+    smallest square over [lower, upper] (or 0, for a dropped value) when
+    changing its value.
+    """
+    max_square = np.maximum(np.square(lower), np.square(upper))
+    if not rows_public:
+        return max_square
+    spans_zero = (np.asarray(lower) <= 0) & (np.asarray(upper) >= 0)
+    min_square = np.where(spans_zero | np.logical_not(keeps_all_rows), 0,
+                          np.minimum(np.square(lower), np.square(upper)))
+    return max_square - min_square
+
+
+def histogram_sensitivity(rows_public):
+    """
+    How much one row may move the bin counts (l1): changing its value moves
+    it from one bin to another
+    """
+    return 2 if rows_public else 1
+
+
+class ColumnScan:
+    """The accumulators computed from one column"""
+
+    def __init__(self, variable):
+        self.variable = variable
+        self.accumulators = []  # in the order first requested
+        self.histogram_bins = OrderedDict()  # histogram accumulator -> HistogramBins
+
+    @property
+    def needs_clamping(self):
+        return (self.variable.bounds is not None
+                and any(acc in CLAMPED_ACCUMULATORS or acc in self.histogram_bins for acc in self.accumulators))
+
+    def key(self, accumulator):
+        """The key of an accumulator in the script's "totals" dict"""
+        return (self.variable.name, accumulator)
+
+    def require(self, accumulator):
+        """Add an accumulator (once) and return its key"""
+        if accumulator not in self.accumulators:
+            self.accumulators.append(accumulator)
+        return self.key(accumulator)
+
+    def require_histogram(self, bins):
+        """Add a histogram accumulator for the bins (once) and return its key"""
+        for accumulator, planned in self.histogram_bins.items():
+            if planned.key == bins.key:
+                return self.key(accumulator)
+        accumulator = ACC_HISTOGRAM if not self.histogram_bins else f'{ACC_HISTOGRAM}_{len(self.histogram_bins)}'
+        self.histogram_bins[accumulator] = bins
+        return self.require(accumulator)
+
+
+class SharedCount:
+    """
+    The number of rows used by means and variances, released once per set of rows.
+
+    Its epsilon depends on the statistics using it:
+      - public: the number of rows is public and no rows are dropped. Free.
+      - a requested count on the same rows: the released count is reused. Free.
+      - otherwise, an auto-generated DP count. Each statistic pays for it
+        what it would have spent on its own count (epsilon / (number of
+        noisy sums + 1)), and the count's epsilon is the sum of those parts.
+        Each part is proportional to its statistic's epsilon, so no
+        statistic pays more than it has.
+    """
+
+    def __init__(self, rows_key):
+        self.name = None  # variable name in the script, e.g. "count_0"
+        self.rows_key = rows_key
+        self.users = []  # the statistics dividing by it
+        self.count_statistic = None  # a requested DP count on the same rows
+        self.public = False
+        self.epsilon = None
+
+    @property
+    def auto_generated(self):
+        return not self.public and self.count_statistic is None
+
+    def plan(self, rows_public):
+        """Set the epsilon, once every statistic is known"""
+        self.public = rows_public and self.rows_key[0] == ALL_ROWS
+        if self.public:
+            self.epsilon = 0.0
+        elif self.count_statistic is not None:
+            self.epsilon = self.count_statistic.epsilon.value
+        else:
+            self.epsilon = sum(self.contribution(stat) for stat in self.users)
+
+    def contribution(self, stat):
+        """The epsilon a statistic pays for the count"""
+        if self.auto_generated:
+            return stat.epsilon.value / (STATS_USING_COUNT[stat.stat_type] + 1)
+        return 0.0
+
+    def sum_epsilon(self, stat):
+        """The epsilon left for each of a statistic's noisy sums"""
+        epsilon = (stat.epsilon.value - self.contribution(stat)) / STATS_USING_COUNT[stat.stat_type]
+        if not epsilon > 0:
+            raise ValueError(dstatic.ERR_MSG_SUM_EPSILON_NOT_POSITIVE.format(
+                stat_type=stat.stat_type, var_name=stat.var_name, epsilon=epsilon))
+        return epsilon
+
+
+class ScanPlan:
+    """
+    The columns read by the script and the accumulators computed from each.
+
+        scan_plan = ScanPlan()
+        keys = scan_plan.add_statistic(stat, variable)  # {"rows": ("Income", "rows"), ...}
+    """
+
+    # All statistics are computed from a single read of the data
+    num_passes = 1
+
+    def __init__(self):
+        self.columns = OrderedDict()  # variable name -> ColumnScan
+        self.num_statistics = 0
+        self.count_all_rows = False  # whether ("*", "rows") is accumulated
+        self.counts = OrderedDict()  # rows key -> SharedCount
+        self.histograms = {}  # histogram key -> HistogramBins
+
+    def add_statistic(self, stat, variable):
+        """Register a statistic's accumulators. Returns {accumulator: key}"""
+        column = self.columns.get(variable.name)
+        if column is None:
+            column = self.columns[variable.name] = ColumnScan(variable)
+        self.num_statistics += 1
+
+        keys = {}
+        for acc in STAT_ACCUMULATORS[stat.stat_type]:
+            if acc == ACC_ROWS and variable.keeps_all_rows:
+                # Missing values are imputed, so every row is kept
+                self.count_all_rows = True
+                keys[acc] = (ALL_ROWS, ACC_ROWS)
+            elif acc == ACC_HISTOGRAM:
+                bins = plan_statistic_bins(stat, variable)
+                keys[acc] = column.require_histogram(bins)
+                self.histograms[keys[acc]] = bins
+            else:
+                keys[acc] = column.require(acc)
+
+        if stat.stat_type in STATS_USING_COUNT:
+            self.get_count(keys[ACC_ROWS]).users.append(stat)
+        elif stat.stat_type == dstatic.DP_COUNT:
+            count = self.get_count(keys[ACC_ROWS])
+            if count.count_statistic is None:
+                count.count_statistic = stat
+        return keys
+
+    def get_count(self, rows_key):
+        count = self.counts.get(rows_key)
+        if count is None:
+            count = self.counts[rows_key] = SharedCount(rows_key)
+        return count
+
+    def plan_counts(self, rows_public):
+        """
+        Once every statistic is added: drop the counts nobody divides by and set
+        the epsilon of the others. "rows_public" is "number_of_rows_public".
+        """
+        for rows_key, count in list(self.counts.items()):
+            if not count.users:
+                del self.counts[rows_key]
+        for idx, count in enumerate(self.counts.values()):
+            count.name = f'count_{idx}'
+            count.plan(rows_public)
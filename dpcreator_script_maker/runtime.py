@@ -0,0 +1,81 @@
+"""
+Runtime of the generated scripts
+
+The noise mechanisms used by every generated script. Scripts import them:
+
+    from dpcreator_script_maker.runtime import geometric, laplace
+
+rather than each defining its own. OpenDP measurements are found by a binary
+search over the noise scale, which builds the chain dozens of times, so each
+measurement is memoized by its parameters: statistics with the same type,
+sensitivity and epsilon share one measurement.
+
+Only NumPy and OpenDP are used. Scripts generated with inline_runtime=True
+include a copy of the code from the static_vals.RUNTIME_START line on,
+instead of importing it.
+"""
+from functools import lru_cache
+
+import numpy as np
+import opendp.prelude as dp
+
+dp.enable_features('contrib', 'floating-point')
+
+# ---- runtime ----
+# Measurements kept per mechanism, by (sensitivity, epsilon)
+MAX_CACHED_MEASUREMENTS = 1024
+
+
+@lru_cache(maxsize=MAX_CACHED_MEASUREMENTS)
+def geometric_measurement(sensitivity, epsilon, vector=False):
+    """The Geometric (discrete Laplace) mechanism on an integer, or a vector of integers"""
+    if vector:
+        space = dp.vector_domain(dp.atom_domain(T='i64')), dp.l1_distance(T='i64')
+    else:
+        space = dp.atom_domain(T='i64'), dp.absolute_distance(T='i64')
+    return dp.binary_search_chain(lambda scale: dp.m.make_geometric(*space, scale),
+                                  d_in=sensitivity, d_out=epsilon)
+
+
+@lru_cache(maxsize=MAX_CACHED_MEASUREMENTS)
+def laplace_measurement(sensitivity, epsilon):
+    """The Laplace mechanism on a float"""
+    return dp.binary_search_chain(
+        lambda scale: dp.m.make_laplace(dp.atom_domain(T=float), dp.absolute_distance(T=float), scale),
+        d_in=sensitivity, d_out=epsilon)
+
+
+@lru_cache(maxsize=MAX_CACHED_MEASUREMENTS)
+def noisy_max_measurement(sensitivity, epsilon):
+    """Report noisy max (Gumbel) on a vector of scores"""
+    return dp.binary_search_chain(
+        lambda scale: dp.m.make_report_noisy_max_gumbel(dp.vector_domain(dp.atom_domain(T=float)),
+                                                        dp.linf_distance(T=float), scale, 'max'),
+        d_in=sensitivity, d_out=epsilon)
+
+
+def geometric(value, sensitivity, epsilon):
+    """Release an integer with the Geometric (discrete Laplace) mechanism"""
+    return geometric_measurement(int(sensitivity), float(epsilon))(int(round(value)))
+
+
+def geometric_vector(counts, sensitivity, epsilon):
+    """Release a vector of counts (e.g. histogram bins) with the Geometric mechanism"""
+    return geometric_measurement(int(sensitivity), float(epsilon), vector=True)([int(count) for count in counts])
+
+
+def laplace(value, sensitivity, epsilon):
+    """Release a float with the Laplace mechanism"""
+    return laplace_measurement(float(sensitivity), float(epsilon))(float(value))
+
+
+def noisy_argmax(scores, sensitivity, epsilon):
+    """Return the index of the (noisy) highest score of each row of "scores", with a single measurement"""
+    meas = noisy_max_measurement(float(sensitivity), float(epsilon))
+    return [meas(row) for row in np.atleast_2d(scores).astype(float).tolist()]
+
+
+def measurement_cache_info():
+    """Hits and misses of the memoized measurements, per mechanism"""
+    return {func.__name__: func.cache_info()._asdict()
+            for func in (geometric_measurement, laplace_measurement, noisy_max_measurement)}
@@ -0,0 +1,185 @@
+"""
+On-disk cache of generated scripts
+
+Scripts are stored by content hash in a local directory, and the least
+recently used files are evicted once the directory is over its size limit.
+
+Two keys are used:
+  - the "spec key", a hash of the spec exactly as submitted. A hit on this key
+    returns the script without validating or rendering anything.
+  - the "content key", a hash of the *validated* plan. Specs that only differ
+    in ways validation normalizes (key order, 1 vs 1.0, "variable" vs
+    "var_name", ignored fields, ...) share the same script file.
+
+Both keys include the generator and OpenDP versions, so upgrading either
+never serves a stale script.
+
+    cache = ScriptCache('/tmp/dp_scripts', max_bytes=50_000_000)
+    script = cache.get_script(spec)
+    cache.stats()  # {"hits": 0, "misses": 1, ...}
+"""
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import tempfile
+
+import dpcreator_script_maker.static_vals as dstatic
+from dpcreator_script_maker import __version__
+
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024  # 100 MB
+
+SCRIPT_SUFFIX = '.py'
+SPEC_REF_SUFFIX = '.ref'  # spec key -> content key
+
+
+def canonical_json(obj):
+    """Serialize to JSON with sorted keys and no whitespace, so equal specs give equal text"""
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+def hash_key(obj, max_contributions=None, **script_options):
+    """SHA-256 of the canonical JSON, plus everything else that changes the generated script"""
+    payload = canonical_json(dict(spec=obj,
+                                  max_contributions=max_contributions,
+                                  script_options=script_options,
+                                  generator_version=__version__,
+                                  opendp_version=dstatic.OPENDP_VERSION))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ScriptCache:
+    """Content-addressed cache of generated scripts, bounded by total size on disk"""
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # file name -> size in bytes, least recently used first
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._load_entries()
+
+    def _load_entries(self):
+        """Index the files already in the cache directory, oldest access first"""
+        found = []
+        with os.scandir(self.cache_dir) as dir_entries:
+            for entry in dir_entries:
+                if entry.is_file() and entry.name.endswith((SCRIPT_SUFFIX, SPEC_REF_SUFFIX)):
+                    stat = entry.stat()
+                    found.append((stat.st_mtime, entry.name, stat.st_size))
+        for _mtime, name, size in sorted(found):
+            self._entries[name] = size
+            self._total_bytes += size
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def _read(self, name):
+        """Return the file's text and mark it as recently used, or None if it isn't cached"""
+        try:
+            with open(self._path(name), encoding='utf-8') as f:
+                text = f.read()
+            os.utime(self._path(name))  # the mtime is the last access, for other processes
+        except FileNotFoundError:
+            self._forget(name)
+            return None
+        if name in self._entries:
+            self._entries.move_to_end(name)
+        return text
+
+    def _write(self, name, text):
+        """Atomically write a file, then evict old files if over the size limit"""
+        data = text.encode('utf-8')
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(name))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self._forget(name)
+        self._entries[name] = len(data)
+        self._total_bytes += len(data)
+        self._evict()
+
+    def _forget(self, name):
+        size = self._entries.pop(name, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def _evict(self):
+        """Remove the least recently used files until the cache fits in max_bytes"""
+        while self._total_bytes > self.max_bytes and self._entries:
+            name, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+
+    def get_script(self, spec, max_contributions=None, **script_options):
+        """
+        Return the script for a spec (dict or AnalysisPlan), generating and
+        caching it on a miss.
+
+        script_options - passed to DPCreatorScriptMaker, e.g. streaming=True
+        """
+        # Imported here so that cache hits don't pay for importing the models
+        from dpcreator_script_maker.models import AnalysisPlan
+
+        if isinstance(spec, AnalysisPlan):
+            # Already validated: go straight to the content key
+            plan = spec
+            spec_key = None
+        else:
+            plan = None
+            spec_key = hash_key(spec, max_contributions, **script_options)
+            content_key = self._read(spec_key + SPEC_REF_SUFFIX)
+            if content_key is not None:
+                script = self._read(content_key + SCRIPT_SUFFIX)
+                if script is not None:
+                    self.hits += 1
+                    return script
+
+        self.misses += 1
+        if plan is None:
+            plan = AnalysisPlan.model_validate(spec)
+        content_key = hash_key(plan.model_dump(mode='json'), max_contributions, **script_options)
+
+        script = self._read(content_key + SCRIPT_SUFFIX)
+        if script is None:
+            from dpcreator_script_maker.dp_script_maker import DPCreatorScriptMaker
+            script = DPCreatorScriptMaker(plan, max_contributions=max_contributions, **script_options).script
+            self._write(content_key + SCRIPT_SUFFIX, script)
+
+        if spec_key is not None:
+            self._write(spec_key + SPEC_REF_SUFFIX, content_key)
+        return script
+
+    def stats(self):
+        """Counters and size, e.g. for monitoring"""
+        return dict(hits=self.hits,
+                    misses=self.misses,
+                    evictions=self.evictions,
+                    entries=len(self._entries),
+                    total_bytes=self._total_bytes,
+                    max_bytes=self.max_bytes)
+
+    def clear(self):
+        """Remove every cached file"""
+        for name in list(self._entries):
+            self._forget(name)
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
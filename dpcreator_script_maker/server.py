@@ -0,0 +1,338 @@
+"""
+Local generation service
+
+A long-running HTTP server, so that callers don't pay the start-up and
+warm-up cost of a process per spec. Requests are handled concurrently with
+asyncio; validation and rendering run in a bounded pool of worker processes,
+each of which builds the pydantic validators and compiles the templates once.
+
+    POST /validate   body: a spec                      -> {"valid": ..., "name": ..., "errors": [...], "warnings": [...]}
+    POST /generate   body: {"spec": ..., "options": {"streaming": true, ...}}
+                                                       -> {"valid": true, "script": "..."}, or 422 with "errors"
+    GET  /stats      queue depth, and request counts, errors and latency percentiles per endpoint
+    GET  /health
+
+When all workers are busy and "max_queue" requests are already waiting, new
+requests get a 503 with a Retry-After header instead of queueing without
+limit.
+
+It only listens on 127.0.0.1 by default and needs no network access:
+
+    dpcreator-script-maker serve --port 8765 --workers 4
+"""
+import asyncio
+import json
+import math
+import os
+import time
+import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from dpcreator_script_maker import bulk_validation
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_MAX_QUEUE = 64
+DEFAULT_MAX_BODY_BYTES = 64 * 1024 * 1024
+# Latencies kept per endpoint for the percentiles
+DEFAULT_LATENCY_WINDOW = 10_000
+LATENCY_PERCENTILES = [50, 90, 99]
+
+# DPCreatorScriptMaker arguments a /generate request may set: (JSON type, may be null)
+GENERATE_OPTIONS = {
+    'max_contributions': ('integer', True),
+    'streaming': ('boolean', False),
+    'max_memory_mb': ('number', False),
+    'workers': ('integer', True),
+    'inline_runtime': ('boolean', False),
+}
+
+# Python types of the JSON types. true and false are not numbers.
+JSON_TYPES = {'integer': (int,), 'number': (int, float), 'boolean': (bool,)}
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                413: 'Payload Too Large', 422: 'Unprocessable Entity', 500: 'Internal Server Error',
+                503: 'Service Unavailable'}
+
+
+# --------------------------------------
+# Worker processes
+# --------------------------------------
+def init_worker():
+    """Build the validators and compile the templates once per process"""
+    from dpcreator_script_maker.dp_script_maker import DPCreatorScriptMaker
+    from dpcreator_script_maker.test_specs.spec_02 import script_spec
+
+    bulk_validation.init_worker()
+    DPCreatorScriptMaker(script_spec)
+
+
+def validate_spec(body):
+    """Validate a JSON spec. The same result as bulk validation, without the line number"""
+    result = bulk_validation.validate_spec_line(None, body)
+    del result['line']
+    return result
+
+
+def generate_script(spec, options):
+    """Render the script of a spec (a dict) with DPCreatorScriptMaker options"""
+    from pydantic import ValidationError
+    from dpcreator_script_maker.dp_script_maker import DPCreatorScriptMaker
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        try:
+            script = DPCreatorScriptMaker(spec, **options).script
+            result = dict(valid=True, script=script)
+        except ValidationError as err:
+            result = dict(valid=False, errors=err.errors(include_url=False, include_context=False,
+                                                         include_input=False))
+        except ValueError as err:
+            result = dict(valid=False, errors=[dict(msg=str(err))])
+    result['warnings'] = [str(w.message) for w in caught]
+    return result
+
+
+# --------------------------------------
+# Server
+# --------------------------------------
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def check_options(options):
+    """Raise a 400 for options that aren't an object, unknown options, or values of the wrong JSON type"""
+    if not isinstance(options, dict):
+        raise HTTPError(400, '"options" must be an object')
+    unknown = sorted(set(options) - set(GENERATE_OPTIONS))
+    if unknown:
+        raise HTTPError(400, f'Unknown options: {", ".join(unknown)}. Choices: {", ".join(GENERATE_OPTIONS)}')
+    for name, value in options.items():
+        json_type, nullable = GENERATE_OPTIONS[name]
+        if value is None and nullable:
+            continue
+        if not isinstance(value, JSON_TYPES[json_type]) or (json_type != 'boolean' and isinstance(value, bool)):
+            raise HTTPError(400, f'Option "{name}" must be {"an" if json_type == "integer" else "a"} {json_type}'
+                                 f'{" or null" if nullable else ""}, not {json.dumps(value)}')
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    return sorted_values[max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)]
+
+
+class EndpointStats:
+    """Requests, rejections, internal errors and recent latencies of one endpoint"""
+
+    def __init__(self, window=DEFAULT_LATENCY_WINDOW):
+        self.count = 0
+        self.rejected = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=window)
+
+    def as_dict(self):
+        latencies = sorted(self.latencies)
+        result = dict(count=self.count, rejected=self.rejected, errors=self.errors)
+        for pct in LATENCY_PERCENTILES:
+            result[f'p{pct}_ms'] = percentile(latencies, pct) * 1000 if latencies else None
+        return result
+
+
+class ScriptServer:
+    """
+    Validate specs and render scripts over HTTP.
+
+        server = ScriptServer(port=0, workers=4)
+        await server.start()   # server.port is the bound port
+        await server.serve_forever()
+
+    workers - number of worker processes (default: CPU count)
+    max_queue - requests that may wait for a worker; any more get a 503
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None, max_queue=DEFAULT_MAX_QUEUE,
+                 max_body_bytes=DEFAULT_MAX_BODY_BYTES):
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.max_body_bytes = max_body_bytes
+        self.pending = 0  # submitted to the pool and not finished
+        self.endpoints = {'/validate': EndpointStats(), '/generate': EndpointStats()}
+        self._executor = None
+        self._server = None
+
+    @property
+    def queue_depth(self):
+        """Requests waiting for a worker"""
+        return max(self.pending - self.workers, 0)
+
+    def stats(self):
+        return dict(queue_depth=self.queue_depth,
+                    in_flight=min(self.pending, self.workers),
+                    workers=self.workers,
+                    max_queue=self.max_queue,
+                    endpoints={path: stats.as_dict() for path, stats in self.endpoints.items()})
+
+    def make_executor(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker)
+
+    async def start(self):
+        """Start the workers (and wait until they are warm), then listen"""
+        loop = asyncio.get_running_loop()
+        self._executor = self.make_executor()
+        # Start every worker now, so the first requests don't pay for it
+        await asyncio.gather(*[loop.run_in_executor(self._executor, os.getpid) for _ in range(self.workers)])
+        self._server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+
+    async def run_in_worker(self, path, func, *args):
+        """Run func in the pool, or raise a 503 if the queue is full"""
+        if self.pending >= self.workers + self.max_queue:
+            self.endpoints[path].rejected += 1
+            raise HTTPError(503, 'Too many requests waiting, retry later')
+        self.pending += 1
+        executor = self._executor
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+        except BrokenProcessPool:
+            # A worker died: this request fails, and the next ones get a new pool
+            if self._executor is executor:
+                executor.shutdown(wait=False)
+                self._executor = self.make_executor()
+            raise
+        finally:
+            self.pending -= 1
+
+    async def handle_request(self, method, path, body):
+        """Return (status, JSON-serializable response)"""
+        if path in ('/stats', '/health'):
+            if method != 'GET':
+                raise HTTPError(405, f'{path} only accepts GET')
+            return 200, self.stats() if path == '/stats' else dict(status='ok')
+        if path not in self.endpoints:
+            raise HTTPError(404, f'Unknown path: {path}')
+        if method != 'POST':
+            raise HTTPError(405, f'{path} only accepts POST')
+
+        start = time.perf_counter()
+        if path == '/validate':
+            result = await self.run_in_worker(path, validate_spec, body)
+            status = 200
+        else:
+            try:
+                request = json.loads(body)
+            except ValueError as err:
+                raise HTTPError(400, f'Invalid JSON: {err}')
+            if not isinstance(request, dict) or not isinstance(request.get('spec'), dict):
+                raise HTTPError(400, 'The body must be an object with a "spec" object')
+            options = request.get('options')
+            options = {} if options is None else options
+            check_options(options)
+            result = await self.run_in_worker(path, generate_script, request['spec'], options)
+            status = 200 if result['valid'] else 422
+
+        stats = self.endpoints[path]
+        stats.count += 1
+        stats.latencies.append(time.perf_counter() - start)
+        return status, result
+
+    async def read_request(self, reader):
+        """Return (method, path, headers, body), or None at the end of the connection"""
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        try:
+            method, path, _version = request_line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPError(400, 'Malformed request line')
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HTTPError(400, 'Invalid Content-Length')
+        if length > self.max_body_bytes:
+            raise HTTPError(413, f'The body is over {self.max_body_bytes} bytes')
+        body = await reader.readexactly(length) if length else b''
+        return method, path.split('?')[0], headers, body
+
+    async def handle_connection(self, reader, writer):
+        """Answer the requests of one (keep-alive) connection, in order"""
+        try:
+            while True:
+                keep_alive = True
+                path = None
+                try:
+                    request = await self.read_request(reader)
+                    if request is None:
+                        break
+                    method, path, headers, body = request
+                    keep_alive = headers.get('connection', '').lower() != 'close'
+                    status, response = await self.handle_request(method, path, body)
+                except HTTPError as err:
+                    status, response = err.status, dict(error=str(err))
+                    keep_alive = keep_alive and err.status not in (400, 413)
+                except asyncio.IncompleteReadError:
+                    break
+                except Exception as err:
+                    # A bug, or a worker that died: answer rather than drop the connection
+                    if path in self.endpoints:
+                        self.endpoints[path].errors += 1
+                    status, response = 500, dict(error=f'Internal error: {type(err).__name__}: {err}')
+                    keep_alive = False
+
+                payload = json.dumps(response).encode()
+                head = [f'HTTP/1.1 {status} {HTTP_REASONS[status]}',
+                        'Content-Type: application/json',
+                        f'Content-Length: {len(payload)}',
+                        f'Connection: {"keep-alive" if keep_alive else "close"}']
+                if status == 503:
+                    head.append('Retry-After: 1')
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def _serve(server):
+    await server.start()
+    print(f'Listening on http://{server.host}:{server.port} with {server.workers} workers', flush=True)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None, max_queue=DEFAULT_MAX_QUEUE):
+    """Run a ScriptServer until interrupted"""
+    try:
+        asyncio.run(_serve(ScriptServer(host, port, workers, max_queue)))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,264 @@
+"""
+Monte Carlo simulation of the error of every statistic of a plan
+
+accuracy.py gives a closed-form bound on the noise of one value. Means,
+variances and quantiles are ratios, clamped or picked from candidates, so
+the error of the released value can differ a lot from that bound. The
+simulator runs the plan's generated script on a sample (or synthetic)
+dataset once, then adds the noise the script would add many times over:
+
+    simulation = simulate_plan(plan, data, num_trials=10_000)  # data: a DataFrame
+    simulation.report()  # [{"variable": ..., "error_quantiles": {0.68: ..., ..., 0.999: ...}}, ...]
+
+The error of a trial is |noisy value - value without noise|, the error due
+to differential privacy alone. Each statistic draws the noise of every trial
+in one NumPy call, e.g. a (trials, bins) array for a histogram, and the
+shared counts of means and variances are drawn once per trial and reused,
+as in the script. The noise distributions are those of the OpenDP
+measurements: Geometric (discrete Laplace) and Laplace with a scale of
+"sensitivity / epsilon", and Gumbel noise with a scale of
+"2 * sensitivity / epsilon" for the (report noisy max) quantiles.
+"""
+import numpy as np
+
+import dpcreator_script_maker.static_vals as dstatic
+from dpcreator_script_maker.dp_script_maker import DPCreatorScriptMaker, quantile_candidates
+from dpcreator_script_maker.models import AnalysisPlan
+from dpcreator_script_maker.planner import (ACC_HISTOGRAM, ACC_QUANTILE, ACC_ROWS, ACC_SUM, ACC_SUM_SQUARES, ScanPlan,
+                                            histogram_sensitivity, sum_sensitivity, sum_squares_sensitivity)
+
+DEFAULT_NUM_TRIALS = 10_000
+
+
+# --------------------------------------
+# Noise, for all the trials at once
+# --------------------------------------
+def discrete_laplace(rng, scale, size):
+    """
+    Geometric mechanism noise: the difference of two geometric variables,
+    each drawn as floor(scale * exponential), which is faster than rng.geometric()
+    """
+    return (np.floor(scale * rng.standard_exponential(size))
+            - np.floor(scale * rng.standard_exponential(size))).astype(np.int64)
+
+
+def laplace(rng, scale, size):
+    return rng.laplace(0.0, scale, size)
+
+
+def noisy_argmax(rng, scores, scale, size):
+    """
+    The index of the noisy max of each row of "scores", with Gumbel noise,
+    "size" times. argmax(scores + Gumbel(scale)) is drawn from softmax(scores / scale),
+    so draw from that: one uniform per (trial, row) instead of a Gumbel per score.
+    """
+    weights = np.exp((scores - scores.max(axis=-1, keepdims=True)) / scale)
+    cdf = np.cumsum(weights, axis=-1)
+    cdf /= cdf[:, -1:]
+    uniforms = rng.random((size, len(scores)))
+    indices = np.column_stack([np.searchsorted(row, uniforms[:, idx], side='right')
+                               for idx, row in enumerate(cdf)])
+    return np.minimum(indices, scores.shape[-1] - 1)
+
+
+def noisy_release(rng, mechanism, value, sensitivity, epsilon, size):
+    """Release "value" with "size" independent draws, as the script's geometric() or laplace()"""
+    if mechanism == dstatic.NOISE_GEOMETRIC_MECHANISM:
+        return round(value) + discrete_laplace(rng, sensitivity / epsilon, size)
+    return value + laplace(rng, sensitivity / epsilon, size)
+
+
+# --------------------------------------
+# Data
+# --------------------------------------
+def synthetic_data(plan, num_rows=dstatic.DEFAULT_EXPECTED_ROWS, seed=None):
+    """
+    A DataFrame with a column per variable: uniform values between the bounds,
+    and uniformly picked categories or true/false values
+    """
+    import pandas as pd
+
+    plan = plan if isinstance(plan, AnalysisPlan) else AnalysisPlan.model_validate(plan)
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for variable in plan.dataset.variables:
+        lower, upper = (variable.bounds.min, variable.bounds.max) if variable.bounds else (0, 1)
+        if variable.var_type == dstatic.VAR_TYPE_INTEGER:
+            columns[variable.name] = rng.integers(int(lower), int(upper), num_rows, endpoint=True).astype(float)
+        elif variable.var_type == dstatic.VAR_TYPE_FLOAT:
+            columns[variable.name] = rng.uniform(lower, upper, num_rows)
+        else:
+            if variable.var_type == dstatic.VAR_TYPE_CATEGORICAL:
+                choices = list(variable.category_index)
+            elif variable.true_value is None:
+                choices = [True, False]
+            else:
+                choices = [variable.true_value, variable.false_value]
+            columns[variable.name] = rng.choice(np.asarray(choices, dtype=object), num_rows)
+    return pd.DataFrame(columns)
+
+
+def scan_totals(script, data):
+    """The sufficient statistics of a generated script, from its scan of a DataFrame"""
+    namespace = {'__name__': 'dp_script'}
+    exec(compile(script, 'dp_script.py', 'exec'), namespace)
+    totals = {}
+    namespace['scan'](data, totals)
+    return totals
+
+
+# --------------------------------------
+# Simulation
+# --------------------------------------
+class UtilitySimulation:
+    """
+    The errors of every statistic of a plan over the trials. Lists are in the
+    order of plan.statistics.
+    """
+
+    def __init__(self, plan, num_trials, values, errors):
+        self.plan = plan
+        self.num_trials = num_trials
+        self.values = values  # the values without noise
+        self.errors = errors  # absolute errors: (trials,) or, for histograms and quantiles, (trials, bins)
+
+    def error_quantiles(self, idx):
+        """{confidence level: error}: the error isn't exceeded in that share of the trials"""
+        return dict(zip(dstatic.CONFIDENCE_LEVELS,
+                        np.quantile(self.errors[idx], dstatic.CONFIDENCE_LEVELS).tolist()))
+
+    def report(self):
+        """One dict per statistic. The errors of histogram bins and of several quantiles are pooled"""
+        return [dict(variable=stat.var_name,
+                     statistic=stat.stat_type,
+                     epsilon=stat.epsilon.value,
+                     value=self.values[idx],
+                     mean_error=float(self.errors[idx].mean()),
+                     error_quantiles=self.error_quantiles(idx))
+                for idx, stat in enumerate(self.plan.statistics)]
+
+
+class _Simulator:
+    """The releases of one plan, from the totals of the script's scan"""
+
+    def __init__(self, maker, totals, num_trials, rng):
+        self.maker = maker
+        self.totals = totals
+        self.num_trials = num_trials
+        self.rng = rng
+        self.max_contributions = maker.max_contributions
+
+        # The same plan as the script's, to find the keys and the shared counts
+        plan = maker.plan
+        self.rows_public = plan.privacy_parameters.number_of_rows_public
+        self.scan_plan = ScanPlan()
+        self.planned = [(stat, plan.get_variable(stat), self.scan_plan.add_statistic(stat, plan.get_variable(stat)))
+                        for stat in plan.statistics]
+        self.scan_plan.plan_counts(self.rows_public)
+
+        # Shared counts are released once per trial and used by every statistic on the rows
+        self.noisy_counts = {}
+        for rows_key, count in self.scan_plan.counts.items():
+            value = totals[rows_key]
+            if count.public:
+                self.noisy_counts[rows_key] = np.full(num_trials, value)
+            else:
+                self.noisy_counts[rows_key] = noisy_release(rng, dstatic.NOISE_GEOMETRIC_MECHANISM, value,
+                                                            self.max_contributions, count.epsilon, num_trials)
+
+    def simulate(self, stat, variable, keys):
+        """Return (value without noise, noisy values of every trial)"""
+        stat_type = stat.stat_type
+        epsilon = stat.epsilon.value
+        size = self.num_trials
+        contributions = self.max_contributions
+        count = self.scan_plan.counts.get(keys.get(ACC_ROWS))
+
+        if stat_type == dstatic.DP_COUNT:
+            value = self.totals[keys[ACC_ROWS]]
+            if count is not None and count.count_statistic is stat and not count.public:
+                return value, self.noisy_counts[count.rows_key]
+            return value, noisy_release(self.rng, dstatic.NOISE_GEOMETRIC_MECHANISM, value, contributions,
+                                        epsilon, size)
+
+        if stat_type == dstatic.DP_HISTOGRAM:
+            value = np.asarray(self.totals[keys[ACC_HISTOGRAM]])
+            return value, value + discrete_laplace(self.rng, contributions * histogram_sensitivity(self.rows_public)
+                                                   / epsilon, (size, len(value)))
+
+        lower, upper = self.maker.get_bounds(variable)
+        value_sensitivity = float(sum_sensitivity(lower, upper, self.rows_public, variable.keeps_all_rows))
+        mechanism = dstatic.NOISE_GEOMETRIC_MECHANISM if variable.var_type == dstatic.VAR_TYPE_INTEGER \
+            else dstatic.NOISE_LAPLACE_MECHANISM
+
+        if stat_type == dstatic.DP_SUM:
+            value = self.totals[keys[ACC_SUM]]
+            return value, noisy_release(self.rng, mechanism, value, contributions * value_sensitivity, epsilon, size)
+
+        if stat_type == dstatic.DP_MEAN:
+            rows, total = self.totals[count.rows_key], self.totals[keys[ACC_SUM]]
+            noisy_total = noisy_release(self.rng, mechanism, total, contributions * value_sensitivity,
+                                        count.sum_epsilon(stat), size)
+            noisy = np.clip(noisy_total / np.maximum(self.noisy_counts[count.rows_key], 1), lower, upper)
+            return float(np.clip(total / max(rows, 1), lower, upper)), noisy
+
+        if stat_type == dstatic.DP_VARIANCE:
+            def variance(rows, total, total_squares):
+                rows = np.maximum(rows, 2)
+                return np.clip((total_squares - total ** 2 / rows) / (rows - 1), 0, (upper - lower) ** 2 / 4)
+
+            total, total_squares = self.totals[keys[ACC_SUM]], self.totals[keys[ACC_SUM_SQUARES]]
+            squares_sensitivity = float(sum_squares_sensitivity(lower, upper, self.rows_public,
+                                                                variable.keeps_all_rows))
+            sum_epsilon = count.sum_epsilon(stat)
+            noisy = variance(self.noisy_counts[count.rows_key],
+                             noisy_release(self.rng, dstatic.NOISE_LAPLACE_MECHANISM, total,
+                                           contributions * value_sensitivity, sum_epsilon, size),
+                             noisy_release(self.rng, dstatic.NOISE_LAPLACE_MECHANISM, total_squares,
+                                           contributions * squares_sensitivity, sum_epsilon, size))
+            return float(variance(self.totals[count.rows_key], total, total_squares)), noisy
+
+        if stat_type == dstatic.DP_QUANTILE:
+            candidates = np.asarray(quantile_candidates(lower, upper, variable.var_type == dstatic.VAR_TYPE_INTEGER))
+            counts_right, counts_left = self.totals[keys[ACC_QUANTILE]]
+            below = np.cumsum(counts_right)[:-1]
+            above = counts_left.sum() - np.cumsum(counts_left)[:-1]
+            alphas = np.asarray(stat.quantile_alphas)[:, None]
+            scores = -np.abs((1 - alphas) * below - alphas * above)
+            noisy_indices = noisy_argmax(self.rng, scores, 2 * contributions * len(alphas) / epsilon, size)
+            value, noisy = candidates[np.argmax(scores, axis=-1)], candidates[noisy_indices]
+            if stat.quantiles is None:  # the median, as a number
+                return float(value[0]), noisy[:, 0]
+            return value, noisy
+
+        raise ValueError(dstatic.ERR_MSG_INVALID_STAT_TYPE.format(stat_type=stat_type))
+
+    def run(self):
+        values, errors = [], []
+        for stat, variable, keys in self.planned:
+            value, noisy = self.simulate(stat, variable, keys)
+            errors.append(np.abs(np.asarray(noisy, dtype=float) - value))
+            values.append(value.tolist() if isinstance(value, np.ndarray) else value)
+        return values, errors
+
+
+def simulate_plan(spec, data=None, num_trials=DEFAULT_NUM_TRIALS, num_rows=dstatic.DEFAULT_EXPECTED_ROWS,
+                  seed=None, max_contributions=None):
+    """
+    Simulate the release of every statistic of a plan "num_trials" times and
+    return a UtilitySimulation. Every statistic must have an epsilon (see
+    allocate_epsilon()).
+
+    data - a sample of the dataset, as a DataFrame. By default, "num_rows"
+        rows of synthetic_data().
+    seed - for the synthetic data and the noise
+    max_contributions - maximum rows per individual. Only needed when
+        "individual_in_at_most_one_row" is False.
+    """
+    maker = DPCreatorScriptMaker(spec, max_contributions=max_contributions)
+    rng = np.random.default_rng(seed)
+    if data is None:
+        data = synthetic_data(maker.plan, num_rows, rng)
+    totals = scan_totals(maker.script, data)
+    values, errors = _Simulator(maker, totals, num_trials, rng).run()
+    return UtilitySimulation(maker.plan, num_trials, values, errors)
@@ -0,0 +1,212 @@
+"""
+Load very large spec files incrementally
+
+`json.load()` followed by `AnalysisPlan(**spec)` holds the whole document as
+dicts and lists while the models are built, roughly doubling peak memory.
+`load_spec()` reads the file in blocks instead: each entry of
+"dataset.variables" and "statistics" is decoded on its own, validated and
+dropped, so the only parsed JSON in memory at a time is one entry (plus one
+read block). Malformed entries are rejected as soon as they are read.
+
+The other values of the spec (name, privacy parameters, ...) are small and
+decoded whole.
+
+    plan = load_spec('study_spec.json')  # an AnalysisPlan
+"""
+import json
+
+from pydantic import ValidationError
+
+import dpcreator_script_maker.static_vals as dstatic
+from dpcreator_script_maker.models import AnalysisPlan, Dataset, Statistic, Variable, resolve_statistic
+
+DEFAULT_BLOCK_SIZE = 1024 * 1024  # characters read at a time
+
+# A value cut at the end of the buffer may fail to decode this close to the end
+# (e.g. "tru" or "-1e"): read more before deciding it is malformed
+_TRUNCATION_MARGIN = 64
+
+_WHITESPACE = ' \t\n\r'
+
+# Characters that may continue a number
+_NUMBER_CHARS = '0123456789.eE+-'
+
+
+class JSONStream:
+    """
+    Read JSON values one at a time from a text file, keeping only the unread
+    part of the current block in memory.
+    """
+
+    def __init__(self, f, block_size=DEFAULT_BLOCK_SIZE):
+        self.f = f
+        self.block_size = block_size
+        self.buffer = ''
+        self.pos = 0  # position in the buffer
+        self.offset = 0  # characters dropped from the start of the buffer
+        self.eof = False
+        self._decoder = json.JSONDecoder()
+
+    @property
+    def position(self):
+        """Position in the file, in characters"""
+        return self.offset + self.pos
+
+    def _read(self, min_size=0):
+        """Drop what's been read and add the next block (at least "min_size" characters)"""
+        self.offset += self.pos
+        self.buffer = self.buffer[self.pos:]
+        self.pos = 0
+        block = self.f.read(max(self.block_size, min_size))
+        if block:
+            self.buffer += block
+        else:
+            self.eof = True
+        return bool(block)
+
+    def error(self, message):
+        return ValueError(dstatic.ERR_MSG_SPEC_JSON_INVALID.format(message=message, position=self.position))
+
+    def peek(self):
+        """The next character that isn't whitespace, '' at the end of the file"""
+        while True:
+            buffer = self.buffer
+            pos = self.pos
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            self.pos = pos
+            if pos < len(buffer):
+                return buffer[pos]
+            if not self._read():
+                return ''
+
+    def expect(self, chars):
+        """Consume the next character, one of "chars". Returns it."""
+        char = self.peek()
+        if not char or char not in chars:
+            found = repr(char) if char else 'the end of the file'
+            raise self.error(f'expected one of {chars!r}, found {found}')
+        self.pos += 1
+        return char
+
+    def decode(self):
+        """Decode the next value. Only this value is parsed, however big the file."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buffer, self.pos)
+                # Other values end with a delimiter, but a number may continue in the next block
+                if self.eof or (end < len(self.buffer) and self.buffer[end] not in _NUMBER_CHARS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError as err:
+                truncated = (err.pos >= len(self.buffer) - _TRUNCATION_MARGIN
+                             or err.msg.startswith('Unterminated string'))
+                if self.eof or not truncated:
+                    raise self.error(err.msg) from None
+            # Read at least as much again, so a big value is decoded O(1) times
+            self._read(min_size=len(self.buffer) - self.pos)
+
+    def iter_object(self):
+        """Yield the keys of an object. The caller must consume each value."""
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.decode()
+            if not isinstance(key, str):
+                raise self.error('expected an object key')
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+    def iter_array(self):
+        """Yield once per item of an array. The caller must consume each item."""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self.expect(',]') == ']':
+                return
+
+
+class _SpecLoader:
+    """Validate the entries of a spec as they are decoded"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.variables = {}  # name -> Variable, in order
+        self.dataset_read = False
+
+    def validate(self, model, data, location):
+        try:
+            return model.model_validate(data)
+        except ValidationError as err:
+            raise ValueError(dstatic.ERR_MSG_SPEC_ENTRY_INVALID.format(
+                location=location, position=self.stream.position, error=err)) from None
+
+    def read_variables(self):
+        stream = self.stream
+        for idx, _ in enumerate(stream.iter_array()):
+            variable = self.validate(Variable, stream.decode(), f'dataset.variables[{idx}]')
+            if self.variables.setdefault(variable.name, variable) is not variable:
+                raise ValueError(dstatic.ERR_MSG_VARIABLE_NAME_DUPLICATE.format(var_name=variable.name))
+
+    def read_dataset(self):
+        stream = self.stream
+        dataset_info = {}
+        for key in stream.iter_object():
+            if key == 'variables':
+                self.read_variables()
+            else:
+                dataset_info[key] = stream.decode()
+        self.dataset_read = True
+        # The variables are already validated, and pydantic would run their
+        # "after" validators again: validate the other fields with (at most)
+        # one variable, then attach them all
+        variables = list(self.variables.values())
+        dataset = self.validate(Dataset, dict(dataset_info, variables=variables[:1]), 'dataset')
+        dataset.variables = variables
+        return dataset
+
+    def read_statistics(self):
+        stream = self.stream
+        statistics = []
+        for idx, _ in enumerate(stream.iter_array()):
+            stat = self.validate(Statistic, stream.decode(), f'statistics[{idx}]')
+            if self.dataset_read:
+                resolve_statistic(stat, self.variables)  # otherwise, checked by AnalysisPlan
+            statistics.append(stat)
+        return statistics
+
+    def load(self):
+        stream = self.stream
+        spec = {}
+        for key in stream.iter_object():
+            if key == 'dataset':
+                spec[key] = self.read_dataset()
+            elif key == 'statistics':
+                spec[key] = self.read_statistics()
+            else:
+                spec[key] = stream.decode()
+        if stream.peek():
+            raise stream.error('extra data after the spec')
+        # Dataset and Statistic models are used as they are
+        return AnalysisPlan.model_validate(spec)
+
+
+def load_spec(source, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Read and validate a JSON spec, entry by entry. Returns an AnalysisPlan.
+
+    source - a file path or a text file object
+    Raises a ValueError for malformed JSON or the first invalid entry.
+    """
+    if hasattr(source, 'read'):
+        return _SpecLoader(JSONStream(source, block_size)).load()
+    with open(source, encoding='utf-8') as f:
+        return _SpecLoader(JSONStream(f, block_size)).load()
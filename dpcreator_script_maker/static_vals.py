@@ -88,6 +88,61 @@ DP_STATS_REQUIRE_COUNTS = [DP_MEAN,
 
 VALID_DP_STATS_CHOICES_STR = ', '.join(DP_STATS_CHOICES)
 
+# Statistics that need numeric bounds (clamping)
+DP_STATS_REQUIRE_BOUNDS = [DP_MEAN,
+                           DP_SUM,
+                           DP_QUANTILE,
+                           DP_VARIANCE]
+
+# Variable types allowed for each statistic, from "allowedVariableTypes" above.
+# Sums, like means, need numeric values.
+ALLOWED_VARIABLE_TYPES = {
+    DP_MEAN: [VAR_TYPE_INTEGER, VAR_TYPE_FLOAT],
+    DP_SUM: [VAR_TYPE_INTEGER, VAR_TYPE_FLOAT],
+    DP_COUNT: [VAR_TYPE_INTEGER, VAR_TYPE_FLOAT, VAR_TYPE_CATEGORICAL, VAR_TYPE_BOOLEAN],
+    DP_VARIANCE: [VAR_TYPE_INTEGER, VAR_TYPE_FLOAT],
+    DP_HISTOGRAM: [VAR_TYPE_INTEGER, VAR_TYPE_FLOAT, VAR_TYPE_CATEGORICAL, VAR_TYPE_BOOLEAN],
+    DP_QUANTILE: [VAR_TYPE_INTEGER, VAR_TYPE_FLOAT],
+}
+
+# The same as (stat_type, var_type) pairs, for O(1) checks
+STAT_VAR_TYPE_COMPATIBILITY = frozenset((stat_type, var_type)
+                                        for stat_type, var_types in ALLOWED_VARIABLE_TYPES.items()
+                                        for var_type in var_types)
+
+# --------------------------------------
+# Script generation
+# --------------------------------------
+OPENDP_VERSION = '0.9.2'
+
+DEFAULT_QUANTILE_ALPHA = 0.5  # median
+DEFAULT_QUANTILE_MAX_CANDIDATES = 100
+DEFAULT_HIST_NUMBER_OF_BINS = 10
+MAX_HIST_NUMBER_OF_BINS = 10_000
+
+# Dataset file formats the generated scripts can read
+FILE_FORMAT_CSV = 'csv'
+FILE_FORMAT_PARQUET = 'parquet'
+FILE_FORMAT_ARROW = 'arrow'  # Arrow IPC file (Feather v2)
+FILE_FORMAT_CHOICES = [FILE_FORMAT_CSV, FILE_FORMAT_PARQUET, FILE_FORMAT_ARROW]
+
+# Streaming scripts read the data in chunks sized to stay under this peak memory
+DEFAULT_STREAMING_MAX_MEMORY_MB = 256
+
+# The noise mechanisms imported by the generated scripts (see runtime.py)
+RUNTIME_MODULE = 'dpcreator_script_maker.runtime'
+RUNTIME_FUNCTIONS = ['geometric', 'geometric_vector', 'laplace', 'noisy_argmax']
+# Standalone scripts copy runtime.py from this line on
+RUNTIME_START = '# ---- runtime ----'
+
+# --------------------------------------
+# Epsilon allocation
+# --------------------------------------
+# Number of rows assumed when allocating epsilon, if the caller doesn't give one
+DEFAULT_EXPECTED_ROWS = 1_000
+# Confidence level of the accuracies, if the plan doesn't set one
+DEFAULT_CONFIDENCE_LEVEL = CL_95
+
 # --------------------------------------
 # Keys (mostly Histogram bin types)
 # --------------------------------------
@@ -109,6 +164,11 @@ VALID_HIST_BIN_TYPE_CHOICES_STR = ', '.join(HIST_VALID_BIN_TYPES)
 ERR_MSG_HIST_BIN_TYPE_UKNOWN = (f'Unknown histogram bin type. Expected:'
                                 f' {VALID_HIST_BIN_TYPE_CHOICES_STR}')
 ERR_MSG_TOO_MANY_BINS = 'There are too many bins given the min and max values.'
+ERR_MSG_HIST_BIN_TYPE_NOT_ALLOWED = 'Histogram bins "{bin_type}" are not available for "{var_type}" variables'
+ERR_MSG_HIST_BIN_EDGES_INVALID = ('Histogram bin edges must be increasing values'
+                                  ' between the min ({lower}) and max ({upper})')
+ERR_MSG_QUANTILES_NOT_ALLOWED = '"quantiles" may only be set for "quantile" statistics, not "{stat_type}"'
+ERR_MSG_QUANTILES_DUPLICATE = 'Each of the "quantiles" may only be requested once'
 # --------------------------------------
 # Missing value handling
 # --------------------------------------
@@ -121,6 +181,11 @@ MISSING_VAL_INSERT_RANDOM = 'insert_random'
 MISSING_VAL_INSERT_FIXED = 'insert_fixed'
 MISSING_VAL_NOT_APPLICABLE = ''
 
+# Strategies a variable may set: missing values are dropped, or replaced in every row
+MISSING_VAL_STRATEGIES = [MISSING_VAL_DROP,
+                          MISSING_VAL_INSERT_RANDOM,
+                          MISSING_VAL_INSERT_FIXED]
+
 MISSING_VAL_HANDLING_TYPES = [MISSING_VAL_DROP,
                               MISSING_VAL_INSERT_RANDOM,
                               MISSING_VAL_INSERT_FIXED,
@@ -186,6 +251,26 @@ ERR_MSG_DEPOSIT_NO_DV_USER = 'The Datavese user could not be for this release.'
 
 ERR_BOOL_TRUE_FALSE_NOT_EQUAL = f'The True and False values cannot be the same'
 
+# Variable validation (shared by the pydantic models and the columnar validator)
+ERR_MSG_BOUNDS_MAX_NOT_GREATER = 'Maximum value must be greater than minimum value.'
+ERR_MSG_BOUNDS_REQUIRED = "For '{var_type}' type, 'bounds' (min/max) must be defined."
+ERR_MSG_BOUNDS_NOT_ALLOWED = "For '{var_type}' type, both min and max should be None."
+ERR_MSG_BOUNDS_MIN_NOT_INTEGER = f"For variable type '{VAR_TYPE_INTEGER}', 'min' must be an integer."
+ERR_MSG_BOUNDS_MAX_NOT_INTEGER = f"For variable type '{VAR_TYPE_INTEGER}', 'max' must be an integer."
+ERR_MSG_CATEGORIES_REQUIRED = (f'"categories" must be set and not empty for "{VAR_TYPE_CATEGORICAL}"'
+                               ' type variables')
+ERR_MSG_CATEGORIES_NOT_ALLOWED = f'categories must only be set for "{VAR_TYPE_CATEGORICAL}" type variables'
+ERR_MSG_CATEGORIES_DUPLICATE = 'Duplicate categories are not allowed. Found: "{category}"'
+ERR_MSG_IMPUTE_NOT_IN_CATEGORIES = 'The "impute_value" does not match any of the specified categories.'
+ERR_MSG_IMPUTE_CONSTANT_REQUIRED = (f'"impute_constant" must be set when "missing_value_handling"'
+                                    f' is "{MISSING_VAL_INSERT_FIXED}"')
+ERR_MSG_IMPUTE_CONSTANT_NOT_ALLOWED = ('"impute_constant" may only be set when "missing_value_handling"'
+                                       f' is "{MISSING_VAL_INSERT_FIXED}" (or not set)')
+ERR_MSG_BOOLEAN_SET_BOTH_VALUES = (f'For "{VAR_TYPE_BOOLEAN}" type variables, either set both'
+                                   ' "true_value" and "false_value" OR leave both empty. Do not set'
+                                   ' just one of the values.')
+ERR_MSG_BOOLEAN_VALUES_EQUAL = '"true_value" and "false_value" must be different.'
+
 # Setup Questions
 
 SETUP_Q_01_ATTR = 'radio_depend_on_private_information'
@@ -269,6 +354,7 @@ ERR_MSG_POPULATION_CANNOT_BE_NEGATIVE = ('The population must be a positive inte
 
 ERR_MSG_NO_EPSILON_AVAILABLE = 'No epsilon is available to create another AnalysisPlan for this dataset.'
 ERR_MSG_NOT_ENOUGH_EPSILON_AVAILABLE = 'Only {available_epsilon} epsilon is available to create another AnalysisPlan for this dataset. You had requested {requested_epsilon} epsilon.'
+ERR_MSG_NOT_ENOUGH_DELTA_AVAILABLE = 'Only {available_delta} delta is available for this AnalysisPlan. You had requested {requested_delta} delta.'
 
 ERR_MSG_PLAN_INFO_REQUIRED = 'AnalysisPlan info is required include name, epsilon, and expiration date.'
 ERR_MSG_PLAN_INFO_EPSILON_MISSING = '"epsilon" is required to create an AnalysisPlan and should be a positive float value.'
@@ -281,4 +367,28 @@ ERR_MSG_RELEASES_EXISTS = 'A Release has been created from this AnalysisPlan. Ch
 ERR_MSG_ANALYSIS_PLAN_EXPIRED = 'This AnalysisPlan has expired.'
 ERR_MSG_NO_FIELDS_TO_UPDATE = "There are no fields to update."
 
-ERR_MSG_VARIABLE_NOT_FOUND_IN_ANALYSIS_PLAN = 'Variable "{var_name}" was not found in the AnalysisPlan'
\ No newline at end of file
+ERR_MSG_VARIABLE_NOT_FOUND_IN_ANALYSIS_PLAN = 'Variable "{var_name}" was not found in the AnalysisPlan'
+ERR_MSG_VARIABLE_NAME_DUPLICATE = 'Variable names must be unique. Found more than once: "{var_name}"'
+ERR_MSG_VARIABLE_IN_USE = 'Variable "{var_name}" is used by {num_statistics} statistic(s)'
+ERR_MSG_STATISTIC_NOT_FOUND = 'No statistic with id {stat_id}'
+ERR_MSG_STAT_NOT_ALLOWED_FOR_VAR_TYPE = ('A "{stat_type}" is not available for "{var_type}" variables'
+                                         ' (variable: "{var_name}")')
+ERR_MSG_STAT_EPSILON_MISSING = 'An "epsilon" is required for the "{stat_type}" of "{var_name}"'
+ERR_MSG_MAX_CONTRIBUTIONS_REQUIRED = ('Individuals may appear in more than one row: "max_contributions"'
+                                      ' (the maximum rows per individual) is required.')
+ERR_MSG_MAX_CONTRIBUTIONS_NOT_POSITIVE = ('The maximum rows per individual must be an integer of 1 or more.'
+                                          ' Found: {max_contributions}')
+ERR_MSG_MAX_MEMORY_NOT_POSITIVE = ('The maximum memory for streaming must be greater than 0.'
+                                   ' Found: {max_memory_mb} MB')
+ERR_MSG_WORKERS_NOT_POSITIVE = 'The number of workers must be an integer of 1 or more. Found: {workers}'
+ERR_MSG_BINARY_PLAN_INVALID = 'Not a usable binary plan ({reason}). Validate the spec again.'
+ERR_MSG_SPEC_JSON_INVALID = 'Invalid JSON at character {position}: {message}'
+ERR_MSG_SPEC_ENTRY_INVALID = 'Invalid {location} (ending at character {position}): {error}'
+ERR_MSG_NO_EPSILON_TO_ALLOCATE = ('No epsilon is left for the {num_statistics} statistic(s) without one.'
+                                  ' Available: {available_epsilon}')
+ERR_MSG_SUM_EPSILON_NOT_POSITIVE = ('The {stat_type} of "{var_name}" has no epsilon left for its noisy sums'
+                                    ' once its count is paid for. Found: {epsilon}')
+ERR_MSG_WEIGHTS_INVALID = 'Expected {num_statistics} positive weights, one per statistic'
+ERR_MSG_INVALID_STAT_TYPE = 'Unknown statistic "{stat_type}". Choices: ' + VALID_DP_STATS_CHOICES_STR
+ERR_MSG_INVALID_MECHANISM = 'Unknown mechanism "{mechanism}". Choices: {mechanisms}'
+ERR_MSG_ACCURACY_BOUNDS_REQUIRED = 'Bounds (min, max) are required for the accuracy of a "{stat_type}"'
@@ -0,0 +1,508 @@
+"""
+Templates for the generated OpenDP scripts
+
+Templates use `$name` placeholders (as in string.Template). Each template is
+compiled once per process into a `str.format_map` string and cached, so
+rendering a fragment is a single C-level formatting call.
+
+A script has two stages, run by its "main" fragment on the whole file,
+chunk by chunk (streaming), or on byte ranges in worker processes (parallel):
+  - the scan, which reads each column once and adds its sufficient statistics
+    ("accumulators", see planner.py) to running totals. One fragment per
+    accumulator, named "acc_<accumulator>".
+  - the release, which adds noise to the totals. One fragment per statistic
+    type in `DP_STATS_CHOICES`, named "stat_<stat_type>", e.g. "stat_mean".
+"""
+from functools import lru_cache
+from string import Template
+
+import dpcreator_script_maker.static_vals as dstatic
+
+
+class CompiledTemplate:
+    """A template compiled into a format string"""
+    __slots__ = ('name', 'placeholders', '_format_string')
+
+    def __init__(self, name, text):
+        self.name = name
+        parts = []
+        placeholders = []
+        position = 0
+        for match in Template.pattern.finditer(text):
+            parts.append(text[position:match.start()].replace('{', '{{').replace('}', '}}'))
+            position = match.end()
+            if match.group('escaped') is not None:
+                parts.append('$')
+                continue
+            placeholder = match.group('named') or match.group('braced')
+            if placeholder is None:
+                raise ValueError(f'Invalid placeholder in template "{name}": {match.group()!r}')
+            placeholders.append(placeholder)
+            parts.append('{' + placeholder + '}')
+        parts.append(text[position:].replace('{', '{{').replace('}', '}}'))
+
+        self.placeholders = frozenset(placeholders)
+        self._format_string = ''.join(parts)
+
+    def render(self, values):
+        """Render using a mapping of placeholder -> value. Missing placeholders raise a KeyError."""
+        return self._format_string.format_map(values)
+
+
+@lru_cache(maxsize=None)
+def get_template(name):
+    """Return the compiled template, compiling it on first use"""
+    if name not in TEMPLATES:
+        raise KeyError(f'Unknown script template: "{name}"')
+    return CompiledTemplate(name, TEMPLATES[name])
+
+
+def get_stat_template(stat_type):
+    """Return the compiled fragment for a statistic type, e.g. "mean" """
+    return get_template(f'stat_{stat_type}')
+
+
+SCRIPT = '''\"\"\"
+Differentially private statistics for $plan_name (dataset: $dataset_name)
+
+Generated by dpcreator_script_maker $generator_version for OpenDP $opendp_version.
+Total epsilon used: $epsilon_used of $total_epsilon
+Passes over the data: $num_passes ($num_statistics statistics on $num_columns columns, fused into one scan)
+
+Usage:
+    $usage
+
+The results are printed as JSON.
+\"\"\"
+$imports
+dp.enable_features('contrib', 'floating-point')
+
+# Number of rows a single individual may contribute
+MAX_CONTRIBUTIONS = $max_contributions
+
+# Neighbouring datasets differ by $neighbours.
+# Every sensitivity below follows from it.
+
+# Columns used by the statistics
+COLUMNS = $columns
+
+# Columns to read as text, e.g. categories such as "CT" or "01"
+TEXT_COLUMNS = $text_columns
+$constants
+$reader
+
+def get_column(data, name, impute=None, number=False, integer=False):
+    \"\"\"
+    Return a column as a NumPy array, of floats for numbers, after handling its missing
+    values, all at once: dropped if "impute" is None, else replaced by "impute(number missing)"
+    if it is a function (random values), or else by "impute" itself (a fixed value)
+    \"\"\"
+    values = data[name].to_numpy(dtype=float) if number else data[name].to_numpy()
+    missing = pd.isna(values)
+    if missing.any():
+        if impute is None:
+            values = values[~missing]
+        else:
+            values = values.copy()
+            values[missing] = impute(int(missing.sum())) if callable(impute) else impute
+    if integer:
+        values = np.round(values)
+    return values
+
+
+def random_uniform(lower, upper, integer=False):
+    \"\"\"Impute uniform random values between the bounds, drawn in one batch\"\"\"
+    def draw(size):
+        rng = np.random.default_rng()
+        if integer:
+            return rng.integers(lower, upper, size, endpoint=True)
+        return rng.uniform(lower, upper, size)
+    return draw
+
+
+def random_choice(choices):
+    \"\"\"Impute values picked uniformly from the categories (or true/false values), in one batch\"\"\"
+    choices = np.asarray(choices, dtype=object)
+    return lambda size: np.random.default_rng().choice(choices, size)
+
+
+def add(totals, key, value):
+    \"\"\"Add to a running total (a number or a NumPy array)\"\"\"
+    totals[key] = totals[key] + value if key in totals else value
+
+
+def new_totals():
+    \"\"\"The totals of no rows: an empty dataset gets a noisy release like any other\"\"\"
+    return {
+$zero_totals    }
+
+
+def scan(data, totals):
+    \"\"\"Add the sufficient statistics of every statistic to "totals", in one pass over the data\"\"\"
+$scan
+$runtime
+def release(totals):
+    \"\"\"Add noise to the sufficient statistics and return the results\"\"\"
+    results = []
+$statistics
+    return results
+
+
+$main'''
+
+# --------------------------------------
+# Reading the data
+# --------------------------------------
+# A "main" fragment per run mode: the whole file at once, chunk by chunk
+# (streaming), or partitions scanned by worker processes (parallel). Each uses
+# the functions of a reader fragment for the file format, named
+# "read_<file_format>_<mode>". Readers only read the columns in COLUMNS.
+
+MAIN = '''
+def main(data_path):
+    totals = new_totals()
+    scan(read_all(data_path), totals)
+    print(json.dumps(release(totals), indent=4))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1])
+'''
+
+MAIN_STREAMING = '''
+# Peak memory for the data while scanning, in MB, on top of the libraries themselves.
+# Only the running totals are kept between chunks.
+MAX_MEMORY_MB = $max_memory_mb
+
+
+def main(data_path, max_memory_mb=MAX_MEMORY_MB):
+    totals = new_totals()
+    for chunk in read_chunks(data_path, max_memory_mb):
+        scan(chunk, totals)
+    print(json.dumps(release(totals), indent=4))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1], *[float(arg) for arg in sys.argv[2:3]])
+'''
+
+MAIN_PARALLEL = '''
+# Number of worker processes, each scanning a partition of the data
+WORKERS = $workers
+
+# Peak memory for the data while scanning, in MB, shared by the workers
+MAX_MEMORY_MB = $max_memory_mb
+
+
+def scan_partition(task):
+    \"\"\"Worker: return the totals of one partition. No noise is added here.\"\"\"
+    partition, max_memory_mb = task
+    totals = {}
+    for chunk in read_partition(partition, max_memory_mb):
+        scan(chunk, totals)
+    return totals
+
+
+def main(data_path, workers=WORKERS):
+    tasks = [(partition, MAX_MEMORY_MB / workers) for partition in partitions(data_path, workers)]
+
+    # Merge the workers' totals, then add noise once per statistic
+    totals = new_totals()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for partition_totals in executor.map(scan_partition, tasks):
+            for key, value in partition_totals.items():
+                add(totals, key, value)
+    print(json.dumps(release(totals), indent=4))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1], *[int(arg) for arg in sys.argv[2:3]])
+'''
+
+# Used by the streaming and parallel readers
+CHUNK_ROWS = '''
+# Estimated peak bytes per value of a chunk: parsing plus the scan's temporary arrays
+BYTES_PER_VALUE = 256
+
+
+def chunk_rows(max_memory_mb):
+    \"\"\"Number of rows per chunk to stay under the memory limit\"\"\"
+    return max(int(max_memory_mb * 1024 * 1024) // (BYTES_PER_VALUE * max(len(COLUMNS), 1)), 1)
+'''
+
+# CSV
+READ_CSV_ALL = '''
+def read_all(data_path):
+    \"\"\"Read the columns used by the statistics\"\"\"
+    return pd.read_csv(data_path, usecols=COLUMNS, dtype={name: str for name in TEXT_COLUMNS})
+'''
+
+READ_CSV_CHUNKS = '''
+def read_chunks(data_path, max_memory_mb):
+    \"\"\"Read the columns used by the statistics, a chunk of rows at a time\"\"\"
+    with pd.read_csv(data_path, usecols=COLUMNS, dtype={name: str for name in TEXT_COLUMNS},
+                     chunksize=chunk_rows(max_memory_mb)) as reader:
+        yield from reader
+'''
+
+READ_CSV_PARTITIONS = '''
+# Estimated peak bytes in memory per byte of CSV: parsing plus the scan's temporary arrays
+BYTES_PER_CSV_BYTE = 8
+
+
+def partitions(data_path, workers):
+    \"\"\"Split the rows after the header into byte ranges of (almost) equal size\"\"\"
+    names = list(pd.read_csv(data_path, nrows=0).columns)
+    with open(data_path, 'rb') as f:
+        f.readline()
+        header_end = f.tell()
+        size = f.seek(0, os.SEEK_END)
+    bounds = np.linspace(header_end, size, workers + 1).astype(np.int64).tolist()
+    return [(data_path, names, header_end, start, end) for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def read_partition(partition, max_memory_mb):
+    \"\"\"
+    Read the rows whose first byte is in [start, end), a block at a time.
+    Fields may not contain line breaks.
+    \"\"\"
+    data_path, names, header_end, start, end = partition
+    block_bytes = max(int(max_memory_mb * 1024 * 1024 / BYTES_PER_CSV_BYTE), 1)
+    with open(data_path, 'rb') as f:
+        if start > header_end:
+            f.seek(start - 1)
+            f.readline()  # the line in progress belongs to the previous range
+        else:
+            f.seek(start)
+        position = f.tell()
+        while position < end:
+            block = f.read(min(block_bytes, end - position))
+            if not block.endswith(b'\\n'):
+                block += f.readline()  # finish the last line
+            position = f.tell()
+            yield pd.read_csv(io.BytesIO(block), header=None, names=names, usecols=COLUMNS,
+                              dtype={name: str for name in TEXT_COLUMNS})
+'''
+
+# Parquet: only the needed column chunks are read from disk
+READ_PARQUET_ALL = '''
+def read_all(data_path):
+    \"\"\"Read the columns used by the statistics\"\"\"
+    return pq.read_table(data_path, columns=COLUMNS, memory_map=True).to_pandas()
+'''
+
+READ_PARQUET_CHUNKS = '''
+def read_chunks(data_path, max_memory_mb, row_groups=None):
+    \"\"\"Read the columns used by the statistics, a chunk of rows at a time\"\"\"
+    parquet_file = pq.ParquetFile(data_path, memory_map=True)
+    for batch in parquet_file.iter_batches(batch_size=chunk_rows(max_memory_mb),
+                                           row_groups=row_groups, columns=COLUMNS):
+        yield batch.to_pandas()
+'''
+
+READ_PARQUET_PARTITIONS = READ_PARQUET_CHUNKS + '''
+
+def partitions(data_path, workers):
+    \"\"\"Split the row groups between the workers\"\"\"
+    num_row_groups = pq.ParquetFile(data_path).num_row_groups
+    return [(data_path, row_groups.tolist())
+            for row_groups in np.array_split(np.arange(num_row_groups), workers) if len(row_groups)]
+
+
+def read_partition(partition, max_memory_mb):
+    \"\"\"Read a partition's row groups, a chunk of rows at a time\"\"\"
+    data_path, row_groups = partition
+    return read_chunks(data_path, max_memory_mb, row_groups)
+'''
+
+# Arrow IPC (Feather v2): memory-mapped, only the needed columns are converted
+READ_ARROW_ALL = '''
+def read_all(data_path):
+    \"\"\"Memory-map the file and convert the columns used by the statistics\"\"\"
+    with pa.memory_map(data_path) as source:
+        return pa.ipc.open_file(source).read_all().select(COLUMNS).to_pandas()
+'''
+
+READ_ARROW_CHUNKS = '''
+def read_chunks(data_path, max_memory_mb, batch_indices=None):
+    \"\"\"Memory-map the file and convert the columns used by the statistics, a chunk of rows at a time\"\"\"
+    rows = chunk_rows(max_memory_mb)
+    with pa.memory_map(data_path) as source:
+        reader = pa.ipc.open_file(source)
+        if batch_indices is None:
+            batch_indices = range(reader.num_record_batches)
+        for idx in batch_indices:
+            batch = reader.get_batch(idx).select(COLUMNS)
+            for offset in range(0, batch.num_rows, rows):
+                yield batch.slice(offset, rows).to_pandas()  # slices are zero-copy
+'''
+
+READ_ARROW_PARTITIONS = READ_ARROW_CHUNKS + '''
+
+def partitions(data_path, workers):
+    \"\"\"Split the record batches between the workers\"\"\"
+    with pa.memory_map(data_path) as source:
+        num_batches = pa.ipc.open_file(source).num_record_batches
+    return [(data_path, batch_indices.tolist())
+            for batch_indices in np.array_split(np.arange(num_batches), workers) if len(batch_indices)]
+
+
+def read_partition(partition, max_memory_mb):
+    \"\"\"Read a partition's record batches, a chunk of rows at a time\"\"\"
+    data_path, batch_indices = partition
+    return read_chunks(data_path, max_memory_mb, batch_indices)
+'''
+
+# --------------------------------------
+# The scan: one fragment per column, then one per accumulator
+# --------------------------------------
+# Placeholders:
+#   column_args - arguments for get_column(), e.g.
+#     "'Income', random_uniform(0, 500000, integer=True), number=True, integer=True"
+#   key - the accumulator's key in "totals", e.g. "('Income', 'sum')"
+
+SCAN_COLUMN = '''    # $title
+    values = get_column(data, $column_args)
+'''
+
+SCAN_CLAMP = '''    clamped = np.clip(values, $lower, $upper)
+'''
+
+ACC_ROWS = '''    add(totals, $key, len(values))
+'''
+
+# Rows of the dataset, before reading any column
+ACC_ROWS_ALL = '''    add(totals, $key, len(data))
+'''
+
+ACC_SUM = '''    add(totals, $key, clamped.sum())
+'''
+
+ACC_SUM_SQUARES = '''    add(totals, $key, np.square(clamped, dtype=float).sum())
+'''
+
+# Histogram bins, found for all the values at once (see histogram.py):
+#   categories - a hash lookup in a pd.Index of the categories. Other values get -1 and aren't counted.
+#   edges - a binary search of the sorted edges. The upper bound is in the last bin.
+#   offsets - integers only: the offset from the lower bound, scaled to the number of bins,
+#     in place so that 10^8 rows don't allocate a temporary array per operation
+ACC_HISTOGRAM_CATEGORIES = '''    bin_ids = $bin_index.get_indexer(values)
+    add(totals, $key, np.bincount(bin_ids[bin_ids >= 0], minlength=$num_bins))
+'''
+
+ACC_HISTOGRAM_EDGES = '''    bin_ids = np.minimum(np.searchsorted($bin_edges, clamped, side='right') - 1, $num_bins - 1)
+    add(totals, $key, np.bincount(bin_ids, minlength=$num_bins))
+'''
+
+ACC_HISTOGRAM_VALUES = '''    bin_ids = clamped.astype(np.int64)
+    bin_ids -= $lower
+    add(totals, $key, np.bincount(bin_ids, minlength=$num_bins))
+'''
+
+ACC_HISTOGRAM_RANGES = '''    bin_ids = clamped.astype(np.int64)
+    bin_ids -= $lower
+    bin_ids *= $num_bins
+    bin_ids //= $num_values
+    add(totals, $key, np.bincount(bin_ids, minlength=$num_bins))
+'''
+
+# Per candidate interval: counts by number of candidates <= the value, and < the value
+ACC_QUANTILE = '''    add(totals, $key, np.stack([
+        np.bincount(np.searchsorted($candidates, clamped, side='right'), minlength=len($candidates) + 1),
+        np.bincount(np.searchsorted($candidates, clamped, side='left'), minlength=len($candidates) + 1)]))
+'''
+
+# --------------------------------------
+# The release: one fragment per statistic type
+# --------------------------------------
+# Placeholders:
+#   title - comment line describing the statistic
+#   result - dict literal describing the statistic, the value is added to it
+#   epsilon - Python literal
+#   rows, sum, ... - keys of the statistic's accumulators in "totals"
+#   sum_sensitivity, ... - sensitivities per row, multiplied by MAX_CONTRIBUTIONS (see planner.py)
+
+STAT_COUNT = '''
+    # $title
+    results.append(dict($result, value=$count))
+'''
+
+# A count released once, before the statistics, and used by means and variances
+SHARED_COUNT = '''
+    # $title
+    $name = geometric(totals[$rows], MAX_CONTRIBUTIONS, $epsilon)
+'''
+
+STAT_HISTOGRAM = '''
+    # $title
+    noisy_counts = geometric_vector(totals[$histogram], $sensitivity, $epsilon)
+    results.append(dict($result, value=dict(zip($bin_labels, noisy_counts))))
+'''
+
+STAT_SUM = '''
+    # $title
+    results.append(dict($result, value=$mechanism(totals[$sum], MAX_CONTRIBUTIONS * $sum_sensitivity, $epsilon)))
+'''
+
+STAT_MEAN = '''
+    # $title
+    count = $count  # $count_source
+    total = $mechanism(totals[$sum], MAX_CONTRIBUTIONS * $sum_sensitivity, $sum_epsilon)
+    results.append(dict($result, value=float(np.clip(total / max(count, 1), $lower, $upper))))
+'''
+
+STAT_VARIANCE = '''
+    # $title
+    count = max($count, 2)  # $count_source
+    total = laplace(totals[$sum], MAX_CONTRIBUTIONS * $sum_sensitivity, $sum_epsilon)
+    total_squares = laplace(totals[$sum_squares], MAX_CONTRIBUTIONS * $sum_squares_sensitivity, $sum_epsilon)
+    variance = (total_squares - total ** 2 / count) / (count - 1)
+    results.append(dict($result, value=float(np.clip(variance, 0, $max_variance))))
+'''
+
+# Every quantile is answered from the same candidate counts, each with an equal part of the epsilon
+STAT_QUANTILE = '''
+    # $title
+    counts_right, counts_left = totals[$quantile]
+    below = np.cumsum(counts_right)[:-1]  # number of values below each candidate
+    above = counts_left.sum() - np.cumsum(counts_left)[:-1]  # number of values above each candidate
+    alphas = np.asarray($alphas)[:, None]
+    scores = -np.abs((1 - alphas) * below - alphas * above)  # one row per quantile
+    indices = noisy_argmax(scores, MAX_CONTRIBUTIONS, $quantile_epsilon)
+    results.append(dict($result, value=$value))
+'''
+
+TEMPLATES = {
+    'script': SCRIPT,
+    'main': MAIN,
+    'main_streaming': MAIN_STREAMING,
+    'main_parallel': MAIN_PARALLEL,
+    'chunk_rows': CHUNK_ROWS,
+    f'read_{dstatic.FILE_FORMAT_CSV}_all': READ_CSV_ALL,
+    f'read_{dstatic.FILE_FORMAT_CSV}_chunks': READ_CSV_CHUNKS,
+    f'read_{dstatic.FILE_FORMAT_CSV}_partitions': READ_CSV_PARTITIONS,
+    f'read_{dstatic.FILE_FORMAT_PARQUET}_all': READ_PARQUET_ALL,
+    f'read_{dstatic.FILE_FORMAT_PARQUET}_chunks': READ_PARQUET_CHUNKS,
+    f'read_{dstatic.FILE_FORMAT_PARQUET}_partitions': READ_PARQUET_PARTITIONS,
+    f'read_{dstatic.FILE_FORMAT_ARROW}_all': READ_ARROW_ALL,
+    f'read_{dstatic.FILE_FORMAT_ARROW}_chunks': READ_ARROW_CHUNKS,
+    f'read_{dstatic.FILE_FORMAT_ARROW}_partitions': READ_ARROW_PARTITIONS,
+    'scan_column': SCAN_COLUMN,
+    'scan_clamp': SCAN_CLAMP,
+    'acc_rows': ACC_ROWS,
+    'acc_rows_all': ACC_ROWS_ALL,
+    'acc_sum': ACC_SUM,
+    'acc_sum_squares': ACC_SUM_SQUARES,
+    'acc_histogram_categories': ACC_HISTOGRAM_CATEGORIES,
+    'acc_histogram_edges': ACC_HISTOGRAM_EDGES,
+    'acc_histogram_values': ACC_HISTOGRAM_VALUES,
+    'acc_histogram_ranges': ACC_HISTOGRAM_RANGES,
+    'acc_quantile': ACC_QUANTILE,
+    'shared_count': SHARED_COUNT,
+    f'stat_{dstatic.DP_COUNT}': STAT_COUNT,
+    f'stat_{dstatic.DP_HISTOGRAM}': STAT_HISTOGRAM,
+    f'stat_{dstatic.DP_MEAN}': STAT_MEAN,
+    f'stat_{dstatic.DP_QUANTILE}': STAT_QUANTILE,
+    f'stat_{dstatic.DP_SUM}': STAT_SUM,
+    f'stat_{dstatic.DP_VARIANCE}': STAT_VARIANCE,
+}
@@ -0,0 +1,68 @@
+"""
+Test spec with one statistic of each type, all referencing dataset variables
+"""
+script_spec = \
+{
+    "name": "Plan 4",
+    "differentially_private_library": {
+        "name": "OpenDP",
+        "url": "https://github.com/opendp/opendp",
+        "version": "0.9.2"
+    },
+    "dataset": {
+        "name": "Teacher Survey",
+        "description": None,
+        "variables": [
+            {
+                "name": "Income",
+                "var_type": "Integer",
+                "bounds": {
+                    "min": 0,
+                    "max": 500_000
+                }
+            },
+            {
+                "name": "TypingSpeed",
+                "var_type": "Float",
+                "bounds": {
+                    "min": 3.0,
+                    "max": 30.0
+                },
+                "impute_constant": 9.0
+            },
+            {
+                "name": "State",
+                "var_type": "Categorical",
+                "categories": ["CT", "ME", "MA", "NH", "RI", "VT"],
+            },
+            {
+                "name": "smoker",
+                "var_type": "Boolean",
+            },
+            {
+                "name": "previous_diagnosis",
+                "var_type": "Boolean",
+                "true_value": 1,
+                "false_value": 2
+            }
+        ]
+    },
+    "privacy_parameters": {
+        "total_epsilon": 1.0,
+        "total_delta": 1e-05,
+        "number_of_rows_public": True,
+        "individual_in_at_most_one_row": True,
+    },
+    "statistics": [
+        {"variable": "Income", "statistic": "histogram", "epsilon": 0.1},
+        {"variable": "Income", "statistic": "mean", "epsilon": 0.1},
+        {"variable": "Income", "statistic": "quantile", "epsilon": 0.1},
+        {"variable": "TypingSpeed", "statistic": "mean", "epsilon": 0.1},
+        {"variable": "TypingSpeed", "statistic": "sum", "epsilon": 0.1},
+        {"variable": "TypingSpeed", "statistic": "variance", "epsilon": 0.1},
+        {"variable": "State", "statistic": "count", "epsilon": 0.1},
+        {"variable": "State", "statistic": "histogram", "epsilon": 0.1},
+        {"variable": "smoker", "statistic": "histogram", "epsilon": 0.1},
+        {"variable": "previous_diagnosis", "statistic": "histogram", "epsilon": 0.1},
+    ]
+}
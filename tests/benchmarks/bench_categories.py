@@ -0,0 +1,66 @@
+"""
+Compare a category list + dict, and a set, with CategoryIndex: build time, lookup time and memory
+
+    python -m tests.benchmarks.bench_categories
+"""
+from dpcreator_script_maker.categories import CategoryIndex
+import random
+import time
+import tracemalloc
+
+CATEGORY_COUNTS = [100_000, 1_000_000]
+NUM_LOOKUPS = 100_000
+
+
+def measure(build, raw):
+    """Return (object, seconds, bytes retained) for building from the encoded categories"""
+    start = time.perf_counter()
+    obj = build(r.decode() for r in raw)
+    elapsed = time.perf_counter() - start
+
+    # Measure memory separately, as tracing slows down the build
+    del obj
+    tracemalloc.start()
+    obj = build(r.decode() for r in raw)
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, elapsed, size
+
+
+def list_and_dict(categories):
+    """The plain approach: the list itself plus a dict for lookups"""
+    copied = list(categories)
+    return copied, {value: position for position, value in enumerate(copied)}
+
+
+def list_and_set(categories):
+    """The list itself plus a set for membership checks"""
+    copied = list(categories)
+    return copied, set(copied)
+
+
+def main():
+    print(f'{"categories":>10} {"approach":>14} {"build (s)":>10} {"MB":>8} {"lookups/s":>12}')
+    for num_categories in CATEGORY_COUNTS:
+        # Build the strings from bytes so they aren't shared with the caller
+        raw = [f'category-{num:08d}'.encode() for num in range(num_categories)]
+        probes = [random.choice(raw).decode() for _ in range(NUM_LOOKUPS)]
+
+        for name, build in [('list + dict', list_and_dict), ('list + set', list_and_set)]:
+            (_cats, lookup), elapsed, size = measure(build, raw)
+            start = time.perf_counter()
+            for probe in probes:
+                probe in lookup
+            rate = NUM_LOOKUPS / (time.perf_counter() - start)
+            print(f'{num_categories:>10} {name:>14} {elapsed:>10.3f} {size / 1e6:>8.1f} {rate:>12,.0f}')
+
+        # Lookups are batched, as histograms do; the first one builds the lookup table
+        idx, elapsed, size = measure(CategoryIndex, raw)
+        start = time.perf_counter()
+        idx.positions(probes)
+        rate = NUM_LOOKUPS / (time.perf_counter() - start)
+        print(f'{num_categories:>10} {"CategoryIndex":>14} {elapsed:>10.3f} {size / 1e6:>8.1f} {rate:>12,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Compare the per-model and columnar validation of wide datasets
+
+    python -m tests.benchmarks.bench_columnar_validation
+"""
+from dpcreator_script_maker.columnar import validate_dataset_columnar
+from dpcreator_script_maker.models import Dataset
+import time
+
+VARIABLE_COUNTS = [1_000, 10_000, 100_000]
+
+
+def make_dataset(num_vars):
+    """Return dataset input with an even mix of variable types"""
+    templates = [
+        {"var_type": "Integer", "bounds": {"min": 0, "max": 500_000}},
+        {"var_type": "Float", "bounds": {"min": -1.5, "max": 30.0}},
+        {"var_type": "Categorical", "categories": ["CT", "ME", "MA", "NH", "RI", "VT"]},
+        {"var_type": "Boolean", "true_value": 1, "false_value": 2},
+    ]
+    variables = [dict(templates[idx % len(templates)], name=f'var_{idx}') for idx in range(num_vars)]
+    return {"name": "Wide dataset", "variables": variables}
+
+
+def time_it(func, data, repeat=3):
+    """Best of "repeat" runs, in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(data)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print(f'{"variables":>10} {"per-model (s)":>14} {"columnar (s)":>13} {"speedup":>8}')
+    for num_vars in VARIABLE_COUNTS:
+        data = make_dataset(num_vars)
+        per_model = time_it(lambda d: Dataset(**d), data)
+        columnar = time_it(validate_dataset_columnar, data)
+        print(f'{num_vars:>10} {per_model:>14.4f} {columnar:>13.4f} {per_model / columnar:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
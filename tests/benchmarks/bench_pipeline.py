@@ -0,0 +1,161 @@
+"""
+Time each stage from spec to script on synthetic specs, and write JSON results
+that can be compared between commits
+
+    python -m tests.benchmarks.bench_pipeline -o results.json
+    python -m tests.benchmarks.bench_pipeline --compare results.json   # after a change
+
+Each scale is "variables,statistics,categories", e.g. --scale 1000,5000,100.
+With --compare, the exit status is 1 if a stage is slower than the threshold.
+"""
+from dpcreator_script_maker import __version__
+from dpcreator_script_maker.dp_script_maker import DPCreatorScriptMaker
+from dpcreator_script_maker.models import AnalysisPlan, Dataset, PrivacyParameters, Statistic, resolve_statistic
+from tests.benchmarks.synthetic_specs import make_synthetic_spec
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import pydantic
+
+DEFAULT_SCALES = [(100, 100, 10), (1_000, 1_000, 100), (5_000, 5_000, 1_000)]
+# A stage this many times slower than the baseline is a regression
+DEFAULT_THRESHOLD = 1.25
+
+
+def get_stages(spec):
+    """
+    Return (stage name, number of items, function) for each stage. Each
+    function is self-contained, so that it can be timed on its own.
+    """
+    plan = AnalysisPlan(**spec)
+    statistics = list(plan.statistics)
+    variables = plan.variable_index
+    return [
+        ('dataset', len(spec['dataset']['variables']), lambda: Dataset(**spec['dataset'])),
+        ('privacy_parameters', 1, lambda: PrivacyParameters(**spec['privacy_parameters'])),
+        ('statistics', len(spec['statistics']), lambda: [Statistic(**stat) for stat in spec['statistics']]),
+        ('resolve_statistics', len(statistics),
+         lambda: [resolve_statistic(stat, variables) for stat in statistics]),
+        ('analysis_plan', len(spec['statistics']), lambda: AnalysisPlan(**spec)),
+        ('render_script', len(statistics), lambda: DPCreatorScriptMaker(plan).script),
+    ]
+
+
+def best_time(func, repeat):
+    """Best of "repeat" runs, in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(func):
+    """Peak bytes allocated while running func(). Measured separately, as tracing slows it down"""
+    tracemalloc.start()
+    try:
+        func()
+        _size, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def run_benchmarks(scales=DEFAULT_SCALES, repeat=3, seed=0):
+    """Return a result dict per (scale, stage)"""
+    results = []
+    for num_vars, num_stats, num_categories in scales:
+        spec = make_synthetic_spec(num_vars, num_stats, num_categories, seed=seed)
+        for stage, num_items, func in get_stages(spec):
+            seconds = best_time(func, repeat)
+            results.append({
+                'scale': f'{num_vars},{num_stats},{num_categories}',
+                'stage': stage,
+                'items': num_items,
+                'seconds': seconds,
+                'items_per_second': num_items / seconds if seconds else None,
+                'peak_mb': peak_memory(func) / 1e6,
+            })
+    return results
+
+
+def get_commit():
+    """The current git commit, if there is one"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_report(results, seed):
+    return {
+        'commit': get_commit(),
+        'package_version': __version__,
+        'python': platform.python_version(),
+        'pydantic': pydantic.VERSION,
+        'seed': seed,
+        'results': results,
+    }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Return (scale, stage, baseline seconds, seconds, ratio) for each stage
+    in both runs, and the ones over the threshold
+    """
+    before = {(result['scale'], result['stage']): result['seconds'] for result in baseline['results']}
+    rows = [(result['scale'], result['stage'], before[result['scale'], result['stage']], result['seconds'],
+             result['seconds'] / before[result['scale'], result['stage']])
+            for result in results if (result['scale'], result['stage']) in before]
+    return rows, [row for row in rows if row[-1] > threshold]
+
+
+def parse_scale(text):
+    num_vars, num_stats, num_categories = (int(num) for num in text.split(','))
+    return num_vars, num_stats, num_categories
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', type=parse_scale, action='append', dest='scales',
+                        help='variables,statistics,categories (may be repeated)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per stage; the best time is kept')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help='write the JSON results to this file')
+    parser.add_argument('--compare', help='JSON results of an earlier run')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'slowdown ratio counted as a regression (default: {DEFAULT_THRESHOLD})')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.scales or DEFAULT_SCALES, args.repeat, args.seed)
+    print(f'{"scale":>18} {"stage":>20} {"seconds":>10} {"items/s":>12} {"peak MB":>9}')
+    for result in results:
+        print(f'{result["scale"]:>18} {result["stage"]:>20} {result["seconds"]:>10.4f}'
+              f' {result["items_per_second"] or 0:>12,.0f} {result["peak_mb"]:>9.1f}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(make_report(results, args.seed), f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows, regressions = compare(results, baseline, args.threshold)
+        print(f'\nCompared with {args.compare} (commit {baseline.get("commit")}):')
+        for scale, stage, before, after, ratio in rows:
+            flag = '  REGRESSION' if ratio > args.threshold else ''
+            print(f'{scale:>18} {stage:>20} {before:>10.4f} -> {after:>10.4f} {ratio:>6.2f}x{flag}')
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""
+Time short CLI runs, from process start to exit, against a budget
+
+    python -m tests.benchmarks.bench_startup
+
+Each time is the best of a few runs, over that of an empty interpreter
+("python -c pass"), so the budgets hold on slower machines. The exit status
+is 1 if a command is over budget.
+"""
+from dpcreator_script_maker.test_specs.spec_02 import script_spec
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Seconds over an empty interpreter. "--version" imports neither pydantic nor NumPy
+BUDGETS = {
+    '--version': 0.1,
+    'validate': 0.75,
+}
+
+
+def time_command(args, repeat=5):
+    """Best wall time of "python args", in seconds"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')])))
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], env=env, check=True, stdout=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmarks(repeat=5):
+    """Return {command: seconds over an empty interpreter}"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        spec_path = os.path.join(tmpdir, 'spec.json')
+        with open(spec_path, 'w') as f:
+            json.dump(script_spec, f)
+        commands = {
+            '--version': ['--version'],
+            'validate': ['validate', spec_path],
+            'generate': ['generate', spec_path],
+        }
+        baseline = time_command(['-c', 'pass'], repeat)
+        return {name: time_command(['-m', 'dpcreator_script_maker', *args], repeat) - baseline
+                for name, args in commands.items()}
+
+
+def over_budget(results):
+    """The commands over their budgets"""
+    return [name for name, budget in BUDGETS.items() if results[name] > budget]
+
+
+def main():
+    results = run_benchmarks()
+    print(f'{"command":>10} {"seconds":>8} {"budget":>7}')
+    for name, seconds in results.items():
+        budget = BUDGETS.get(name)
+        print(f'{name:>10} {seconds:>8.3f} {budget if budget else "":>7}')
+    return 1 if over_budget(results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""
+Seeded synthetic specs: spec_01 scaled to any number of variables, statistics and categories
+
+    from tests.benchmarks.synthetic_specs import make_synthetic_spec
+
+    spec = make_synthetic_spec(num_vars=1_000, num_stats=5_000, num_categories=100, seed=0)
+"""
+from dpcreator_script_maker.test_specs.spec_01 import script_spec
+import dpcreator_script_maker.static_vals as dstatic
+import copy
+import random
+
+# spec_01's statistic on "TypingSpeed" has float bounds, but its dataset has no Float variable
+FLOAT_TEMPLATE = {"name": "TypingSpeed", "var_type": dstatic.VAR_TYPE_FLOAT, "bounds": {"min": 3.0, "max": 30.0}}
+
+
+def variable_templates():
+    """The variables of spec_01, plus a Float"""
+    return copy.deepcopy(script_spec['dataset']['variables']) + [dict(FLOAT_TEMPLATE)]
+
+
+def make_variable(template, idx, num_categories):
+    """A copy of a template variable, renamed, with "num_categories" categories if it is Categorical"""
+    variable = dict(template, name=f'{template["name"]}_{idx}')
+    if variable['var_type'] == dstatic.VAR_TYPE_CATEGORICAL:
+        variable['categories'] = [f'{category}_{num}' for num in range(num_categories)
+                                  for category in template['categories']][:num_categories]
+    return variable
+
+
+def make_synthetic_spec(num_vars, num_stats, num_categories=6, seed=0):
+    """
+    Return spec_01 with "num_vars" variables, "num_stats" statistics and
+    "num_categories" categories per Categorical variable. The same arguments
+    always give the same spec.
+
+    Variable types cycle through spec_01's (plus a Float), and each statistic
+    is a random type allowed for a random variable. The statistics share the
+    total epsilon, so the spec can be rendered.
+    """
+    rng = random.Random(seed)
+    templates = variable_templates()
+    variables = [make_variable(templates[idx % len(templates)], idx, num_categories) for idx in range(num_vars)]
+
+    stat_types = {var_type: [stat_type for stat_type, var_types in dstatic.ALLOWED_VARIABLE_TYPES.items()
+                             if var_type in var_types]
+                  for var_type in dstatic.ALLOWED_VAR_TYPES}
+    total_epsilon = script_spec['privacy_parameters']['total_epsilon']
+    # Leave some room for rounding in the sum
+    epsilon = total_epsilon / max(num_stats, 1) * (1 - 1e-9)
+    statistics = []
+    for _ in range(num_stats):
+        variable = rng.choice(variables)
+        statistics.append({"variable": variable['name'],
+                           "statistic": rng.choice(stat_types[variable['var_type']]),
+                           "epsilon": epsilon,
+                           "delta": None})
+
+    spec = copy.deepcopy(script_spec)
+    spec['name'] = f'Synthetic plan: {num_vars} variables, {num_stats} statistics, {num_categories} categories'
+    spec['dataset']['variables'] = variables
+    spec['statistics'] = statistics
+    return spec
@@ -0,0 +1,160 @@
+"""
+Wall-clock budgets, kept out of the unit tests so that a slow or busy machine
+doesn't fail them. Run on demand:
+
+    DPCREATOR_BENCHMARKS=1 python -m pytest tests/benchmarks
+
+Each time is the best of a few runs.
+"""
+from dpcreator_script_maker.categories import CategoryIndex
+from dpcreator_script_maker.dp_script_maker import DPCreatorScriptMaker
+from dpcreator_script_maker.epsilon_allocator import allocate_epsilon
+from dpcreator_script_maker.models import AnalysisPlan, Dataset
+from dpcreator_script_maker.plan_binary import dumps_plan, loads_plan
+from dpcreator_script_maker.plan_editor import PlanEditor
+from dpcreator_script_maker.simulator import simulate_plan
+from dpcreator_script_maker.test_specs.spec_02 import script_spec
+from tests.benchmarks import bench_startup
+from tests.benchmarks.synthetic_specs import make_synthetic_spec
+from tests.test_epsilon_allocator import make_spec
+from tests.test_histogram import histogram_spec, scan_totals
+from tests.test_plan_binary import make_wide_spec
+import copy
+import os
+import time
+import unittest
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:  # pragma: no cover
+    pd = None
+
+RUN_BENCHMARKS = bool(os.environ.get('DPCREATOR_BENCHMARKS'))
+
+
+def best_time(func, repeat=3):
+    """Best wall time of func(), in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@unittest.skipUnless(RUN_BENCHMARKS, 'set DPCREATOR_BENCHMARKS=1 to check the time budgets')
+class TestPlanBinaryBudget(unittest.TestCase):
+
+    def test_load_time(self):
+        """
+        Loading a wide plan is faster than validating its dataset: at least twice
+        as fast with 100 categories per categorical variable, 5 times with 1,000.
+        Loading time doesn't depend on the number of categories.
+        """
+        for num_categories, speedup in [(100, 2), (1_000, 5)]:
+            spec = make_wide_spec(2_000, num_categories)
+            data = dumps_plan(spec)
+            validate_time = best_time(lambda: Dataset(**spec['dataset']))
+            load_time = best_time(lambda: loads_plan(data))
+            self.assertLess(load_time * speedup, validate_time, num_categories)
+
+
+@unittest.skipUnless(RUN_BENCHMARKS, 'set DPCREATOR_BENCHMARKS=1 to check the time budgets')
+class TestCategoryIndexBudget(unittest.TestCase):
+
+    def test_build_time(self):
+        """200k categories are stored in about the time it takes to build a set of them"""
+        categories = [f'category-{num:08d}' for num in range(200_000)]
+        set_time = best_time(lambda: set(categories))
+        self.assertLess(best_time(lambda: CategoryIndex(categories)), set_time * 2)
+
+
+@unittest.skipUnless(RUN_BENCHMARKS, 'set DPCREATOR_BENCHMARKS=1 to check the time budgets')
+class TestStartupBudget(unittest.TestCase):
+
+    def test_budget(self):
+        """See bench_startup.BUDGETS"""
+        results = bench_startup.run_benchmarks(repeat=3)
+        self.assertEqual(bench_startup.over_budget(results), [], results)
+
+
+@unittest.skipUnless(RUN_BENCHMARKS, 'set DPCREATOR_BENCHMARKS=1 to check the time budgets')
+class TestRenderBudget(unittest.TestCase):
+
+    def test_render_latency(self):
+        """Hundreds of statistics render in milliseconds"""
+        spec = copy.deepcopy(script_spec)
+        spec['statistics'] = [dict(stat, epsilon=0.002) for stat in spec['statistics']] * 30
+        plan = AnalysisPlan(**spec)
+        DPCreatorScriptMaker(plan)  # warm up
+        self.assertLess(best_time(lambda: DPCreatorScriptMaker(plan)), 0.25)
+
+
+@unittest.skipUnless(RUN_BENCHMARKS, 'set DPCREATOR_BENCHMARKS=1 to check the time budgets')
+class TestResolveBudget(unittest.TestCase):
+
+    def test_large_plan(self):
+        """50k statistics on 2k variables resolve in linear time"""
+        spec = copy.deepcopy(script_spec)
+        spec['dataset']['variables'] = [dict(name=f'var_{idx}', var_type='Integer', bounds=dict(min=0, max=10))
+                                        for idx in range(2_000)]
+        spec['statistics'] = [dict(variable=f'var_{idx % 2_000}', statistic='mean', epsilon=0.00002)
+                              for idx in range(50_000)]
+        plan = AnalysisPlan(**spec)  # warm up
+        self.assertLess(best_time(plan.resolve_statistics), 0.25)
+
+
+@unittest.skipUnless(RUN_BENCHMARKS, 'set DPCREATOR_BENCHMARKS=1 to check the time budgets')
+class TestPlanEditorBudget(unittest.TestCase):
+
+    def test_edit_time(self):
+        """1,000 edits of a plan with 50k statistics take well under a second"""
+        spec = copy.deepcopy(script_spec)
+        spec['statistics'] = [dict(stat, epsilon=0.00001) for stat in spec['statistics']] * 5_000
+        editor = PlanEditor(spec)
+
+        def edit():
+            for stat_id in range(1_000):
+                editor.update_statistic(stat_id, epsilon=0.00002)
+
+        self.assertLess(best_time(edit), 0.5)
+
+
+@unittest.skipUnless(RUN_BENCHMARKS, 'set DPCREATOR_BENCHMARKS=1 to check the time budgets')
+class TestAllocatorBudget(unittest.TestCase):
+
+    def test_speed(self):
+        """5,000 statistics get their epsilons in under half a second"""
+        spec = make_spec(10)
+        spec['statistics'] *= 500
+        plan = AnalysisPlan(**spec)
+        self.assertLess(best_time(lambda: allocate_epsilon(plan)), 0.5)
+
+
+@unittest.skipUnless(RUN_BENCHMARKS, 'set DPCREATOR_BENCHMARKS=1 to check the time budgets')
+@unittest.skipIf(pd is None, 'numpy/pandas are needed to run generated scripts')
+class TestHistogramBudget(unittest.TestCase):
+
+    def test_throughput(self):
+        """10^8 rows of Income (0 - 500,000) bin in seconds: 2 x 10^7 rows in under a second"""
+        num_rows = 20_000_000
+        data = pd.DataFrame({'Income': np.random.default_rng(0).integers(0, 500_000, num_rows).astype(float)})
+        script = DPCreatorScriptMaker(histogram_spec({"variable": "Income"})).script
+        elapsed = best_time(lambda: scan_totals(script, data))
+        self.assertLess(elapsed * 100_000_000 / num_rows, 5.0)
+
+
+@unittest.skipUnless(RUN_BENCHMARKS, 'set DPCREATOR_BENCHMARKS=1 to check the time budgets')
+@unittest.skipIf(pd is None, 'numpy/pandas are needed to run generated scripts')
+class TestSimulatorBudget(unittest.TestCase):
+
+    def test_throughput(self):
+        """10,000 trials of a 500 statistic plan take seconds"""
+        plan = AnalysisPlan(**make_synthetic_spec(200, 500, 20))
+        self.assertLess(best_time(lambda: simulate_plan(plan, num_trials=10_000, num_rows=5_000, seed=0),
+                                  repeat=1), 10.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,15 +1,19 @@
 from dpcreator_script_maker.dp_script_maker import DPCreatorScriptMaker as ScriptMaker
 from dpcreator_script_maker.models import \
     (CUSTOM_ERROR_MESSAGES,
+     AnalysisPlan,
      ConfidenceLevel,
      Dataset,
      Delta,
      Epsilon,
      PrivacyParameters,
+     Variable,
      )
 from dpcreator_script_maker.test_specs.spec_01 import script_spec
+from dpcreator_script_maker.test_specs.spec_02 import script_spec as script_spec_02
 from pydantic import ValidationError as PydanticValidationError
 import dpcreator_script_maker.static_vals as dstatic
+import copy
 import os
 import sys
 import unittest
@@ -121,12 +125,75 @@ class TestValidation(unittest.TestCase):
 
         d = Dataset(**variables_input)
 
+    def test_float_variable(self):
+        """Float variables require bounds, which may be non-integers"""
+        v = Variable(name='TypingSpeed', var_type=dstatic.VAR_TYPE_FLOAT, bounds={'min': 3.0, 'max': 30.5})
+        self.assertEqual(v.bounds.max, 30.5)
+
+        with self.assertRaises(PydanticValidationError) as context:
+            Variable(name='TypingSpeed', var_type=dstatic.VAR_TYPE_FLOAT)
+        self.assertEqual(context.exception.errors()[0].get('msg'),
+                         'Value error, ' + dstatic.ERR_MSG_BOUNDS_REQUIRED.format(var_type='Float'))
+
     def test_sum(self):
         self.assertEqual(2, 2)
 
-    @unittest.skip('skipping')
     def test_init(self):
-        sm = ScriptMaker()
+        sm = ScriptMaker(script_spec_02)
+        self.assertEqual(sm.script, sm.run_it())
+
+
+class TestAnalysisPlan(unittest.TestCase):
+
+    def get_error(self, spec):
+        with self.assertRaises(PydanticValidationError) as context:
+            AnalysisPlan(**spec)
+        return context.exception.errors()[0].get('msg')
+
+    def test_variable_index(self):
+        plan = AnalysisPlan(**script_spec_02)
+        self.assertIs(plan.variable_index, plan.variable_index)
+        for stat in plan.statistics:
+            self.assertEqual(plan.get_variable(stat).name, stat.var_name)
+
+    def test_unknown_variable(self):
+        """spec_01 has statistics on "TypingSpeed", which isn't in the dataset"""
+        self.assertEqual(self.get_error(script_spec), 'Value error, ' +
+                         dstatic.ERR_MSG_VARIABLE_NOT_FOUND_IN_ANALYSIS_PLAN.format(var_name='TypingSpeed'))
+
+    def test_compatibility(self):
+        for stat_type in dstatic.DP_STATS_CHOICES:
+            for var_type in dstatic.ALLOWED_VAR_TYPES:
+                allowed = var_type in dstatic.ALLOWED_VARIABLE_TYPES[stat_type]
+                self.assertEqual((stat_type, var_type) in dstatic.STAT_VAR_TYPE_COMPATIBILITY, allowed)
+
+        spec = copy.deepcopy(script_spec_02)
+        spec['statistics'] = [{"variable": "State", "statistic": "mean", "epsilon": 0.1}]
+        self.assertEqual(self.get_error(spec), 'Value error, ' + dstatic.ERR_MSG_STAT_NOT_ALLOWED_FOR_VAR_TYPE.format(
+            stat_type='mean', var_type='Categorical', var_name='State'))
+
+    def test_duplicate_variable_names(self):
+        spec = copy.deepcopy(script_spec_02)
+        spec['dataset']['variables'].append(dict(spec['dataset']['variables'][2]))
+        self.assertEqual(self.get_error(spec), 'Value error, ' +
+                         dstatic.ERR_MSG_VARIABLE_NAME_DUPLICATE.format(var_name='State'))
+
+    def test_large_plan(self):
+        """50k statistics on 2k variables resolve against a single variable index"""
+        spec = copy.deepcopy(script_spec_02)
+        spec['dataset']['variables'] = [dict(name=f'var_{idx}', var_type='Integer', bounds=dict(min=0, max=10))
+                                        for idx in range(2_000)]
+        spec['statistics'] = [dict(variable=f'var_{idx % 2_000}', statistic='mean', epsilon=0.00002)
+                              for idx in range(50_000)]
+        plan = AnalysisPlan(**spec)
+
+        # One index of the variables, built once, resolves every statistic
+        index = plan.variable_index
+        self.assertIs(plan.resolve_statistics(), plan)
+        self.assertIs(plan.variable_index, index)
+        self.assertEqual(len(index), 2_000)
+        self.assertTrue(all(plan.get_variable(stat).name == f'var_{idx % 2_000}'
+                            for idx, stat in enumerate(plan.statistics)))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,87 @@
+from dpcreator_script_maker import accuracy
+from dpcreator_script_maker.accuracy import get_accuracy, get_accuracy_table
+from dpcreator_script_maker.models import Bounds
+import dpcreator_script_maker.static_vals as dstatic
+import numpy as np
+import opendp.prelude as dp
+import unittest
+
+
+class TestAccuracy(unittest.TestCase):
+
+    def setUp(self):
+        accuracy.cache_clear()
+
+    def test_matches_opendp(self):
+        for alpha in [0.32, 0.05, 0.001]:
+            self.assertAlmostEqual(get_accuracy('count', None, epsilon=0.5, confidence_level=1 - alpha),
+                                   dp.discrete_laplacian_scale_to_accuracy(2.0, alpha))
+            self.assertAlmostEqual(get_accuracy('sum', (-4, 2), epsilon=0.5, confidence_level=1 - alpha),
+                                   dp.laplacian_scale_to_accuracy(8.0, alpha))
+            self.assertAlmostEqual(get_accuracy('sum', (-4, 2), epsilon=0.5, confidence_level=1 - alpha,
+                                                mechanism=dstatic.NOISE_GEOMETRIC_MECHANISM),
+                                   dp.discrete_laplacian_scale_to_accuracy(8.0, alpha))
+            # A public number of rows: changing a row moves the sum by up to 2 - (-4), and two histogram bins
+            self.assertAlmostEqual(get_accuracy('sum', (-4, 2), epsilon=0.5, confidence_level=1 - alpha,
+                                                rows_public=True),
+                                   dp.laplacian_scale_to_accuracy(12.0, alpha))
+            self.assertAlmostEqual(get_accuracy('histogram', None, epsilon=0.5, confidence_level=1 - alpha,
+                                                rows_public=True),
+                                   dp.discrete_laplacian_scale_to_accuracy(4.0, alpha))
+
+    def test_every_statistic(self):
+        for stat_type in dstatic.DP_STATS_CHOICES:
+            for mechanism in accuracy.MECHANISMS:
+                values = [get_accuracy(stat_type, Bounds(min=0, max=100), epsilon, mechanism=mechanism,
+                                       confidence_level=confidence_level, num_rows=10_000)
+                          for epsilon in [0.1, 1.0] for confidence_level in [dstatic.CL_90, dstatic.CL_99]]
+                self.assertTrue(all(value > 0 for value in values), (stat_type, mechanism))
+                # More epsilon: more accurate. Higher confidence level: wider interval
+                self.assertGreater(values[0], values[2])
+                self.assertLess(values[0], values[1])
+
+    def test_batched(self):
+        epsilons = np.linspace(0.01, 2, 50)
+        curve = get_accuracy('mean', (0, 100), epsilon=epsilons, num_rows=5_000)
+        self.assertEqual(curve.shape, (50,))
+        self.assertAlmostEqual(curve[10], get_accuracy('mean', (0, 100), epsilon=epsilons[10], num_rows=5_000))
+
+        levels = np.asarray(dstatic.CONFIDENCE_LEVELS)
+        grid = get_accuracy('histogram', None, epsilon=epsilons[:, None], confidence_level=levels[None, :])
+        self.assertEqual(grid.shape, (50, len(levels)))
+        self.assertAlmostEqual(grid[3, 2], get_accuracy('histogram', None, epsilons[3], confidence_level=levels[2]))
+
+    def test_quantile_clamp(self):
+        """A quantile is never off by more than its range, unless unclamped"""
+        epsilons = np.asarray([0.001, 0.002, 1.0])
+        clamped = accuracy.stat_accuracy('quantile', 0, 10, epsilons, 0.05, dstatic.NOISE_LAPLACE_MECHANISM,
+                                         num_rows=1_000)
+        unclamped = accuracy.stat_accuracy('quantile', 0, 10, epsilons, 0.05, dstatic.NOISE_LAPLACE_MECHANISM,
+                                           num_rows=1_000, clamp=False)
+        self.assertEqual(clamped[:2].tolist(), [10, 10])
+        self.assertAlmostEqual(unclamped[0], 2 * unclamped[1])
+        self.assertAlmostEqual(clamped[2], unclamped[2])
+
+    def test_memoized(self):
+        for _ in range(3):
+            get_accuracy('variance', (0, 10), 0.25, confidence_level=dstatic.CL_95)
+        info = accuracy.cache_info()['accuracy']
+        self.assertEqual((info['hits'], info['misses'], info['maxsize']), (2, 1, accuracy.DEFAULT_CACHE_SIZE))
+
+        table = get_accuracy_table('quantile', (0, 10), 0.25)
+        self.assertEqual(list(table), dstatic.CONFIDENCE_LEVELS)
+        self.assertAlmostEqual(table[dstatic.CL_95], get_accuracy('quantile', (0, 10), 0.25))
+        get_accuracy_table('quantile', (0.0, 10.0), 0.25)
+        self.assertEqual(accuracy.cache_info()['accuracy_table']['hits'], 1)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            get_accuracy('median', (0, 1), 1.0)
+        with self.assertRaises(ValueError):
+            get_accuracy('count', None, 1.0, mechanism='Gaussian')
+        with self.assertRaises(ValueError):
+            get_accuracy_table('mean', None, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
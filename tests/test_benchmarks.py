@@ -0,0 +1,50 @@
+from dpcreator_script_maker.dp_script_maker import DPCreatorScriptMaker
+from dpcreator_script_maker.models import AnalysisPlan
+import dpcreator_script_maker.static_vals as dstatic
+from tests.benchmarks import bench_pipeline
+from tests.benchmarks.synthetic_specs import make_synthetic_spec
+import json
+import os
+import tempfile
+import unittest
+
+
+class TestSyntheticSpecs(unittest.TestCase):
+
+    def test_valid(self):
+        spec = make_synthetic_spec(50, 200, num_categories=25)
+        plan = AnalysisPlan(**spec)
+        self.assertEqual((len(plan.dataset.variables), len(plan.statistics)), (50, 200))
+        self.assertEqual({var.var_type for var in plan.dataset.variables}, set(dstatic.ALLOWED_VAR_TYPES))
+        self.assertTrue(all(len(var.categories) == 25 for var in plan.dataset.variables
+                            if var.var_type == dstatic.VAR_TYPE_CATEGORICAL))
+        DPCreatorScriptMaker(plan)  # within the total epsilon
+
+    def test_seeded(self):
+        self.assertEqual(make_synthetic_spec(20, 30, seed=1), make_synthetic_spec(20, 30, seed=1))
+        self.assertNotEqual(make_synthetic_spec(20, 30, seed=1), make_synthetic_spec(20, 30, seed=2))
+
+
+class TestBenchPipeline(unittest.TestCase):
+
+    def test_results(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'results.json')
+            self.assertEqual(bench_pipeline.main(['--scale', '10,20,5', '--repeat', '1', '-o', path]), 0)
+            with open(path) as f:
+                report = json.load(f)
+
+        stages = [result['stage'] for result in report['results']]
+        self.assertEqual(stages, ['dataset', 'privacy_parameters', 'statistics', 'resolve_statistics',
+                                  'analysis_plan', 'render_script'])
+        self.assertTrue(all(result['seconds'] > 0 and result['peak_mb'] >= 0 for result in report['results']))
+
+        # Twice as slow as itself is a regression
+        slower = [dict(result, seconds=result['seconds'] * 2) for result in report['results']]
+        rows, regressions = bench_pipeline.compare(slower, report)
+        self.assertEqual((len(rows), len(regressions)), (6, 6))
+        self.assertEqual(bench_pipeline.compare(report['results'], report)[1], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+from dpcreator_script_maker import bulk_validation
+from dpcreator_script_maker.bulk_validation import iter_validate_specs, main
+from dpcreator_script_maker.models import AnalysisPlan
+from dpcreator_script_maker.test_specs.spec_02 import script_spec
+from unittest import mock
+import copy
+import json
+import os
+import tempfile
+import unittest
+
+
+def get_spec_lines():
+    """Return JSONL lines: valid, invalid variable type, broken JSON, valid with a warning"""
+    bad_spec = copy.deepcopy(script_spec)
+    bad_spec['dataset']['variables'][0]['var_type'] = 'Date'
+
+    warning_spec = copy.deepcopy(script_spec)
+    warning_spec['privacy_parameters']['total_epsilon'] = 6.0
+
+    return [json.dumps(script_spec) + '\n',
+            json.dumps(bad_spec) + '\n',
+            '\n',
+            '{"name": "Plan 4", \n',
+            json.dumps(warning_spec) + '\n']
+
+
+class TestBulkValidation(unittest.TestCase):
+
+    def check_results(self, results):
+        self.assertEqual([r['line'] for r in results], [1, 2, 4, 5])
+        self.assertEqual([r['valid'] for r in results], [True, False, False, True])
+
+        self.assertEqual(results[0]['name'], script_spec['name'])
+        self.assertEqual(results[1]['errors'][0]['loc'], ('dataset', 'variables', 0, 'var_type'))
+        self.assertEqual(results[2]['errors'][0]['type'], 'json_invalid')
+        self.assertEqual(results[3]['warnings'], ["Epsilon shouldn't be greater than 5.0"])
+
+    def test_in_process(self):
+        results = list(iter_validate_specs(get_spec_lines(), workers=0))
+        self.check_results(results)
+
+    def test_error_outside_pydantic(self):
+        """A line failing with a ValueError or TypeError is reported, and the next lines are still validated"""
+        def validate_json(line):
+            if '"Plan 5"' in line:
+                raise TypeError("'<' not supported between instances of 'str' and 'float'")
+            if '"Plan 6"' in line:
+                raise ValueError('math domain error')
+            return AnalysisPlan.model_validate_json(line)
+
+        lines = [json.dumps(dict(script_spec, name=name)) + '\n' for name in ['Plan 5', 'Plan 6', 'Plan 7']]
+        with mock.patch.object(bulk_validation, '_validate_json', validate_json):
+            results = list(iter_validate_specs(lines, workers=0))
+
+        self.assertEqual([r['valid'] for r in results], [False, False, True])
+        self.assertEqual(results[0]['errors'],
+                         [dict(type='type_error', loc=(),
+                               msg="TypeError: '<' not supported between instances of 'str' and 'float'")])
+        self.assertEqual(results[1]['errors'][0]['type'], 'value_error')
+        self.assertEqual(results[2]['name'], 'Plan 7')
+        json.dumps(results)
+
+    def test_process_pool_keeps_order(self):
+        lines = get_spec_lines() * 20
+        results = list(iter_validate_specs(lines, workers=2, chunk_size=3, max_pending_chunks=2))
+        self.assertEqual(len(results), 80)
+        self.assertEqual([r['line'] for r in results], [n for n in range(1, 101) if n % 5 != 3])
+        self.check_results([dict(r, line=r['line'] % 5 or 5) for r in results[-4:]])
+
+    def test_main(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_file = os.path.join(tmpdir, 'specs.jsonl')
+            output_file = os.path.join(tmpdir, 'results.jsonl')
+            with open(input_file, 'w') as f:
+                f.writelines(get_spec_lines())
+
+            exit_code = main([input_file, '-o', output_file, '--workers', '0'])
+            self.assertEqual(exit_code, 1)
+
+            with open(output_file) as f:
+                results = [json.loads(line) for line in f]
+            self.assertEqual([r['valid'] for r in results], [True, False, False, True])
+
+
+if __name__ == '__main__':
+    unittest.main()
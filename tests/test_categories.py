@@ -0,0 +1,81 @@
+from dpcreator_script_maker.categories import CategoryIndex
+from dpcreator_script_maker.models import Variable
+from pydantic import ValidationError as PydanticValidationError
+import dpcreator_script_maker.static_vals as dstatic
+import pickle
+import tracemalloc
+import unittest
+
+
+class TestCategoryIndex(unittest.TestCase):
+
+    def test_lookups(self):
+        idx = CategoryIndex(["CT", "ME", "MA", 3, 2.5, "ME", 3.0, "3"])
+        self.assertEqual(len(idx), 6)
+        self.assertEqual(list(idx), ["CT", "ME", "MA", 3.0, 2.5, "3"])
+        self.assertEqual(idx.duplicates, ("ME", 3.0))
+
+        self.assertIn("MA", idx)
+        self.assertIn(3, idx)
+        self.assertNotIn("VT", idx)
+        self.assertNotIn(True, idx)
+        self.assertEqual(idx.position("3"), 5)
+        self.assertEqual(idx.position(2.5), 4)
+        self.assertEqual(idx[-1], "3")
+
+    def test_bin_indices(self):
+        idx = CategoryIndex(["CT", "ME", "MA"])
+        self.assertEqual(idx.bin_indices(["MA", "CT", "VT", "MA"]).tolist(), [2, 0, -1, 2])
+        self.assertEqual(idx.bin_indices(["MA", 1.0]).tolist(), [2, -1])
+        self.assertEqual(idx.bin_indices([]).tolist(), [])
+
+    def test_large(self):
+        categories = [f'category_{num}' for num in range(100_000)]
+        idx = CategoryIndex(categories + categories[:10])
+        self.assertEqual(len(idx), 100_000)
+        self.assertEqual(len(idx.duplicates), 10)
+        self.assertEqual(idx.position('category_99999'), 99_999)
+        self.assertEqual(list(pickle.loads(pickle.dumps(idx))), categories)
+
+    def test_bad_category(self):
+        with self.assertRaises(ValueError):
+            CategoryIndex(["a", None])
+
+
+class TestCategoricalVariable(unittest.TestCase):
+
+    def test_duplicates(self):
+        with self.assertRaises(PydanticValidationError) as context:
+            Variable(name='State', var_type='Categorical', categories=["CT", "ME", "CT"])
+        self.assertEqual(context.exception.errors()[0].get('msg'),
+                         'Value error, ' + dstatic.ERR_MSG_CATEGORIES_DUPLICATE.format(category='CT'))
+
+    def test_memory(self):
+        """A Variable keeps its categories only in the compact form: a fraction of the list's memory"""
+        def retained(build):
+            # Strings built from bytes, so they aren't shared with the caller
+            raw = [f'category-{num:08d}'.encode() for num in range(100_000)]
+            tracemalloc.start()
+            obj = build([r.decode() for r in raw])
+            size, _peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            return obj, size
+
+        categories, list_size = retained(list)
+        variable, variable_size = retained(lambda cats: Variable(name='Id', var_type='Categorical', categories=cats))
+        self.assertIsInstance(variable.categories, CategoryIndex)
+        self.assertLess(variable_size * 4, list_size)
+        self.assertEqual(list(variable.categories), categories)
+
+    def test_impute_constant(self):
+        v = Variable(name='State', var_type='Categorical', categories=["CT", "ME"], impute_constant="ME")
+        self.assertEqual(v.category_index.position(v.impute_constant), 1)
+
+        with self.assertRaises(PydanticValidationError) as context:
+            Variable(name='State', var_type='Categorical', categories=["CT", "ME"], impute_constant="VT")
+        self.assertEqual(context.exception.errors()[0].get('msg'),
+                         'Value error, ' + dstatic.ERR_MSG_IMPUTE_NOT_IN_CATEGORIES)
+
+
+if __name__ == '__main__':
+    unittest.main()
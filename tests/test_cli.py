@@ -0,0 +1,103 @@
+from dpcreator_script_maker import __version__, cli
+from dpcreator_script_maker.dp_script_maker import DPCreatorScriptMaker
+from dpcreator_script_maker.test_specs.spec_02 import script_spec
+from tests.benchmarks import bench_startup
+import contextlib
+import copy
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+
+def run_cli(*args):
+    """Return (exit status, stdout, stderr) of the CLI, run in this process"""
+    stdout, stderr = io.StringIO(), io.StringIO()
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            status = cli.main(list(args))
+        except SystemExit as err:
+            status = err.code
+    return status, stdout.getvalue(), stderr.getvalue()
+
+
+class TestCommands(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.spec_path = self.write_spec(script_spec)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_spec(self, spec, name='spec.json'):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w') as f:
+            json.dump(spec, f)
+        return path
+
+    def test_version(self):
+        self.assertEqual(run_cli('--version'), (0, f'{cli.PROG} {__version__}\n', ''))
+
+    def test_validate(self):
+        status, output, _ = run_cli('validate', self.spec_path)
+        self.assertEqual((status, output), (0, 'Valid: "Plan 4", 5 variables, 10 statistics\n'))
+
+        spec = copy.deepcopy(script_spec)
+        spec['statistics'][0]['variable'] = 'Unknown'
+        status, _, error = run_cli('validate', self.write_spec(spec, 'bad.json'))
+        self.assertEqual(status, 1)
+        self.assertIn('Unknown', error)
+
+        status, _, error = run_cli('validate', os.path.join(self.tmpdir.name, 'missing.json'))
+        self.assertEqual(status, 1)
+        self.assertIn('missing.json', error)
+
+    def test_generate(self):
+        output_path = os.path.join(self.tmpdir.name, 'dp_script.py')
+        self.assertEqual(run_cli('generate', self.spec_path, '-o', output_path, '--workers', '4')[0], 0)
+        with open(output_path) as f:
+            self.assertEqual(f.read(), DPCreatorScriptMaker(script_spec, workers=4).script)
+
+        status, output, _ = run_cli('generate', self.spec_path, '--inline-runtime')
+        self.assertEqual((status, output), (0, DPCreatorScriptMaker(script_spec, inline_runtime=True).script))
+
+        # Over budget
+        spec = copy.deepcopy(script_spec)
+        spec['statistics'][0]['epsilon'] = 0.5
+        status, _, error = run_cli('generate', self.write_spec(spec, 'over.json'))
+        self.assertEqual(status, 1)
+        self.assertIn('epsilon', error)
+
+    def test_bulk_validate(self):
+        specs_path = os.path.join(self.tmpdir.name, 'specs.jsonl')
+        with open(specs_path, 'w') as f:
+            f.write(json.dumps(script_spec) + '\n')
+        status, output, _ = run_cli('bulk-validate', specs_path, '--workers', '0')
+        self.assertEqual(status, 0)
+        self.assertTrue(json.loads(output)['valid'])
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_lazy_imports(self):
+        """--version imports neither pydantic nor NumPy, and validate doesn't import NumPy or OpenDP"""
+        code = ('import sys; from dpcreator_script_maker import cli\n'
+                'try:\n    cli.main(sys.argv[1:])\nexcept SystemExit:\n    pass\n'
+                'print(sorted({"pydantic", "numpy", "opendp"} & set(sys.modules)), file=sys.stderr)')
+        env = dict(os.environ, PYTHONPATH=bench_startup.REPO_DIR)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            spec_path = os.path.join(tmpdir, 'spec.json')
+            with open(spec_path, 'w') as f:
+                json.dump(script_spec, f)
+            for args, imported in [(['--version'], []), (['validate', spec_path], ['pydantic'])]:
+                error = subprocess.run([sys.executable, '-c', code, *args], env=env, capture_output=True,
+                                       text=True, check=True).stderr
+                self.assertEqual(error.strip().splitlines()[-1], str(imported))
+
+
+if __name__ == '__main__':
+    unittest.main()
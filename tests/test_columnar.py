@@ -0,0 +1,91 @@
+from dpcreator_script_maker.columnar import DatasetRows, VariableRow, validate_dataset_columnar
+from dpcreator_script_maker.models import Dataset, Variable
+from dpcreator_script_maker.test_specs.spec_01 import script_spec
+from pydantic import ValidationError as PydanticValidationError
+import copy
+import random
+import unittest
+
+
+# Variables covering every Variable/Bounds validation rule, valid and invalid
+VARIABLE_CASES = [
+    {"name": "int_ok", "var_type": "Integer", "bounds": {"min": 0, "max": 10}},
+    {"name": "int_no_bounds", "var_type": "Integer"},
+    {"name": "int_float_min", "var_type": "Integer", "bounds": {"min": 0.5, "max": 10}},
+    {"name": "int_float_max", "var_type": "Integer", "bounds": {"min": 0, "max": 10.5}},
+    {"name": "int_min_max", "var_type": "Integer", "bounds": {"min": 10, "max": 10}},
+    {"name": "float_ok", "var_type": "Float", "bounds": {"min": -1.5, "max": 2.5}},
+    {"name": "float_no_bounds", "var_type": "Float"},
+    {"name": "float_min_max", "var_type": "Float", "bounds": {"min": 3.0, "max": -3.0}},
+    {"name": "cat_ok", "var_type": "Categorical", "categories": ["a", "b", 3]},
+    {"name": "cat_empty", "var_type": "Categorical", "categories": []},
+    {"name": "cat_missing", "var_type": "Categorical"},
+    {"name": "cat_duplicates", "var_type": "Categorical", "categories": ["a", "b", "a", 1, 1.0]},
+    {"name": "cat_impute_ok", "var_type": "Categorical", "categories": ["a", "b"], "impute_constant": "b"},
+    {"name": "cat_impute_bad", "var_type": "Categorical", "categories": ["a", "b"], "impute_constant": "c"},
+    {"name": "int_random", "var_type": "Integer", "bounds": {"min": 0, "max": 1},
+     "missing_value_handling": "insert_random"},
+    {"name": "int_fixed_no_constant", "var_type": "Integer", "bounds": {"min": 0, "max": 1},
+     "missing_value_handling": "insert_fixed"},
+    {"name": "float_drop_constant", "var_type": "Float", "bounds": {"min": 0, "max": 1}, "impute_constant": 0.5,
+     "missing_value_handling": "drop"},
+    {"name": "cat_fixed_bad", "var_type": "Categorical", "categories": ["a"], "impute_constant": "c",
+     "missing_value_handling": "insert_fixed"},
+    {"name": "cat_bounds", "var_type": "Categorical", "categories": ["a"], "bounds": {"min": 0, "max": 1}},
+    {"name": "bool_ok", "var_type": "Boolean"},
+    {"name": "bool_values_ok", "var_type": "Boolean", "true_value": "y", "false_value": "n"},
+    {"name": "bool_one_value", "var_type": "Boolean", "true_value": 1},
+    {"name": "bool_equal", "var_type": "Boolean", "true_value": 1, "false_value": 1.0},
+    {"name": "bool_categories", "var_type": "Boolean", "categories": ["a"]},
+    {"name": "int_categories", "var_type": "Integer", "bounds": {"min": 0, "max": 1}, "categories": ["a"]},
+]
+
+
+def get_errors(func, data):
+    """Return the ValidationError errors, or None if the data is valid"""
+    try:
+        func(data)
+    except PydanticValidationError as err:
+        return err.errors(include_context=False)  # the context holds the ValueError instance
+    return None
+
+
+class TestColumnarValidation(unittest.TestCase):
+
+    def assertSameResult(self, data):
+        """The columnar path should accept/reject exactly like the per-model path"""
+        self.assertEqual(get_errors(validate_dataset_columnar, data),
+                         get_errors(lambda d: Dataset(**d), data))
+
+    def test_fields_match_models(self):
+        """The parsed rows must have the same fields as the Dataset and Variable models"""
+        self.assertEqual(set(VariableRow.__annotations__), set(Variable.model_fields))
+        self.assertEqual(set(DatasetRows.__annotations__), set(Dataset.model_fields))
+
+    def test_valid_spec(self):
+        rows = validate_dataset_columnar(script_spec['dataset'])
+        dataset = Dataset(**script_spec['dataset'])
+        self.assertEqual(len(rows['variables']), len(dataset.variables))
+        self.assertEqual(rows['variables'][0]['bounds'], {'min': 0.0, 'max': 500_000.0})
+
+    def test_each_case(self):
+        for case in VARIABLE_CASES:
+            with self.subTest(case['name']):
+                self.assertSameResult({"name": "d", "variables": [case]})
+
+    def test_mixed_cases(self):
+        random.seed(1)
+        for _ in range(20):
+            variables = random.choices(VARIABLE_CASES, k=50)
+            self.assertSameResult({"name": "d", "variables": copy.deepcopy(variables)})
+
+    def test_malformed_input(self):
+        """Field level errors fall back to the per-model path"""
+        for variables in [[], [{"name": "x", "var_type": "Date"}], ["not a dict"],
+                          [{"var_type": "Integer", "bounds": {"min": "a", "max": 1}}]]:
+            with self.subTest(variables=variables):
+                self.assertSameResult({"name": "d", "variables": variables})
+
+
+if __name__ == '__main__':
+    unittest.main()
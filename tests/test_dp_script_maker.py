@@ -0,0 +1,535 @@
+from dpcreator_script_maker.dp_script_maker import DPCreatorScriptMaker
+from dpcreator_script_maker.models import AnalysisPlan, Epsilon
+from dpcreator_script_maker.planner import ScanPlan
+from dpcreator_script_maker.templates import CompiledTemplate, get_stat_template, get_template
+from dpcreator_script_maker.test_specs.spec_01 import script_spec as spec_01
+from dpcreator_script_maker.test_specs.spec_02 import script_spec
+import dpcreator_script_maker.static_vals as dstatic
+import copy
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:  # pragma: no cover
+    pd = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc  # noqa: F401
+except ImportError:  # pragma: no cover
+    pa = None
+
+
+def write_test_data(path, num_rows=2_000, seed=0):
+    """Write a CSV matching spec_02, with some missing values"""
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame({
+        'Income': rng.integers(0, 200_000, num_rows).astype(float),
+        'TypingSpeed': rng.uniform(3, 30, num_rows),
+        'State': rng.choice(['CT', 'ME', 'MA', 'NH', 'RI', 'VT'], num_rows),
+        'smoker': rng.choice([True, False], num_rows),
+        'previous_diagnosis': rng.choice([1, 2], num_rows),
+    })
+    data.loc[::10, 'Income'] = np.nan
+    data.loc[::7, 'TypingSpeed'] = np.nan
+    data.to_csv(path, index=False)
+
+
+# Generated scripts import dpcreator_script_maker.runtime
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_script(script, data_path, *args, env=None):
+    """Run a generated script and return its JSON results"""
+    if env is None:
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')])))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        script_path = os.path.join(tmpdir, 'dp_script.py')
+        with open(script_path, 'w') as f:
+            f.write(script)
+        output = subprocess.run([sys.executable, script_path, data_path, *args],
+                                capture_output=True, text=True, check=True, env=env).stdout
+    return json.loads(output)
+
+
+def load_script(script):
+    """Return the functions and constants of a generated script, without running main()"""
+    namespace = {'__name__': 'dp_script'}
+    exec(compile(script, 'dp_script.py', 'exec'), namespace)
+    return namespace
+
+
+class TestTemplates(unittest.TestCase):
+
+    def test_compiled_template(self):
+        template = CompiledTemplate('test', 'x = {"a": $value}  # $$5 ${name}')
+        self.assertEqual(template.placeholders, {'value', 'name'})
+        self.assertEqual(template.render(dict(value=1, name='n')), 'x = {"a": 1}  # $5 n')
+        with self.assertRaises(KeyError):
+            template.render(dict(value=1))
+
+    def test_stat_templates(self):
+        """There is a fragment for every statistic type, compiled once"""
+        for stat_type in dstatic.DP_STATS_CHOICES:
+            self.assertIs(get_stat_template(stat_type), get_stat_template(stat_type))
+        self.assertIs(get_template('script'), get_template('script'))
+
+
+class TestScanPlan(unittest.TestCase):
+
+    def test_shared_accumulators(self):
+        """Statistics on the same variable share the column and its accumulators"""
+        plan = AnalysisPlan(**script_spec)
+        variables = {var.name: var for var in plan.dataset.variables}
+        scan_plan = ScanPlan()
+        keys = [scan_plan.add_statistic(stat, variables[stat.var_name]) for stat in plan.statistics]
+
+        self.assertEqual(scan_plan.num_passes, 1)
+        self.assertEqual(scan_plan.num_statistics, len(plan.statistics))
+        self.assertEqual(list(scan_plan.columns), [var.name for var in plan.dataset.variables])
+        # mean, sum and variance of "TypingSpeed" all use the same clamped sum
+        self.assertEqual(keys[3]['sum'], keys[4]['sum'])
+        self.assertEqual(keys[4]['sum'], keys[5]['sum'])
+        # "TypingSpeed" imputes missing values, so its rows are all the rows
+        self.assertEqual(keys[3]['rows'], ('*', 'rows'))
+        self.assertTrue(scan_plan.count_all_rows)
+        self.assertEqual(scan_plan.columns['TypingSpeed'].accumulators, ['sum', 'sum_squares'])
+        self.assertTrue(scan_plan.columns['TypingSpeed'].needs_clamping)
+        self.assertFalse(scan_plan.columns['State'].needs_clamping)
+
+    def plan_counts(self, statistics, rows_public=False, impute_constant=None):
+        spec = copy.deepcopy(script_spec)
+        spec['privacy_parameters']['number_of_rows_public'] = rows_public
+        spec['dataset']['variables'][0]['impute_constant'] = impute_constant
+        spec['statistics'] = statistics
+        plan = AnalysisPlan(**spec)
+        variables = {var.name: var for var in plan.dataset.variables}
+        scan_plan = ScanPlan()
+        for stat in plan.statistics:
+            scan_plan.add_statistic(stat, variables[stat.var_name])
+        scan_plan.plan_counts(rows_public)
+        return plan, scan_plan
+
+    def test_shared_count(self):
+        """Means and variances on the same rows share one auto-generated count"""
+        statistics = [{"variable": "Income", "statistic": stat_type, "epsilon": 0.06}
+                      for stat_type in ['mean', 'variance', 'mean', 'sum']]
+        plan, scan_plan = self.plan_counts(statistics)
+        self.assertEqual(len(scan_plan.counts), 1)
+        count = scan_plan.counts[('Income', 'rows')]
+        self.assertTrue(count.auto_generated)
+        self.assertEqual(len(count.users), 3)
+        # Each pays what it would have spent on its own count: 0.03, 0.02 and 0.03
+        self.assertAlmostEqual(count.epsilon, 0.03 + 0.02 + 0.03)
+
+        # Each statistic still spends exactly its own epsilon
+        spent = [count.contribution(stat) + count.sum_epsilon(stat) * {'mean': 1, 'variance': 2}[stat.stat_type]
+                 for stat in count.users]
+        for value in spent:
+            self.assertAlmostEqual(value, 0.06)
+        self.assertAlmostEqual(count.sum_epsilon(count.users[0]), 0.03)
+
+    def test_shared_count_unequal_epsilons(self):
+        """A statistic with a small epsilon pays a small part of the count"""
+        statistics = [{"variable": "Income", "statistic": "mean", "epsilon": 0.01},
+                      {"variable": "Income", "statistic": "variance", "epsilon": 0.9}]
+        plan, scan_plan = self.plan_counts(statistics)
+        count = scan_plan.counts[('Income', 'rows')]
+        mean, variance = plan.statistics
+        self.assertAlmostEqual(count.epsilon, 0.005 + 0.3)
+        self.assertAlmostEqual(count.sum_epsilon(mean), 0.005)
+        self.assertAlmostEqual(count.sum_epsilon(variance), 0.3)
+        self.assertAlmostEqual(count.epsilon + count.sum_epsilon(mean) + 2 * count.sum_epsilon(variance), 0.91)
+
+        script = DPCreatorScriptMaker(dict(script_spec, statistics=statistics)).script
+        self.assertIn("geometric(totals[('Income', 'sum')], MAX_CONTRIBUTIONS * 500000, 0.005)", script)
+        self.assertNotIn(', -0.', script)
+
+        # No epsilon left for the sums
+        empty = mean.model_copy(update=dict(epsilon=Epsilon.model_construct(value=0.0)))
+        with self.assertRaises(ValueError) as context:
+            count.sum_epsilon(empty)
+        self.assertEqual(str(context.exception), dstatic.ERR_MSG_SUM_EPSILON_NOT_POSITIVE.format(
+            stat_type='mean', var_name='Income', epsilon=0.0))
+
+    def test_requested_count_is_reused(self):
+        statistics = [{"variable": "Income", "statistic": "mean", "epsilon": 0.1},
+                      {"variable": "Income", "statistic": "count", "epsilon": 0.2}]
+        plan, scan_plan = self.plan_counts(statistics)
+        count = scan_plan.counts[('Income', 'rows')]
+        self.assertFalse(count.auto_generated)
+        self.assertIs(count.count_statistic, plan.statistics[1])
+        self.assertEqual(count.epsilon, 0.2)
+        self.assertEqual(count.sum_epsilon(plan.statistics[0]), 0.1)
+
+        script = DPCreatorScriptMaker(dict(script_spec, statistics=statistics)).script
+        self.assertEqual(script.count("geometric(totals[('Income', 'rows')]"), 1)
+        self.assertIn("'epsilon': 0.2}, value=count_0)", script)
+
+    def test_public_count(self):
+        """Imputed variables keep every row: with a public number of rows, the count is free"""
+        statistics = [{"variable": "Income", "statistic": "mean", "epsilon": 0.1},
+                      {"variable": "TypingSpeed", "statistic": "variance", "epsilon": 0.1}]
+        plan, scan_plan = self.plan_counts(statistics, rows_public=True, impute_constant=100)
+        self.assertEqual(list(scan_plan.counts), [('*', 'rows')])
+        count = scan_plan.counts[('*', 'rows')]
+        self.assertTrue(count.public)
+        self.assertEqual(count.sum_epsilon(plan.statistics[1]), 0.05)
+
+        # The same rows, but not public: one count for both
+        plan, scan_plan = self.plan_counts(statistics, rows_public=False, impute_constant=100)
+        self.assertEqual(len(scan_plan.counts[('*', 'rows')].users), 2)
+
+    def test_counts_in_script(self):
+        """Dozens of means release a single count"""
+        statistics = [{"variable": "Income", "statistic": "mean", "epsilon": 0.01}] * 50
+        script = DPCreatorScriptMaker(dict(script_spec, statistics=statistics)).script
+        self.assertEqual(script.count("geometric(totals[('Income', 'rows')]"), 1)
+        self.assertEqual(script.count('count = count_0'), 50)
+
+
+class TestScriptMaker(unittest.TestCase):
+
+    def test_render(self):
+        script = DPCreatorScriptMaker(script_spec).script
+        compile(script, 'dp_script.py', 'exec')
+        self.assertIn('Generated by dpcreator_script_maker', script)
+        self.assertEqual(script.count('results.append('), len(script_spec['statistics']))
+
+    def test_single_pass(self):
+        """Every column is read once, whatever the number of statistics on it"""
+        script = DPCreatorScriptMaker(script_spec).script
+        self.assertIn('Passes over the data: 1 (10 statistics on 5 columns', script)
+        for var in script_spec['dataset']['variables']:
+            self.assertEqual(script.count(f"get_column(data, {var['name']!r}"), 1)
+
+    def test_unknown_variable(self):
+        """spec_01 has a statistic on "TypingSpeed", which isn't in the dataset"""
+        with self.assertRaises(ValueError) as context:
+            DPCreatorScriptMaker(spec_01)
+        self.assertIn(dstatic.ERR_MSG_VARIABLE_NOT_FOUND_IN_ANALYSIS_PLAN.format(var_name='TypingSpeed'),
+                      str(context.exception))
+
+    def test_over_budget(self):
+        spec = copy.deepcopy(script_spec)
+        spec['statistics'][0]['epsilon'] = 0.5
+        with self.assertRaises(ValueError) as context:
+            DPCreatorScriptMaker(spec)
+        self.assertEqual(str(context.exception), dstatic.ERR_MSG_NOT_ENOUGH_EPSILON_AVAILABLE.format(
+            available_epsilon=1.0, requested_epsilon=math.fsum([0.5] + [0.1] * 9)))
+
+    def test_mean_of_categorical(self):
+        spec = copy.deepcopy(script_spec)
+        spec['statistics'] = [{"variable": "State", "statistic": "mean", "epsilon": 0.1}]
+        with self.assertRaises(ValueError):
+            DPCreatorScriptMaker(spec)
+
+    def test_max_contributions(self):
+        spec = copy.deepcopy(script_spec)
+        spec['privacy_parameters']['individual_in_at_most_one_row'] = False
+        with self.assertRaises(ValueError):
+            DPCreatorScriptMaker(spec)
+        self.assertIn('MAX_CONTRIBUTIONS = 3', DPCreatorScriptMaker(spec, max_contributions=3).script)
+        for max_contributions in [0, -2, 0.5, 3.0, True, '3']:
+            with self.assertRaises(ValueError) as context:
+                DPCreatorScriptMaker(spec, max_contributions=max_contributions)
+            self.assertEqual(str(context.exception), dstatic.ERR_MSG_MAX_CONTRIBUTIONS_NOT_POSITIVE.format(
+                max_contributions=max_contributions))
+
+    def test_sensitivities(self):
+        """Every sensitivity follows the script's neighbouring relation"""
+        spec = copy.deepcopy(script_spec)
+        spec['dataset']['variables'][1].update(bounds=dict(min=-50.0, max=50.0))
+        spec['statistics'] = [{"variable": "TypingSpeed", "statistic": stat_type, "epsilon": 0.1}
+                              for stat_type in ['sum', 'variance']]
+        spec['statistics'].append({"variable": "State", "statistic": "histogram", "epsilon": 0.1})
+
+        # The number of rows is public: changing a row
+        script = DPCreatorScriptMaker(spec).script
+        self.assertIn('differ by changing up to MAX_CONTRIBUTIONS rows', script)
+        self.assertIn("laplace(totals[('TypingSpeed', 'sum')], MAX_CONTRIBUTIONS * 100.0, 0.1)", script)
+        self.assertIn("laplace(totals[('TypingSpeed', 'sum_squares')], MAX_CONTRIBUTIONS * 2500.0, 0.05)", script)
+        self.assertIn("geometric_vector(totals[('State', 'histogram')], 2 * MAX_CONTRIBUTIONS, 0.1)", script)
+
+        # Adding or removing a row
+        spec['privacy_parameters']['number_of_rows_public'] = False
+        script = DPCreatorScriptMaker(spec).script
+        self.assertIn('differ by adding or removing up to MAX_CONTRIBUTIONS rows', script)
+        self.assertIn("laplace(totals[('TypingSpeed', 'sum')], MAX_CONTRIBUTIONS * 50.0, 0.1)", script)
+        self.assertIn("geometric_vector(totals[('State', 'histogram')], MAX_CONTRIBUTIONS, 0.1)", script)
+
+    def test_options(self):
+        self.assertIn('MAX_MEMORY_MB = 64', DPCreatorScriptMaker(script_spec, streaming=True, max_memory_mb=64).script)
+        self.assertIn('WORKERS = 3', DPCreatorScriptMaker(script_spec, workers=3).script)
+        with self.assertRaises(ValueError):
+            DPCreatorScriptMaker(script_spec, streaming=True, max_memory_mb=0)
+        for workers in [0, -1, 1.5, True]:
+            with self.assertRaises(ValueError):
+                DPCreatorScriptMaker(script_spec, workers=workers)
+
+    def test_imports(self):
+        """Scripts only import the readers they use"""
+        spec = copy.deepcopy(script_spec)
+        self.assertNotIn('pyarrow', DPCreatorScriptMaker(spec).script)
+        spec['dataset']['file_format'] = dstatic.FILE_FORMAT_PARQUET
+        self.assertIn('import pyarrow.parquet as pq\n', DPCreatorScriptMaker(spec).script)
+
+    def test_many_statistics(self):
+        """Repeated statistics each get a release, and share the accumulators of a single scan"""
+        spec = copy.deepcopy(script_spec)
+        spec['statistics'] = [dict(stat, epsilon=0.002) for stat in spec['statistics']] * 30
+        script = DPCreatorScriptMaker(AnalysisPlan(**spec)).script
+        single = DPCreatorScriptMaker(script_spec).script
+        compile(script, 'dp_script.py', 'exec')
+
+        def scan_function(text):
+            return text[text.index('def scan('):text.index('def release(')]
+
+        self.assertEqual(script.count('results.append('), 300)
+        self.assertEqual(scan_function(script), scan_function(single))
+
+    @unittest.skipIf(pd is None, 'numpy/pandas are needed to run generated scripts')
+    def test_run_script(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            data_path = os.path.join(tmpdir, 'data.csv')
+            write_test_data(data_path)
+            results = run_script(DPCreatorScriptMaker(script_spec).script, data_path)
+
+        self.assertEqual([(r['variable'], r['statistic']) for r in results],
+                         [(s['variable'], s['statistic']) for s in script_spec['statistics']])
+        by_stat = {(r['variable'], r['statistic']): r['value'] for r in results}
+        self.assertEqual(len(by_stat[('Income', 'histogram')]), dstatic.DEFAULT_HIST_NUMBER_OF_BINS)
+        self.assertEqual(list(by_stat[('State', 'histogram')]), ['CT', 'ME', 'MA', 'NH', 'RI', 'VT'])
+        self.assertTrue(0 <= by_stat[('Income', 'mean')] <= 500_000)
+        self.assertTrue(3.0 <= by_stat[('TypingSpeed', 'mean')] <= 30.0)
+
+
+@unittest.skipIf(pd is None, 'numpy/pandas are needed to run generated scripts')
+class TestReaders(unittest.TestCase):
+    """The same totals, whatever the file format and the way it is read"""
+    file_formats = [dstatic.FILE_FORMAT_CSV]
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        csv_path = os.path.join(cls.tmpdir.name, 'data.csv')
+        write_test_data(csv_path, num_rows=500)
+        data = pd.read_csv(csv_path, dtype={'State': str})
+        data['Unused'] = 'x'  # never read
+
+        cls.data_paths = {}
+        for file_format in cls.file_formats:
+            if file_format == dstatic.FILE_FORMAT_CSV:
+                cls.data_paths[file_format] = csv_path
+            else:
+                cls.data_paths[file_format] = os.path.join(cls.tmpdir.name, f'data.{file_format}')
+                cls.write(data, file_format, cls.data_paths[file_format])
+
+        # Expected totals
+        cls.totals = {}
+        load_script(DPCreatorScriptMaker(script_spec).script)['scan'](data, cls.totals)
+
+        # Files without rows
+        cls.empty_paths = {}
+        for file_format in cls.file_formats:
+            cls.empty_paths[file_format] = os.path.join(cls.tmpdir.name, f'empty.{file_format}')
+            cls.write(data.iloc[:0], file_format, cls.empty_paths[file_format])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    @staticmethod
+    def write(data, file_format, path):
+        """Write a DataFrame, in row groups or record batches of 64 rows"""
+        if file_format == dstatic.FILE_FORMAT_CSV:
+            data.to_csv(path, index=False)
+        elif file_format == dstatic.FILE_FORMAT_PARQUET:
+            data.to_parquet(path, row_group_size=64)
+        else:
+            table = pa.Table.from_pandas(data)
+            with pa.ipc.new_file(path, table.schema) as writer:
+                for batch in table.to_batches(max_chunksize=64):
+                    writer.write_batch(batch)
+
+    def load_script(self, file_format, **options):
+        spec = copy.deepcopy(script_spec)
+        spec['dataset']['file_format'] = file_format
+        return load_script(DPCreatorScriptMaker(spec, **options).script)
+
+    def assert_totals(self, totals, msg):
+        self.assertEqual(sorted(totals), sorted(self.totals), msg)
+        for key, value in self.totals.items():
+            np.testing.assert_allclose(totals[key], value, err_msg=f'{msg}: {key}')
+
+    def test_read_all(self):
+        for file_format, data_path in self.data_paths.items():
+            script = self.load_script(file_format)
+            data = script['read_all'](data_path)
+            self.assertEqual(list(data.columns), script['COLUMNS'])
+            totals = {}
+            script['scan'](data, totals)
+            self.assert_totals(totals, file_format)
+
+    def test_read_chunks(self):
+        """The running totals over many small chunks equal the totals of the whole file"""
+        for file_format, data_path in self.data_paths.items():
+            script = self.load_script(file_format, streaming=True)
+            totals = {}
+            num_chunks = 0
+            for chunk in script['read_chunks'](data_path, 0.05):
+                script['scan'](chunk, totals)
+                num_chunks += 1
+            self.assertGreater(num_chunks, 10, file_format)
+            self.assert_totals(totals, file_format)
+
+    def test_read_partitions(self):
+        """Every row is scanned exactly once, whatever the partition and chunk boundaries"""
+        for file_format, data_path in self.data_paths.items():
+            script = self.load_script(file_format, workers=2)
+            cases = [(1, 100), (3, 0.01), (500, 0.01)]
+            if file_format == dstatic.FILE_FORMAT_CSV:
+                cases.append((7, 1e-9))  # blocks of a single line
+            for workers, max_memory_mb in cases:
+                msg = f'{file_format}, {workers} workers, {max_memory_mb} MB'
+                totals = {}
+                for partition in script['partitions'](data_path, workers):
+                    partition_totals = script['scan_partition']((partition, max_memory_mb))
+                    for key, value in partition_totals.items():
+                        script['add'](totals, key, value)
+                self.assert_totals(totals, msg)
+
+    def test_run_script(self):
+        for file_format, data_path in self.data_paths.items():
+            for options, args in [(dict(streaming=True, max_memory_mb=64), ['0.1']),
+                                  (dict(workers=3), ['2'])]:
+                spec = copy.deepcopy(script_spec)
+                spec['dataset']['file_format'] = file_format
+                results = run_script(DPCreatorScriptMaker(spec, **options).script, data_path, *args)
+                self.assertEqual([(r['variable'], r['statistic']) for r in results],
+                                 [(s['variable'], s['statistic']) for s in script_spec['statistics']])
+
+    def test_no_rows(self):
+        """A file with a header and no rows gets a noisy release in every mode"""
+        for file_format, data_path in self.empty_paths.items():
+            for options in [{}, dict(streaming=True), dict(workers=2)]:
+                spec = copy.deepcopy(script_spec)
+                spec['dataset']['file_format'] = file_format
+                results = run_script(DPCreatorScriptMaker(spec, **options).script, data_path)
+                self.assertEqual(len(results), len(script_spec['statistics']), (file_format, options))
+
+
+@unittest.skipUnless(pd is not None and pa is not None, 'pyarrow is needed to read Parquet and Arrow files')
+class TestArrowReaders(TestReaders):
+    """The Parquet and Arrow IPC readers"""
+    file_formats = [dstatic.FILE_FORMAT_PARQUET, dstatic.FILE_FORMAT_ARROW]
+
+
+class TestQuantiles(unittest.TestCase):
+
+    def quantile_spec(self, **options):
+        spec = copy.deepcopy(script_spec)
+        spec['statistics'] = [dict({"variable": "Income", "statistic": "quantile", "epsilon": 0.9}, **options)]
+        return spec
+
+    def test_validation(self):
+        plan = AnalysisPlan(**self.quantile_spec(quantiles=[0.1, 0.5, 0.9]))
+        self.assertEqual(plan.statistics[0].quantile_alphas, [0.1, 0.5, 0.9])
+        self.assertEqual(AnalysisPlan(**self.quantile_spec()).statistics[0].quantile_alphas,
+                         [dstatic.DEFAULT_QUANTILE_ALPHA])
+        for quantiles in [[], [0.5, 0.5], [0.0], [1.5]]:
+            with self.assertRaises(ValueError):
+                AnalysisPlan(**self.quantile_spec(quantiles=quantiles))
+        with self.assertRaises(ValueError):
+            AnalysisPlan(**self.quantile_spec(statistic='mean', quantiles=[0.5]))
+
+    def test_script(self):
+        """Every quantile comes from one scan and one measurement, with an equal part of the epsilon"""
+        script = DPCreatorScriptMaker(self.quantile_spec(quantiles=[0.1, 0.25, 0.5, 0.75, 0.9])).script
+        self.assertEqual(script.count("add(totals, ('Income', 'quantile')"), 1)
+        self.assertEqual(script.count('= noisy_argmax('), 1)
+        self.assertIn('indices = noisy_argmax(scores, MAX_CONTRIBUTIONS, 0.18)', script)
+
+    @unittest.skipIf(pd is None, 'numpy/pandas are needed to run generated scripts')
+    def test_release(self):
+        data = pd.DataFrame({'Income': np.random.default_rng(0).integers(0, 200_000, 10_000).astype(float)})
+        script = load_script(DPCreatorScriptMaker(self.quantile_spec(quantiles=[0.1, 0.5, 0.9])).script)
+        totals = {}
+        script['scan'](data, totals)
+        value = script['release'](totals)[0]['value']
+        self.assertEqual(list(value), [0.1, 0.5, 0.9])
+        for alpha, quantile in value.items():
+            self.assertLess(abs(quantile - np.quantile(data['Income'], alpha)), 20_000, alpha)
+
+        # A single quantile is still a number
+        script = load_script(DPCreatorScriptMaker(self.quantile_spec()).script)
+        self.assertIsInstance(script['release'](totals)[0]['value'], float)
+
+
+class TestMissingValues(unittest.TestCase):
+
+    def make_plan(self, **handling):
+        """spec_02, with a histogram of every variable and {variable name: missing value handling}"""
+        spec = copy.deepcopy(script_spec)
+        for var in spec['dataset']['variables']:
+            if var['name'] in handling:
+                var.pop('impute_constant', None)
+                var.update(handling[var['name']])
+        spec['statistics'] = [{"variable": var['name'], "statistic": "histogram", "epsilon": 0.1}
+                              for var in spec['dataset']['variables']]
+        return AnalysisPlan(**spec)
+
+    def test_strategy(self):
+        plan = self.make_plan(State={"impute_constant": "MA"}, smoker={"missing_value_handling": "insert_random"})
+        strategies = {var.name: var.missing_value_strategy for var in plan.dataset.variables}
+        self.assertEqual(strategies, dict(Income='drop', TypingSpeed='insert_fixed', State='insert_fixed',
+                                          smoker='insert_random', previous_diagnosis='drop'))
+        self.assertEqual([var.keeps_all_rows for var in plan.dataset.variables], [False, True, True, True, False])
+
+        with self.assertRaises(ValueError):
+            self.make_plan(Income={"missing_value_handling": "insert_fixed"})
+        with self.assertRaises(ValueError):
+            self.make_plan(Income={"missing_value_handling": "insert_random", "impute_constant": 5})
+
+    @unittest.skipIf(pd is None, 'numpy/pandas are needed to run generated scripts')
+    def test_scan(self):
+        """Each column is cleaned once, with whole-column operations"""
+        plan = self.make_plan(Income={"missing_value_handling": "insert_random"},
+                              State={"missing_value_handling": "insert_random"},
+                              smoker={"impute_constant": False},
+                              previous_diagnosis={"missing_value_handling": "insert_random"})
+        data = pd.DataFrame({
+            'Income': [np.nan, 10.0, np.nan, 500_000.0] * 250,
+            'TypingSpeed': [np.nan, 5.0, 6.0, 7.0] * 250,
+            'State': ['CT', None, None, 'VT'] * 250,
+            'smoker': [True, None, True, None] * 250,
+            'previous_diagnosis': [1, 2, np.nan, np.nan] * 250,
+        })
+        script = load_script(DPCreatorScriptMaker(plan).script)
+        self.assertEqual(script['IMPUTE_CHOICES_2'], ['CT', 'ME', 'MA', 'NH', 'RI', 'VT'])
+        totals = {}
+        script['scan'](data, totals)
+
+        # Every row is kept, missing values spread over the bounds or categories
+        for name in ['Income', 'State', 'previous_diagnosis']:
+            self.assertEqual(totals[(name, 'histogram')].sum(), 1_000, name)
+        self.assertTrue(np.all(totals[('State', 'histogram')] > 0))
+        self.assertTrue(np.all(totals[('previous_diagnosis', 'histogram')] > 250))
+        self.assertEqual(totals[('smoker', 'histogram')].tolist(), [500, 500])
+        self.assertEqual(totals[('TypingSpeed', 'histogram')].tolist()[:3], [250, 500, 250])  # 9.0 is inserted
+
+        # Random integers are whole numbers within the bounds
+        values = script['get_column'](data, 'Income', script['random_uniform'](0, 500_000, integer=True))
+        self.assertTrue(np.all((values >= 0) & (values <= 500_000) & (values == np.round(values))))
+        self.assertEqual(len(script['get_column'](data, 'Income')), 500)
+
+
+if __name__ == '__main__':
+    unittest.main()
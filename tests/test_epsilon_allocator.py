@@ -0,0 +1,175 @@
+from dpcreator_script_maker.dp_script_maker import DPCreatorScriptMaker
+from dpcreator_script_maker import epsilon_allocator
+from dpcreator_script_maker.epsilon_allocator import _StatisticArrays, allocate_epsilon, get_errors
+from dpcreator_script_maker.models import AnalysisPlan
+from dpcreator_script_maker.planner import ScanPlan
+from dpcreator_script_maker.test_specs.spec_02 import script_spec
+from unittest import mock
+import dpcreator_script_maker.static_vals as dstatic
+import copy
+import math
+import numpy as np
+import opendp.prelude as dp
+import unittest
+
+
+def make_spec(num_missing):
+    """spec_02 without the epsilon of its first "num_missing" statistics"""
+    spec = copy.deepcopy(script_spec)
+    for stat in spec['statistics'][:num_missing]:
+        stat['epsilon'] = None
+    return spec
+
+
+class TestAllocateEpsilon(unittest.TestCase):
+
+    def test_allocation(self):
+        spec = make_spec(6)
+        allocation = allocate_epsilon(spec, expected_rows=10_000)
+        self.assertEqual(allocation.allocated.tolist(), [True] * 6 + [False] * 4)
+        self.assertEqual(allocation.epsilons[6:].tolist(), [0.1] * 4)
+        self.assertAlmostEqual(math.fsum(allocation.epsilons), 1.0)
+        self.assertTrue(np.all(allocation.epsilons > 0))
+
+        plan = allocation.to_plan()
+        self.assertEqual([stat.epsilon.value for stat in plan.statistics], allocation.epsilons.tolist())
+        DPCreatorScriptMaker(plan)
+
+        report = allocation.report()
+        self.assertEqual(len(report), 10)
+        self.assertEqual(report[6], dict(variable='State', statistic='count', epsilon=0.1, allocated=False,
+                                         confidence_level=dstatic.DEFAULT_CONFIDENCE_LEVEL,
+                                         accuracy=report[6]['accuracy'],
+                                         relative_error=report[6]['accuracy'] / 10_000))
+
+    def test_optimal(self):
+        """Moving epsilon between statistics can only increase the (approximate) total error"""
+        allocation = allocate_epsilon(make_spec(6), expected_rows=10_000)
+        arrays = _StatisticArrays(AnalysisPlan(**make_spec(6)), 1)
+
+        def total_error(epsilons):
+            _, relative = get_errors(arrays, epsilons, 0.05, 10_000, approximate=True)
+            return relative.sum()
+
+        best = total_error(allocation.epsilons)
+        for src, dst in [(0, 1), (1, 2), (3, 5), (5, 0)]:
+            epsilons = allocation.epsilons.copy()
+            epsilons[src] -= 0.01
+            epsilons[dst] += 0.01
+            self.assertGreater(total_error(epsilons), best)
+
+    def test_approximate_quantiles(self):
+        """Quantile errors stay proportional to 1 / epsilon in the approximate pass, even past their range"""
+        arrays = _StatisticArrays(AnalysisPlan(**make_spec(6)), 1)
+        quantile = list(arrays.stat_types).index(dstatic.DP_QUANTILE)
+        epsilons = np.full(10, 0.001)
+        _, relative = get_errors(arrays, epsilons, 0.05, 100, approximate=True)
+        _, halved = get_errors(arrays, epsilons / 2, 0.05, 100, approximate=True)
+        self.assertGreater(relative[quantile], 1)
+        self.assertAlmostEqual(halved[quantile], 2 * relative[quantile])
+        # The reported accuracies are clamped
+        _, relative = get_errors(arrays, epsilons, 0.05, 100)
+        self.assertEqual(relative[quantile], 1)
+
+    def test_weights(self):
+        spec = make_spec(6)
+        even = allocate_epsilon(spec)
+        weights = [1.0] * 10
+        weights[4] = 4.0
+        weighted = allocate_epsilon(spec, weights=weights)
+        self.assertGreater(weighted.epsilons[4], even.epsilons[4])
+        self.assertLess(weighted.relative_error[4], even.relative_error[4])
+
+        for bad_weights in [[1.0] * 9, [0.0] * 10]:
+            with self.assertRaises(ValueError):
+                allocate_epsilon(spec, weights=bad_weights)
+
+    def test_accuracy(self):
+        """Accuracies match OpenDP's"""
+        allocation = allocate_epsilon(make_spec(0))
+        alpha = 1 - dstatic.DEFAULT_CONFIDENCE_LEVEL
+        # count of "State": Geometric, sensitivity 1
+        self.assertAlmostEqual(allocation.accuracy[6], dp.discrete_laplacian_scale_to_accuracy(10.0, alpha))
+        # sum of "TypingSpeed", bounds 3 to 30, with a public number of rows: Laplace, sensitivity 30 - 3
+        self.assertAlmostEqual(allocation.accuracy[4], dp.laplacian_scale_to_accuracy(270.0, alpha))
+
+    def test_shared_count(self):
+        """A mean reuses the requested count of its rows, as in the script: its sum gets all of its epsilon"""
+        spec = copy.deepcopy(script_spec)
+        spec['statistics'] = [{"variable": "Income", "statistic": "count", "epsilon": 0.3},
+                              {"variable": "Income", "statistic": "mean", "epsilon": None}]
+        allocation = allocate_epsilon(spec, expected_rows=10_000)
+        self.assertAlmostEqual(allocation.epsilons[1], 0.7)
+        self.assertIn("geometric(totals[('Income', 'sum')], MAX_CONTRIBUTIONS * 500000, 0.7)",
+                      DPCreatorScriptMaker(allocation.to_plan()).script)
+        alpha = 1 - dstatic.DEFAULT_CONFIDENCE_LEVEL
+        self.assertAlmostEqual(allocation.accuracy[1],
+                               dp.discrete_laplacian_scale_to_accuracy(500_000 / 0.7, alpha) / 10_000)
+
+        # Without it, a count is generated and the mean pays for it
+        del spec['statistics'][0]
+        arrays = _StatisticArrays(AnalysisPlan(**spec), 1)
+        self.assertEqual(arrays.fraction.tolist(), [0.5])
+
+    def test_mixed_shared_counts(self):
+        """Allocated and given statistics sharing counts: every noisy sum gets a positive epsilon"""
+        spec = copy.deepcopy(script_spec)
+        spec['privacy_parameters']['number_of_rows_public'] = False
+        spec['statistics'] = [{"variable": "Income", "statistic": "mean", "epsilon": None},
+                              {"variable": "Income", "statistic": "variance", "epsilon": 0.95},
+                              {"variable": "TypingSpeed", "statistic": "variance", "epsilon": None},
+                              {"variable": "TypingSpeed", "statistic": "mean", "epsilon": 0.01},
+                              {"variable": "TypingSpeed", "statistic": "count", "epsilon": None}]
+        spec['privacy_parameters']['total_epsilon'] = 1.5
+        allocation = allocate_epsilon(spec, expected_rows=10_000)
+        self.assertTrue(np.all(allocation.accuracy > 0))
+        self.assertTrue(np.all(allocation.relative_error > 0))
+
+        # The allocator's parts of each epsilon are those of the script
+        plan = allocation.to_plan()
+        arrays = _StatisticArrays(plan, 1)
+        scan_plan = ScanPlan()
+        for stat in plan.statistics:
+            scan_plan.add_statistic(stat, plan.get_variable(stat))
+        scan_plan.plan_counts(plan.privacy_parameters.number_of_rows_public)
+        indices = {id(stat): idx for idx, stat in enumerate(plan.statistics)}
+        for count in scan_plan.counts.values():
+            for stat in count.users:
+                idx = indices[id(stat)]
+                self.assertGreater(count.sum_epsilon(stat), 0)
+                self.assertAlmostEqual(count.sum_epsilon(stat), stat.epsilon.value * arrays.fraction[idx])
+        self.assertNotIn(', -0.', DPCreatorScriptMaker(plan).script)
+
+    def test_errors(self):
+        spec = make_spec(1)
+        spec['statistics'][1]['epsilon'] = 0.2  # all of the budget is used
+        with self.assertRaises(ValueError) as context:
+            allocate_epsilon(spec)
+        self.assertEqual(str(context.exception), dstatic.ERR_MSG_NO_EPSILON_TO_ALLOCATE.format(
+            num_statistics=1, available_epsilon=1.0 - math.fsum([0.2] + [0.1] * 8)))
+
+        spec['statistics'][1]['epsilon'] = 0.5
+        with self.assertRaises(ValueError):
+            allocate_epsilon(spec)
+
+        spec = make_spec(1)
+        spec['privacy_parameters']['individual_in_at_most_one_row'] = False
+        with self.assertRaises(ValueError):
+            allocate_epsilon(spec)
+        self.assertTrue(allocate_epsilon(spec, max_contributions=3).allocated[0])
+
+    def test_many_statistics(self):
+        """Statistics are evaluated as arrays: one accuracy call per statistic type, whatever their number"""
+        spec = make_spec(10)
+        spec['statistics'] *= 500
+        plan = AnalysisPlan(**spec)
+        with mock.patch('dpcreator_script_maker.epsilon_allocator.stat_accuracy',
+                        wraps=epsilon_allocator.stat_accuracy) as accuracy:
+            allocation = allocate_epsilon(plan)
+        self.assertAlmostEqual(math.fsum(allocation.epsilons), 1.0)
+        # Approximate and exact errors, for each statistic type and integer or not
+        self.assertLessEqual(accuracy.call_count, 2 * 2 * len(dstatic.DP_STATS_CHOICES))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+from dpcreator_script_maker.dp_script_maker import DPCreatorScriptMaker
+from dpcreator_script_maker.histogram import BIN_BY_CATEGORY, BIN_BY_EDGES, BIN_BY_OFFSET, plan_histogram_bins
+from dpcreator_script_maker.models import AnalysisPlan, Variable
+from dpcreator_script_maker.planner import ScanPlan
+from dpcreator_script_maker.test_specs.spec_02 import script_spec
+import dpcreator_script_maker.static_vals as dstatic
+import copy
+import unittest
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:  # pragma: no cover
+    pd = None
+
+
+def make_variable(**info):
+    return Variable(**dict(dict(name='x', var_type='Integer', bounds=dict(min=0, max=500_000)), **info))
+
+
+def histogram_spec(*statistics):
+    """spec_02 with only the given histograms of "Income" (0 - 500,000) and "TypingSpeed" (3.0 - 30.0)"""
+    spec = copy.deepcopy(script_spec)
+    spec['statistics'] = [dict(stat, statistic='histogram', epsilon=0.1) for stat in statistics]
+    return spec
+
+
+def scan_totals(script, data):
+    """Run the scan of a generated script on a DataFrame"""
+    namespace = {'__name__': 'dp_script'}
+    exec(compile(script, 'dp_script.py', 'exec'), namespace)
+    totals = {}
+    namespace['scan'](data, totals)
+    return totals
+
+
+class TestHistogramBins(unittest.TestCase):
+
+    def test_integer_bins(self):
+        bins = plan_histogram_bins(make_variable())
+        self.assertEqual(bins.binning, BIN_BY_OFFSET)
+        self.assertEqual(bins.num_bins, dstatic.DEFAULT_HIST_NUMBER_OF_BINS)
+        self.assertEqual(bins.labels[:2], ['[0, 50000]', '[50001, 100000]'])
+        self.assertEqual(bins.labels[-1], '[450001, 500000]')
+
+        # 10 integers in 3 bins: (value - lower) * 3 // 10
+        bins = plan_histogram_bins(make_variable(bounds=dict(min=1, max=10)), num_bins=3)
+        self.assertEqual(bins.labels, ['[1, 4]', '[5, 7]', '[8, 10]'])
+
+        bins = plan_histogram_bins(make_variable(bounds=dict(min=-2, max=2)), dstatic.HIST_BIN_TYPE_ONE_PER_VALUE)
+        self.assertEqual(bins.labels, [-2, -1, 0, 1, 2])
+        self.assertEqual((bins.lower, bins.num_values), (-2, 5))
+
+    def test_edges(self):
+        bins = plan_histogram_bins(make_variable(var_type='Float', bounds=dict(min=0.0, max=10.0)), num_bins=4)
+        self.assertEqual(bins.binning, BIN_BY_EDGES)
+        self.assertEqual(bins.edges, [0.0, 2.5, 5.0, 7.5, 10.0])
+        self.assertEqual(bins.labels[-1], '[7.5, 10.0]')
+
+        # The bounds are added as the outer edges
+        bins = plan_histogram_bins(make_variable(), bin_edges=[1_000, 50_000])
+        self.assertEqual(bins.bin_type, dstatic.HIST_BIN_TYPE_BIN_EDGES)
+        self.assertEqual(bins.edges, [0, 1_000, 50_000, 500_000])
+
+        for bad_edges in [[], [5, 1], [1, 1], [-1, 10], [600_000]]:
+            with self.assertRaises(ValueError):
+                plan_histogram_bins(make_variable(), dstatic.HIST_BIN_TYPE_BIN_EDGES, bin_edges=bad_edges)
+
+    def test_categories(self):
+        bins = plan_histogram_bins(make_variable(var_type='Categorical', bounds=None, categories=['a', 'b']))
+        self.assertEqual((bins.binning, bins.labels), (BIN_BY_CATEGORY, ['a', 'b']))
+        bins = plan_histogram_bins(make_variable(var_type='Boolean', bounds=None))
+        self.assertEqual((bins.bin_type, bins.labels), (dstatic.HIST_BIN_TYPE_BOOLEAN, [True, False]))
+
+    def test_too_many_bins(self):
+        with self.assertRaises(ValueError):
+            plan_histogram_bins(make_variable(), dstatic.HIST_BIN_TYPE_ONE_PER_VALUE)
+        with self.assertRaises(ValueError):
+            plan_histogram_bins(make_variable(bounds=dict(min=0, max=5)), num_bins=7)
+        with self.assertRaises(ValueError):
+            plan_histogram_bins(make_variable(var_type='Float'), num_bins=dstatic.MAX_HIST_NUMBER_OF_BINS + 1)
+        self.assertEqual(plan_histogram_bins(make_variable(bounds=dict(min=0, max=5)), num_bins=6).num_bins, 6)
+
+    def test_bin_type_not_allowed(self):
+        with self.assertRaises(ValueError):
+            plan_histogram_bins(make_variable(var_type='Float'), dstatic.HIST_BIN_TYPE_ONE_PER_VALUE)
+        with self.assertRaises(ValueError):
+            plan_histogram_bins(make_variable(), dstatic.HIST_BIN_TYPE_BOOLEAN)
+
+    def test_spec_validation(self):
+        """Unusable bins are rejected when the plan is validated"""
+        with self.assertRaises(ValueError):
+            AnalysisPlan(**histogram_spec({"variable": "Income", "histogram_bin_type": "onePerValue"}))
+        with self.assertRaises(ValueError):
+            AnalysisPlan(**histogram_spec({"variable": "State", "histogram_bin_type": "equalRanges"}))
+        with self.assertRaises(ValueError):
+            AnalysisPlan(**histogram_spec({"variable": "Income", "histogram_bin_type": "ranges"}))
+
+    def test_shared_accumulators(self):
+        """Histograms with the same bins share an accumulator"""
+        plan = AnalysisPlan(**histogram_spec({"variable": "Income"},
+                                             {"variable": "Income", "histogram_number_of_bins": 10},
+                                             {"variable": "Income", "histogram_number_of_bins": 5}))
+        scan_plan = ScanPlan()
+        keys = [scan_plan.add_statistic(stat, plan.get_variable(stat))['histogram'] for stat in plan.statistics]
+        self.assertEqual(keys, [('Income', 'histogram'), ('Income', 'histogram'), ('Income', 'histogram_1')])
+        self.assertEqual(scan_plan.histograms[keys[2]].num_bins, 5)
+        self.assertTrue(scan_plan.columns['Income'].needs_clamping)
+
+
+@unittest.skipIf(pd is None, 'numpy/pandas are needed to run generated scripts')
+class TestHistogramScan(unittest.TestCase):
+    """The scan's bin counts match NumPy's"""
+
+    def test_bin_counts(self):
+        rng = np.random.default_rng(0)
+        num_rows = 5_000
+        data = pd.DataFrame({
+            'Income': rng.integers(-1_000, 510_000, num_rows).astype(float),
+            'TypingSpeed': rng.uniform(0, 40, num_rows),
+            'State': rng.choice(['CT', 'ME', 'MA', 'NY'], num_rows),
+        })
+        spec = histogram_spec({"variable": "Income"},
+                              {"variable": "Income", "histogram_number_of_bins": 7},
+                              {"variable": "Income", "histogram_bin_edges": [10_000, 123_456.5]},
+                              {"variable": "TypingSpeed", "histogram_number_of_bins": 4},
+                              {"variable": "State"})
+        totals = scan_totals(DPCreatorScriptMaker(spec).script, data)
+
+        income = np.clip(data['Income'].to_numpy(), 0, 500_000)
+        num_values = 500_001
+        for num_bins, key in [(10, 'histogram'), (7, 'histogram_1')]:
+            edges = [-(-idx * num_values // num_bins) for idx in range(num_bins)] + [num_values]
+            np.testing.assert_array_equal(totals[('Income', key)], np.histogram(income, edges)[0])
+        np.testing.assert_array_equal(totals[('Income', 'histogram_2')],
+                                      np.histogram(income, [0, 10_000, 123_456.5, 500_000])[0])
+        np.testing.assert_array_equal(totals[('TypingSpeed', 'histogram')],
+                                      np.histogram(np.clip(data['TypingSpeed'], 3, 30), 4, (3, 30))[0])
+        # "NY" isn't a category
+        self.assertEqual(totals[('State', 'histogram')].tolist(),
+                         [(data['State'] == state).sum() for state in ['CT', 'ME', 'MA', 'NH', 'RI', 'VT']])
+
+    def test_one_per_value(self):
+        spec = histogram_spec({"variable": "Age", "histogram_bin_type": "onePerValue"})
+        spec['dataset']['variables'].append({"name": "Age", "var_type": "Integer", "bounds": {"min": 18, "max": 99}})
+        ages = pd.DataFrame({'Age': np.random.default_rng(0).integers(0, 120, 1_000).astype(float)})
+        totals = scan_totals(DPCreatorScriptMaker(spec).script, ages)
+        np.testing.assert_array_equal(totals[('Age', 'histogram')],
+                                      np.bincount(np.clip(ages['Age'], 18, 99).astype(int) - 18, minlength=82))
+
+    def test_vectorized(self):
+        """Integer bins take a few vectorized operations, not per-row Python"""
+        num_rows = 100_000
+        incomes = np.random.default_rng(0).integers(0, 500_000, num_rows)
+        data = pd.DataFrame({'Income': incomes.astype(float)})
+        script = DPCreatorScriptMaker(histogram_spec({"variable": "Income"})).script
+        totals = scan_totals(script, data)
+        np.testing.assert_array_equal(totals[('Income', 'histogram')],
+                                      np.bincount(incomes * 10 // 500_001, minlength=10))
+
+        scan = script[script.index('def scan('):script.index('def release(')]
+        self.assertNotRegex(scan, r'\bfor\b|\.apply\(|\.map\(')
+
+
+if __name__ == '__main__':
+    unittest.main()
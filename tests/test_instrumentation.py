@@ -0,0 +1,102 @@
+from dpcreator_script_maker import instrumentation
+from dpcreator_script_maker.dp_script_maker import DPCreatorScriptMaker
+from dpcreator_script_maker.test_specs.spec_02 import script_spec
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+STAGES = ['validate', 'plan_scan', 'render_release', 'render_scan', 'render_script']
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_with_wrapped_validators(code):
+    """Run code in a new process, with the validators wrapped, and return what it prints as JSON"""
+    env = dict(os.environ, PYTHONPATH=REPO_DIR, **{instrumentation.VALIDATORS_ENV_VAR: '1'})
+    output = subprocess.run([sys.executable, '-c', textwrap.dedent(code)],
+                            capture_output=True, text=True, check=True, env=env, cwd=REPO_DIR).stdout
+    return json.loads(output)
+
+
+class TestStages(unittest.TestCase):
+
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.reset()
+
+    def test_disabled(self):
+        instrumentation.reset()
+        DPCreatorScriptMaker(script_spec)
+        self.assertFalse(instrumentation.is_enabled())
+        self.assertEqual(instrumentation.get_stats(), {})
+
+    def test_counts(self):
+        with instrumentation.instrumented():
+            script = DPCreatorScriptMaker(script_spec).script
+            DPCreatorScriptMaker(script_spec)
+        self.assertEqual(script, DPCreatorScriptMaker(script_spec).script)
+
+        stats = instrumentation.get_stats()
+        for name in STAGES:
+            self.assertEqual((stats[name]['kind'], stats[name]['calls']), (instrumentation.KIND_STAGE, 2))
+            self.assertIsNone(stats[name]['allocated_bytes'])
+            self.assertLessEqual(stats[name]['p99_seconds'], stats[name]['total_seconds'])
+
+    def test_allocations(self):
+        with instrumentation.instrumented(allocations=True):
+            DPCreatorScriptMaker(script_spec)
+        self.assertGreater(instrumentation.get_stats()['render_script']['allocated_bytes'], 0)
+
+    def test_dump_json(self):
+        with instrumentation.instrumented():
+            DPCreatorScriptMaker(script_spec)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'timings.json')
+            text = instrumentation.dump_json(path)
+            with open(path) as f:
+                self.assertEqual(json.load(f), json.loads(text))
+        self.assertEqual(json.loads(text), instrumentation.get_stats())
+
+
+class TestValidators(unittest.TestCase):
+
+    def test_counts(self):
+        stats = run_with_wrapped_validators('''
+            from dpcreator_script_maker import instrumentation
+            from dpcreator_script_maker.dp_script_maker import DPCreatorScriptMaker
+            from dpcreator_script_maker.test_specs.spec_02 import script_spec
+            with instrumentation.instrumented():
+                DPCreatorScriptMaker(script_spec)
+            print(instrumentation.dump_json())
+        ''')
+        num_vars = len(script_spec['dataset']['variables'])
+        for name in ['Variable.check_bound_types', 'Variable.check_categorical_constraints',
+                     'Variable.check_boolean_constraints']:
+            self.assertEqual((stats[name]['kind'], stats[name]['calls']), (instrumentation.KIND_VALIDATOR, num_vars))
+        self.assertEqual(stats['Statistic.check_quantiles']['calls'], len(script_spec['statistics']))
+        self.assertEqual(stats['AnalysisPlan.resolve_statistics']['calls'], 1)
+
+        # Validation time outside the validators is pydantic's own
+        validate = stats['validate']
+        validators = sum(stat['total_seconds'] for stat in stats.values()
+                         if stat['kind'] == instrumentation.KIND_VALIDATOR)
+        self.assertAlmostEqual(validate['self_seconds'], validate['total_seconds'] - validators)
+
+    def test_errors_counted(self):
+        stats = run_with_wrapped_validators('''
+            from dpcreator_script_maker import instrumentation
+            from dpcreator_script_maker.models import Variable
+            with instrumentation.instrumented():
+                try:
+                    Variable(name='x', var_type='Integer', bounds=dict(min=0.5, max=10))
+                except ValueError:
+                    print(instrumentation.dump_json())
+        ''')
+        self.assertEqual(stats['Variable.check_bound_types']['calls'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+from dpcreator_script_maker.dp_script_maker import DPCreatorScriptMaker
+from dpcreator_script_maker.models import AnalysisPlan
+from dpcreator_script_maker import plan_binary
+from dpcreator_script_maker.categories import CategoryIndex
+from dpcreator_script_maker.plan_binary import dumps_plan, load_plan, loads_plan, save_plan
+from dpcreator_script_maker.test_specs.spec_02 import script_spec
+from unittest import mock
+import copy
+import os
+import tempfile
+import unittest
+
+
+def make_wide_spec(num_vars, num_categories):
+    """spec_02 plus "num_vars" variables of every type"""
+    templates = [
+        {"var_type": "Integer", "bounds": {"min": 0, "max": 500_000}},
+        {"var_type": "Float", "bounds": {"min": -1.5, "max": 30.0}, "impute_constant": 1.0},
+        {"var_type": "Categorical", "categories": [f'cat_{idx}' for idx in range(num_categories)]},
+        {"var_type": "Boolean", "true_value": 1, "false_value": 2},
+    ]
+    spec = copy.deepcopy(script_spec)
+    spec['dataset']['variables'] += [dict(templates[idx % len(templates)], name=f'var_{idx}')
+                                     for idx in range(num_vars)]
+    return spec
+
+
+class TestPlanBinary(unittest.TestCase):
+
+    def setUp(self):
+        self.plan = AnalysisPlan(**script_spec)
+
+    def test_round_trip(self):
+        loaded = loads_plan(dumps_plan(self.plan))
+        self.assertEqual(loaded, self.plan)
+        self.assertEqual(loaded.model_dump(), self.plan.model_dump())
+        self.assertEqual(loaded.model_fields_set, self.plan.model_fields_set)
+        self.assertEqual(loaded.get_variable(loaded.statistics[0]).name, 'Income')
+        self.assertEqual(DPCreatorScriptMaker(loaded).script, DPCreatorScriptMaker(self.plan).script)
+
+        # A spec is validated first
+        self.assertEqual(loads_plan(dumps_plan(script_spec)), self.plan)
+
+        spec = make_wide_spec(100, 5)
+        self.assertEqual(loads_plan(dumps_plan(spec)).model_dump(), AnalysisPlan(**spec).model_dump())
+
+    def test_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'plan.bin')
+            save_plan(self.plan, path)
+            self.assertEqual(load_plan(path), self.plan)
+
+    def test_rejected(self):
+        """Anything unexpected raises a ValueError, so that the spec is validated again"""
+        data = dumps_plan(self.plan)
+        corrupted = bytearray(data)
+        corrupted[-5] ^= 1
+        header = plan_binary.HEADER.size
+        older = data[:4] + (plan_binary.SCHEMA_VERSION - 1).to_bytes(2, 'little') + data[6:]
+        other_fields = data[:8] + bytes(8) + data[16:]
+
+        for bad_data in [b'', data[:header], data[:-1], b'JSON' + data[4:], bytes(corrupted), older, other_fields]:
+            with self.assertRaises(ValueError):
+                loads_plan(bad_data)
+
+    def test_fields_stored(self):
+        """Fail if a model gains a field: update _plan_to_tuple()/_tuple_to_plan() and SCHEMA_VERSION"""
+        self.assertEqual(plan_binary.FIELDS_FINGERPRINT, plan_binary.get_fields_fingerprint())
+        stored = {model.__name__: list(model.model_fields) for model in plan_binary.STORED_MODELS}
+        self.assertEqual(stored['AnalysisPlan'], ['name', 'differentially_private_library', 'dataset',
+                                                  'privacy_parameters', 'statistics'])
+        self.assertEqual(stored['PrivacyParameters'], ['total_epsilon', 'total_delta', 'confidence_level',
+                                                       'number_of_rows_public', 'individual_in_at_most_one_row'])
+        self.assertEqual(stored['Statistic'], ['var_name', 'stat_type', 'epsilon', 'delta', 'histogram_bin_type',
+                                               'histogram_number_of_bins', 'histogram_bin_edges', 'quantiles'])
+        self.assertEqual(stored['DPLibrary'], ['name', 'url', 'version'])
+        self.assertEqual(stored['Bounds'], ['min', 'max'])
+
+    def test_no_validation(self):
+        """Loading skips validation, e.g. checking the categories of every categorical variable"""
+        spec = make_wide_spec(200, 100)
+        data = dumps_plan(spec)
+        with mock.patch.object(CategoryIndex, '__init__', side_effect=AssertionError('categories checked')):
+            plan = loads_plan(data)
+        variable = plan.dataset.variables[-2]
+        self.assertIsNone(variable.categories._table)
+        self.assertIn('cat_99', variable.category_index)  # lookup table built when first used
+        self.assertIsNotNone(variable.categories._table)
+        self.assertEqual(list(variable.categories), spec['dataset']['variables'][-2]['categories'])
+
+
+if __name__ == '__main__':
+    unittest.main()
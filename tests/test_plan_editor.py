@@ -0,0 +1,125 @@
+from dpcreator_script_maker.dp_script_maker import DPCreatorScriptMaker
+from dpcreator_script_maker.models import AnalysisPlan, Statistic
+from dpcreator_script_maker.plan_editor import BudgetLedger, PlanEditor
+from dpcreator_script_maker.test_specs.spec_02 import script_spec
+from unittest import mock
+import dpcreator_script_maker.static_vals as dstatic
+import copy
+import math
+import unittest
+
+
+class TestBudgetLedger(unittest.TestCase):
+
+    def test_compensated_sum(self):
+        ledger = BudgetLedger()
+        values = [0.1] * 10_000 + [1e-12] * 1_000
+        for value in values:
+            ledger.add(value)
+        self.assertEqual(ledger.total, math.fsum(values))
+
+        for value in values[:5_000]:
+            ledger.remove(value)
+        self.assertAlmostEqual(ledger.total, math.fsum(values[5_000:]), places=12)
+
+
+class TestPlanEditor(unittest.TestCase):
+
+    def setUp(self):
+        self.editor = PlanEditor(script_spec)
+
+    def test_initial_plan(self):
+        editor = self.editor
+        self.assertEqual(list(editor.statistics), list(range(len(script_spec['statistics']))))
+        self.assertAlmostEqual(editor.epsilon_used, 1.0)
+        self.assertEqual(editor.to_plan().model_dump(), AnalysisPlan(**script_spec).model_dump())
+
+    def test_over_budget(self):
+        """The initial spec is already validated against the budget"""
+        spec = copy.deepcopy(script_spec)
+        spec['statistics'][0]['epsilon'] = 0.5
+        with self.assertRaises(ValueError):
+            PlanEditor(spec)
+
+    def test_update_statistic(self):
+        editor = self.editor
+        with self.assertRaises(ValueError) as context:
+            editor.update_statistic(3, epsilon=0.2)
+        self.assertEqual(str(context.exception), dstatic.ERR_MSG_NOT_ENOUGH_EPSILON_AVAILABLE.format(
+            available_epsilon=editor.epsilon_available, requested_epsilon=0.1))
+        self.assertEqual(editor.statistics[3].epsilon.value, 0.1)  # unchanged
+
+        editor.update_statistic(3, epsilon=0.05)
+        editor.update_statistic(4, epsilon=0.15)
+        self.assertAlmostEqual(editor.epsilon_used, 1.0)
+        self.assertEqual(list(editor.statistics), list(range(10)))  # same order
+
+        # The new statistic is checked against the variable
+        with self.assertRaises(ValueError):
+            editor.update_statistic(3, var_name='State')  # a mean of a Categorical variable
+        with self.assertRaises(ValueError):
+            editor.update_statistic(99, epsilon=0.1)
+
+    def test_add_and_remove_statistics(self):
+        editor = self.editor
+        removed = editor.remove_statistic(0)
+        self.assertEqual(removed.stat_type, 'histogram')
+        self.assertAlmostEqual(editor.epsilon_available, 0.1)
+
+        stat_id = editor.add_statistic({"variable": "Income", "statistic": "sum", "epsilon": 0.1})
+        self.assertEqual(stat_id, 10)
+        self.assertEqual(list(editor.statistics)[-1], stat_id)
+        with self.assertRaises(ValueError):
+            editor.add_statistic({"variable": "Income", "statistic": "sum", "epsilon": 0.1})
+        with self.assertRaises(ValueError):
+            editor.add_statistic({"variable": "Missing", "statistic": "sum", "epsilon": 0.0})
+
+        DPCreatorScriptMaker(editor.to_plan())
+
+    def test_delta(self):
+        editor = self.editor
+        editor.update_statistic(0, delta=1e-5)  # all of total_delta
+        self.assertEqual(editor.delta_used, 1e-5)
+        with self.assertRaises(ValueError) as context:
+            editor.update_statistic(1, delta=1e-6)
+        self.assertEqual(str(context.exception), dstatic.ERR_MSG_NOT_ENOUGH_DELTA_AVAILABLE.format(
+            available_delta=0.0, requested_delta=1e-6))
+
+    def test_variables(self):
+        editor = self.editor
+        with self.assertRaises(ValueError) as context:
+            editor.remove_variable('Income')
+        self.assertEqual(str(context.exception),
+                         dstatic.ERR_MSG_VARIABLE_IN_USE.format(var_name='Income', num_statistics=3))
+
+        # Only the statistics on the variable are checked again
+        with self.assertRaises(ValueError):
+            editor.update_variable('Income', var_type='Categorical', bounds=None, categories=['a', 'b'])
+        editor.update_variable('Income', bounds={'min': 0, 'max': 100_000})
+        self.assertEqual(editor.variables['Income'].bounds.max, 100_000)
+
+        editor.add_variable({"name": "Age", "var_type": "Integer", "bounds": {"min": 0, "max": 120}})
+        with self.assertRaises(ValueError):
+            editor.add_variable({"name": "Age", "var_type": "Integer", "bounds": {"min": 0, "max": 120}})
+        editor.update_variable('Age', name='AgeYears')
+        self.assertEqual(list(editor.variables)[-1], 'AgeYears')
+        editor.remove_variable('AgeYears')
+        self.assertEqual(list(editor.variables), [var['name'] for var in script_spec['dataset']['variables']])
+
+    def test_edit_size(self):
+        """Edits don't depend on the size of the plan: only the edited statistic is validated"""
+        spec = copy.deepcopy(script_spec)
+        spec['statistics'] = [dict(stat, epsilon=0.00001) for stat in spec['statistics']] * 5_000
+        editor = PlanEditor(spec)
+
+        with mock.patch.object(Statistic, 'model_validate', wraps=Statistic.model_validate) as validate_stat, \
+                mock.patch.object(AnalysisPlan, 'model_validate') as validate_plan:
+            for stat_id in range(1_000):
+                editor.update_statistic(stat_id, epsilon=0.00002)
+        self.assertEqual(validate_stat.call_count, 1_000)
+        validate_plan.assert_not_called()
+        self.assertAlmostEqual(editor.epsilon_used, 0.51)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+from dpcreator_script_maker.dp_script_maker import DPCreatorScriptMaker, get_runtime_source
+from dpcreator_script_maker.test_specs.spec_02 import script_spec
+import dpcreator_script_maker.static_vals as dstatic
+import copy
+import os
+import tempfile
+import unittest
+
+from tests.test_dp_script_maker import run_script, write_test_data
+
+try:
+    import numpy as np
+    import pandas as pd
+    from dpcreator_script_maker import runtime
+except ImportError:  # pragma: no cover
+    pd = None
+
+
+class TestRuntimeSource(unittest.TestCase):
+
+    def test_import(self):
+        script = DPCreatorScriptMaker(script_spec).script
+        self.assertIn(f'from {dstatic.RUNTIME_MODULE} import geometric, geometric_vector, laplace, noisy_argmax',
+                      script)
+        self.assertNotIn(dstatic.RUNTIME_START, script)
+        self.assertNotIn('binary_search_chain', script)
+
+    def test_inline(self):
+        script = DPCreatorScriptMaker(script_spec, inline_runtime=True).script
+        compile(script, 'dp_script.py', 'exec')
+        self.assertNotIn(dstatic.RUNTIME_MODULE, script)
+        self.assertIn(get_runtime_source(), script)
+        for func in dstatic.RUNTIME_FUNCTIONS:
+            self.assertEqual(script.count(f'def {func}('), 1)
+
+
+@unittest.skipIf(pd is None, 'numpy/pandas/OpenDP are needed to run the runtime')
+class TestRuntime(unittest.TestCase):
+
+    def test_measurements_shared(self):
+        """Releases with the same parameters build one measurement"""
+        runtime.geometric_measurement.cache_clear()
+        for value in range(20):
+            runtime.geometric(value, 1, 0.1)
+            runtime.geometric(float(value), 1.0, 0.1)
+        runtime.geometric(0, 1, 0.2)
+        info = runtime.measurement_cache_info()['geometric_measurement']
+        self.assertEqual((info['misses'], info['hits']), (2, 39))
+
+    def test_noisy_argmax(self):
+        scores = np.array([[0.0, 0.0, 1e6], [1e6, 0.0, 0.0]])
+        self.assertEqual(runtime.noisy_argmax(scores, 1, 1.0), [2, 0])
+        self.assertEqual(runtime.noisy_argmax(scores[0], 1, 1.0), [2])
+
+    def test_run_inline_script(self):
+        """An inline runtime script runs without dpcreator_script_maker on the path"""
+        spec = copy.deepcopy(script_spec)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            data_path = os.path.join(tmpdir, 'data.csv')
+            write_test_data(data_path)
+            env = {key: value for key, value in os.environ.items() if key != 'PYTHONPATH'}
+            results = run_script(DPCreatorScriptMaker(spec, inline_runtime=True).script, data_path, env=env)
+        self.assertEqual(len(results), len(spec['statistics']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+from dpcreator_script_maker.dp_script_maker import DPCreatorScriptMaker
+from dpcreator_script_maker.models import AnalysisPlan
+from dpcreator_script_maker.script_cache import ScriptCache
+from dpcreator_script_maker.test_specs.spec_02 import script_spec
+from unittest import mock
+import copy
+import os
+import tempfile
+import unittest
+
+
+def reordered(spec):
+    """Same spec, with the keys in another order and the model field names"""
+    spec = dict(reversed(list(copy.deepcopy(spec).items())))
+    spec['statistics'] = [dict(var_name=stat['variable'], stat_type=stat['statistic'], epsilon=stat['epsilon'])
+                          for stat in spec['statistics']]
+    return spec
+
+
+class TestScriptCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_dir = self.tmpdir.name
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_hit_and_miss(self):
+        cache = ScriptCache(self.cache_dir)
+        script = cache.get_script(script_spec)
+        self.assertEqual(script, DPCreatorScriptMaker(script_spec).script)
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+        # A hit neither validates nor renders
+        with mock.patch.object(AnalysisPlan, 'model_validate') as validate, \
+                mock.patch('dpcreator_script_maker.dp_script_maker.DPCreatorScriptMaker') as maker:
+            self.assertEqual(cache.get_script(script_spec), script)
+            validate.assert_not_called()
+            maker.assert_not_called()
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # A new process sees the same files
+        cache2 = ScriptCache(self.cache_dir)
+        self.assertEqual(cache2.get_script(script_spec), script)
+        self.assertEqual(cache2.stats()['hits'], 1)
+        self.assertEqual(cache2.stats()['entries'], 2)
+
+    def test_same_content(self):
+        """An equivalent spec is a miss on its spec key, but reuses the script file"""
+        cache = ScriptCache(self.cache_dir)
+        script = cache.get_script(script_spec)
+        with mock.patch('dpcreator_script_maker.dp_script_maker.DPCreatorScriptMaker') as maker:
+            self.assertEqual(cache.get_script(reordered(script_spec)), script)
+            maker.assert_not_called()
+        scripts = [name for name in os.listdir(self.cache_dir) if name.endswith('.py')]
+        self.assertEqual(len(scripts), 1)
+
+        # Already validated plans also share it
+        self.assertEqual(cache.get_script(AnalysisPlan(**script_spec)), script)
+
+    def test_options_change_key(self):
+        cache = ScriptCache(self.cache_dir)
+        spec = copy.deepcopy(script_spec)
+        spec['privacy_parameters']['individual_in_at_most_one_row'] = False
+        script_2 = cache.get_script(spec, max_contributions=2)
+        script_3 = cache.get_script(spec, max_contributions=3)
+        self.assertNotEqual(script_2, script_3)
+        self.assertEqual(cache.misses, 2)
+
+        streaming = cache.get_script(spec, max_contributions=2, streaming=True)
+        self.assertIn('read_chunks', streaming)
+        self.assertEqual(cache.misses, 3)
+
+    def test_lru_eviction(self):
+        specs = []
+        for num in range(3):
+            spec = copy.deepcopy(script_spec)
+            spec['name'] = f'Plan {num}'
+            specs.append(spec)
+
+        script_size = len(DPCreatorScriptMaker(specs[0]).script.encode())
+        cache = ScriptCache(self.cache_dir, max_bytes=int(2.5 * script_size))
+
+        cache.get_script(specs[0])
+        cache.get_script(specs[1])
+        cache.get_script(specs[0])  # specs[1] is now the least recently used
+        cache.get_script(specs[2])
+
+        self.assertLessEqual(cache.stats()['total_bytes'], cache.max_bytes)
+        self.assertGreater(cache.evictions, 0)
+
+        hits = cache.hits
+        cache.get_script(specs[0])
+        self.assertEqual(cache.hits, hits + 1)
+        cache.get_script(specs[1])
+        self.assertEqual(cache.hits, hits + 1)
+
+    def test_clear(self):
+        cache = ScriptCache(self.cache_dir)
+        cache.get_script(script_spec)
+        cache.clear()
+        self.assertEqual(os.listdir(self.cache_dir), [])
+        self.assertEqual(cache.stats()['total_bytes'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+from dpcreator_script_maker.dp_script_maker import DPCreatorScriptMaker
+from dpcreator_script_maker.server import ScriptServer
+from dpcreator_script_maker.test_specs.spec_02 import script_spec
+import asyncio
+import copy
+import http.client
+import json
+import os
+import unittest
+
+
+def request(port, method, path, body=None):
+    """Return (status, headers, JSON response)"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        if body is not None and not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        connection.request(method, path, body=body)
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), json.loads(response.read())
+    finally:
+        connection.close()
+
+
+class TestScriptServer(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = ScriptServer(port=0, workers=2, max_queue=4)
+        await self.server.start()
+        self.serving = asyncio.create_task(self.server.serve_forever())
+
+    async def asyncTearDown(self):
+        self.serving.cancel()
+        await self.server.close()
+
+    async def call(self, method, path, body=None):
+        return await asyncio.to_thread(request, self.server.port, method, path, body)
+
+    async def test_validate(self):
+        status, _, result = await self.call('POST', '/validate', script_spec)
+        self.assertEqual((status, result), (200, dict(valid=True, name='Plan 4', errors=[], warnings=[])))
+
+        spec = copy.deepcopy(script_spec)
+        del spec['dataset']
+        status, _, result = await self.call('POST', '/validate', spec)
+        self.assertEqual((status, result['valid']), (200, False))
+        self.assertEqual(result['errors'][0]['loc'], ['dataset'])
+
+        status, _, result = await self.call('POST', '/validate', b'{not json')
+        self.assertFalse(result['valid'])
+
+    async def test_generate(self):
+        options = dict(streaming=True, max_memory_mb=128)
+        status, _, result = await self.call('POST', '/generate', dict(spec=script_spec, options=options))
+        self.assertEqual(status, 200)
+        self.assertEqual(result['script'], DPCreatorScriptMaker(script_spec, **options).script)
+
+        spec = copy.deepcopy(script_spec)
+        spec['statistics'][0]['epsilon'] = 0.5
+        status, _, result = await self.call('POST', '/generate', dict(spec=spec))
+        self.assertEqual((status, result['valid']), (422, False))
+        self.assertIn('epsilon', result['errors'][0]['msg'])
+
+    async def test_bad_requests(self):
+        for method, path, body, expected in [
+                ('POST', '/generate', dict(spec=script_spec, options=dict(colour='red')), 400),
+                ('POST', '/generate', dict(spec=script_spec, options=dict(streaming=True, max_memory_mb=None)), 400),
+                ('POST', '/generate', dict(spec=script_spec, options=dict(max_memory_mb='10')), 400),
+                ('POST', '/generate', dict(spec=script_spec, options=dict(workers=True)), 400),
+                ('POST', '/generate', dict(spec=script_spec, options=['streaming']), 400),
+                ('POST', '/generate', [script_spec], 400),
+                ('POST', '/generate', b'{not json', 400),
+                ('GET', '/generate', None, 405),
+                ('POST', '/stats', b'', 405),
+                ('GET', '/nowhere', None, 404)]:
+            status, _, result = await self.call(method, path, body)
+            self.assertEqual(status, expected, path)
+            self.assertIn('error', result)
+
+    async def test_concurrent(self):
+        """More requests than workers are queued, then answered"""
+        results = await asyncio.gather(*[self.call('POST', '/generate', dict(spec=script_spec))
+                                         for _ in range(6)])
+        self.assertTrue(all(status == 200 for status, _, _ in results))
+
+        status, _, stats = await self.call('GET', '/stats')
+        self.assertEqual((stats['queue_depth'], stats['workers'], stats['max_queue']), (0, 2, 4))
+        generate = stats['endpoints']['/generate']
+        self.assertEqual((generate['count'], generate['rejected']), (6, 0))
+        self.assertTrue(0 < generate['p50_ms'] <= generate['p90_ms'] <= generate['p99_ms'])
+        self.assertIsNone(stats['endpoints']['/validate']['p50_ms'])
+
+    async def test_backpressure(self):
+        """With the workers busy and the queue full, requests are refused"""
+        self.server.pending = self.server.workers + self.server.max_queue
+        self.assertEqual(self.server.stats()['queue_depth'], 4)
+        status, headers, result = await self.call('POST', '/validate', script_spec)
+        self.assertEqual((status, headers['Retry-After']), (503, '1'))
+        self.assertEqual(self.server.endpoints['/validate'].rejected, 1)
+
+        self.server.pending -= 1
+        status, _, result = await self.call('POST', '/validate', script_spec)
+        self.assertEqual((status, result['valid']), (200, True))
+
+    async def test_internal_error(self):
+        """A worker that dies gets a 500, counted in the stats, and the next requests a new pool"""
+        async def run_in_worker(path, func, *args):
+            return await original(path, os._exit, 1)
+
+        original = self.server.run_in_worker
+        self.server.run_in_worker = run_in_worker
+        status, _, result = await self.call('POST', '/validate', script_spec)
+        self.assertEqual(status, 500)
+        self.assertIn('BrokenProcessPool', result['error'])
+        self.assertEqual(self.server.stats()['endpoints']['/validate']['errors'], 1)
+
+        self.server.run_in_worker = original
+        status, _, result = await self.call('POST', '/validate', script_spec)
+        self.assertEqual((status, result['valid']), (200, True))
+
+    async def test_keep_alive(self):
+        def two_requests():
+            connection = http.client.HTTPConnection('127.0.0.1', self.server.port, timeout=30)
+            try:
+                statuses = []
+                for _ in range(2):
+                    connection.request('GET', '/health')
+                    response = connection.getresponse()
+                    response.read()
+                    statuses.append(response.status)
+                return statuses
+            finally:
+                connection.close()
+        self.assertEqual(await asyncio.to_thread(two_requests), [200, 200])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+from dpcreator_script_maker.accuracy import get_accuracy_table
+from dpcreator_script_maker import simulator
+from dpcreator_script_maker.models import AnalysisPlan
+from dpcreator_script_maker.simulator import simulate_plan, synthetic_data
+from dpcreator_script_maker.test_specs.spec_02 import script_spec
+import dpcreator_script_maker.static_vals as dstatic
+from tests.benchmarks.synthetic_specs import make_synthetic_spec
+from unittest import mock
+import copy
+import unittest
+
+import numpy as np
+
+
+def one_statistic_spec(**stat):
+    spec = copy.deepcopy(script_spec)
+    spec['statistics'] = [dict(dict(epsilon=0.5), **stat)]
+    return spec
+
+
+class TestSimulator(unittest.TestCase):
+
+    def test_report(self):
+        simulation = simulate_plan(script_spec, num_trials=2_000, seed=0)
+        report = simulation.report()
+        self.assertEqual([(r['variable'], r['statistic']) for r in report],
+                         [(s['variable'], s['statistic']) for s in script_spec['statistics']])
+        for result in report:
+            self.assertEqual(list(result['error_quantiles']), dstatic.CONFIDENCE_LEVELS)
+            errors = list(result['error_quantiles'].values())
+            self.assertEqual(errors, sorted(errors))
+        self.assertEqual(simulation.errors[0].shape, (2_000, dstatic.DEFAULT_HIST_NUMBER_OF_BINS))
+
+        # Seeded
+        self.assertEqual(simulate_plan(script_spec, num_trials=100, seed=1).report(),
+                         simulate_plan(script_spec, num_trials=100, seed=1).report())
+
+    def test_matches_accuracy(self):
+        """Counts and sums have one noisy value: their errors follow the closed-form accuracy"""
+        for stat, bounds, mechanism in [(dict(variable='State', statistic='count'), None, 'Geometric'),
+                                        (dict(variable='TypingSpeed', statistic='sum'), (3.0, 30.0), 'Laplace')]:
+            # A small epsilon, so that Geometric errors aren't just a few integers
+            report = simulate_plan(one_statistic_spec(epsilon=0.05, **stat), num_trials=50_000, seed=0).report()[0]
+            expected = get_accuracy_table(stat['statistic'], bounds, epsilon=0.05, mechanism=mechanism,
+                                          rows_public=True)
+            for level in [0.68, 0.9, 0.95]:
+                self.assertAlmostEqual(report['error_quantiles'][level] / expected[level], 1, delta=0.1)
+
+    def test_sample_data(self):
+        data = synthetic_data(script_spec, num_rows=500, seed=0)
+        spec = one_statistic_spec(variable='TypingSpeed', statistic='mean')
+        simulation = simulate_plan(spec, data, num_trials=1_000, seed=0)
+        self.assertAlmostEqual(simulation.values[0], data['TypingSpeed'].mean())
+        self.assertTrue(np.all(simulation.errors[0] <= 27.0))  # clamped to the bounds
+
+        # Several quantiles: the candidates closest to them, released with a part of the epsilon each
+        spec = one_statistic_spec(variable='Income', statistic='quantile', quantiles=[0.25, 0.75])
+        simulation = simulate_plan(spec, data, num_trials=1_000, seed=0)
+        self.assertEqual(simulation.errors[0].shape, (1_000, 2))
+        np.testing.assert_allclose(simulation.values[0], np.quantile(data['Income'], [0.25, 0.75]), rtol=0.05)
+
+    def test_max_contributions(self):
+        spec = copy.deepcopy(script_spec)
+        spec['privacy_parameters']['individual_in_at_most_one_row'] = False
+        with self.assertRaises(ValueError):
+            simulate_plan(spec, num_trials=10)
+        # Each individual's rows add more noise
+        one, three = [simulate_plan(spec if max_contributions else script_spec, num_trials=5_000, seed=0,
+                                    max_contributions=max_contributions).report()[0]['mean_error']
+                      for max_contributions in (None, 3)]
+        self.assertAlmostEqual(three / one, 3, delta=0.3)
+
+    def test_vectorized(self):
+        """The noise of all the trials of a noisy value is drawn in one call"""
+        plan = AnalysisPlan(**make_synthetic_spec(20, 50, 5))
+        with mock.patch.object(simulator, 'noisy_release', wraps=simulator.noisy_release) as release:
+            simulation = simulate_plan(plan, num_trials=2_000, num_rows=1_000, seed=0)
+        self.assertEqual(len(simulation.report()), 50)
+        self.assertEqual({call.args[-1] for call in release.call_args_list}, {2_000})
+        # At most a count, a sum and a sum of squares per statistic
+        self.assertLessEqual(release.call_count, 3 * 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+from dpcreator_script_maker.models import AnalysisPlan
+from dpcreator_script_maker.spec_stream import JSONStream, load_spec
+from dpcreator_script_maker.test_specs.spec_02 import script_spec
+import copy
+import io
+import json
+import os
+import tempfile
+import tracemalloc
+import unittest
+
+
+def make_wide_spec(num_vars):
+    spec = copy.deepcopy(script_spec)
+    spec['dataset']['variables'] += [
+        {"name": f"var_{idx}", "var_type": "Integer", "bounds": {"min": 0, "max": idx + 1}, "impute_constant": 0}
+        for idx in range(num_vars)]
+    return spec
+
+
+class TestJSONStream(unittest.TestCase):
+
+    def test_values_across_blocks(self):
+        """Values cut at the end of a block are decoded whole"""
+        text = '{"a": [12345.5e-3, true, null, "long \\"string\\"", {"b": []}], "c": -1}'
+        for block_size in [1, 2, 3, 7, 100]:
+            stream = JSONStream(io.StringIO(text), block_size)
+            found = {}
+            for key in stream.iter_object():
+                if key == 'a':
+                    found[key] = [stream.decode() for _ in stream.iter_array()]
+                else:
+                    found[key] = stream.decode()
+            self.assertEqual(found, json.loads(text))
+
+    def test_malformed(self):
+        for text in ['{"a": tru}', '{"a": 1 "b": 2}', '{"a": [1, 2}', '{"a": "b', '[1]']:
+            stream = JSONStream(io.StringIO(text), 2)
+            with self.assertRaises(ValueError):
+                for _key in stream.iter_object():
+                    stream.decode()
+
+
+class TestLoadSpec(unittest.TestCase):
+
+    def test_same_plan(self):
+        expected = AnalysisPlan(**script_spec).model_dump()
+        text = json.dumps(script_spec, indent=4)
+        for block_size in [3, 64, 1024 * 1024]:
+            self.assertEqual(load_spec(io.StringIO(text), block_size).model_dump(), expected)
+
+        # Statistics before the dataset
+        reordered = {'statistics': script_spec['statistics'],
+                     **{key: value for key, value in script_spec.items() if key != 'statistics'}}
+        self.assertEqual(load_spec(io.StringIO(json.dumps(reordered)), 16).model_dump(), expected)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'spec.json')
+            with open(path, 'w') as f:
+                f.write(text)
+            self.assertEqual(load_spec(path).model_dump(), expected)
+
+    def test_rejected_early(self):
+        """An invalid variable stops the loading, without reading the rest of the file"""
+        spec = make_wide_spec(20_000)
+        spec['dataset']['variables'][6]['bounds'] = {'min': 1, 'max': 0}
+        f = io.StringIO(json.dumps(spec))
+        with self.assertRaises(ValueError) as context:
+            load_spec(f, block_size=4096)
+        self.assertIn('dataset.variables[6]', str(context.exception))
+        self.assertLess(f.tell(), len(f.getvalue()) / 10)
+
+        for bad_spec in [
+                dict(script_spec, statistics=[{"variable": "Nope", "statistic": "sum", "epsilon": 0.1}]),
+                dict(script_spec, statistics=[{"variable": "Income", "statistic": "median", "epsilon": 0.1}]),
+                dict(script_spec, name=None)]:
+            with self.assertRaises(ValueError):
+                load_spec(io.StringIO(json.dumps(bad_spec)))
+
+        duplicates = copy.deepcopy(script_spec)
+        duplicates['dataset']['variables'].append(duplicates['dataset']['variables'][0])
+        with self.assertRaises(ValueError):
+            load_spec(io.StringIO(json.dumps(duplicates)))
+
+        with self.assertRaises(ValueError):
+            load_spec(io.StringIO(json.dumps(script_spec) + '{}'))
+
+    def test_memory(self):
+        """
+        Beyond the plan itself, memory holds one block, one entry and the
+        variable names, instead of the whole document
+        """
+        text = json.dumps(make_wide_spec(10_000))
+
+        def get_extra_memory(load):
+            f = io.StringIO(text)
+            tracemalloc.start()
+            try:
+                plan = load(f)
+                current, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            self.assertEqual(len(plan.dataset.variables), 10_000 + len(script_spec['dataset']['variables']))
+            return peak - current
+
+        streaming = get_extra_memory(lambda f: load_spec(f, block_size=16 * 1024))
+        whole = get_extra_memory(lambda f: AnalysisPlan(**json.load(f)))
+        self.assertLess(streaming * 5, whole)
+
+if __name__ == '__main__':
+    unittest.main()